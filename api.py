@@ -0,0 +1,237 @@
+import asyncio
+import contextlib
+import os
+import threading
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from fastapi import FastAPI, Header, Query
+from pydantic import BaseModel, Field
+
+from deadlines import request_budget
+from risk import assess_flood_risk_batch, is_raining, risk_dict
+
+# Largest batch accepted by the */batch endpoints
+MAX_BATCH = int(os.getenv("API_MAX_BATCH", "100"))
+
+WEATHER_FIELDS = ("city", "temp", "feels_like", "humidity", "pressure", "description", "main",
+                  "wind_speed", "clouds", "visibility", "lat", "lon")
+SHELTER_FIELDS = ("name", "address", "phone", "capacity", "available", "facilities", "lat", "lon")
+
+
+class CitiesRequest(BaseModel):
+    cities: List[str] = Field(min_length=1, max_length=MAX_BATCH)
+
+
+class Observation(BaseModel):
+    """Raw conditions to score without a weather lookup"""
+    humidity: float
+    pressure: float
+    visibility: float = Field(description="Visibility in km")
+    raining: Optional[bool] = None
+    description: str = ""
+    main: str = ""
+
+
+class RiskRequest(BaseModel):
+    cities: List[str] = Field(default_factory=list, max_length=MAX_BATCH)
+    observations: List[Observation] = Field(default_factory=list, max_length=MAX_BATCH)
+
+
+class ShelterQuery(BaseModel):
+    city: str
+    k: int = Field(1, ge=1, le=20)
+    facilities: List[str] = Field(default_factory=list)
+
+
+class SheltersRequest(BaseModel):
+    queries: List[ShelterQuery] = Field(min_length=1, max_length=MAX_BATCH)
+
+
+class SOSRequest(BaseModel):
+    city: str
+    name: str = ""
+    situation: str = ""
+    idempotency_key: Optional[str] = Field(None, max_length=200,
+                                           description="Retries with the same key return the original alert")
+
+
+class SOSBatchRequest(BaseModel):
+    alerts: List[SOSRequest] = Field(min_length=1, max_length=MAX_BATCH)
+
+
+class ChatRequest(BaseModel):
+    message: str = Field(min_length=1)
+    city: str = "Lahore"
+    history: List[Tuple[str, str]] = Field(default_factory=list, description="Earlier (user, assistant) turns")
+
+
+class ChatBatchRequest(BaseModel):
+    requests: List[ChatRequest] = Field(min_length=1, max_length=MAX_BATCH)
+
+
+def weather_json(weather):
+    """Public weather fields; ``live`` is False when OpenWeather failed and demo data was used"""
+    return {"live": weather["success"], **{field: weather.get(field) for field in WEATHER_FIELDS}}
+
+
+def shelter_json(distance, shelter):
+    return {**{field: shelter.get(field) for field in SHELTER_FIELDS},
+            "distance_km": round(distance, 2) if distance is not None else None}
+
+
+def conditions(weather):
+    """(humidity, pressure, visibility, rain) for a weather snapshot"""
+    return weather["humidity"], weather["pressure"], weather["visibility"], is_raining(weather["description"], weather["main"])
+
+
+def score_conditions(rows):
+    """Risk dicts for many (humidity, pressure, visibility, rain) rows in one vectorized pass"""
+    if not rows:
+        return []
+    scored = assess_flood_risk_batch(*zip(*rows))
+    return [risk_dict(score, level, factors)
+            for score, level, factors in zip(scored["score"], scored["level"], scored["factors"])]
+
+
+def create_api(get_backend=None):
+    """JSON API over AsyncFloodAidBackend, returning structured data instead of rendered HTML.
+
+    ``get_backend`` returns the backend to serve; when mounted beside the
+    Gradio app pass its getter so both share caches, sessions and
+    occupancy. Standalone, the API builds (and on shutdown closes) its own.
+    Every lookup has a GET for one item and a POST .../batch for many.
+    """
+    owned = []
+    if get_backend is None:
+        lock = threading.Lock()
+
+        def get_backend():
+            with lock:
+                if not owned:
+                    from async_backend import AsyncFloodAidBackend
+                    owned.append(AsyncFloodAidBackend(prefetch=os.getenv("WEATHER_PREFETCH", "1") == "1"))
+                return owned[0]
+
+    @contextlib.asynccontextmanager
+    async def lifespan(api):
+        yield
+        if owned:
+            await owned[0].aclose()
+
+    api = FastAPI(title="FloodAid API", lifespan=lifespan)
+
+    async def weather_for(cities):
+        """Weather per city, fetching each distinct city once"""
+        backend = get_backend()
+        unique = list(dict.fromkeys(cities))
+        # Cities that miss the budget get demo data rather than holding up the response
+        with request_budget("weather"):
+            fetched = dict(zip(unique, await asyncio.gather(*(backend.get_weather(city) for city in unique))))
+        return [fetched[city] for city in cities]
+
+    def nearest(query, weather=None):
+        backend = get_backend()
+        shelters = backend.find_nearest_shelters(query.city, k=query.k, facilities=tuple(query.facilities), weather=weather)
+        return {"city": query.city, "shelters": [shelter_json(distance, shelter) for distance, shelter in shelters]}
+
+    async def sos(request, key=None):
+        backend = get_backend()
+        # On disk and queued for dispatch before the weather lookup
+        key = key or request.idempotency_key
+        alert, duplicate = await backend.submit_sos(request.city, request.name, request.situation,
+                                                    key=f"api:{key}" if key else None, source="api")
+        with request_budget("sos"):
+            weather = (await weather_for([request.city]))[0]
+        shelters = backend.find_nearest_shelters(request.city, k=1, weather=weather)
+        return {
+            "alert_id": alert["id"],
+            "duplicate": duplicate,
+            "timestamp": datetime.fromtimestamp(alert["ts"], timezone.utc).isoformat(timespec="seconds"),
+            "city": weather["city"],
+            "reported_by": request.name or None,
+            "situation": request.situation or None,
+            "weather": weather_json(weather),
+            "risk": score_conditions([conditions(weather)])[0],
+            "nearest_shelter": shelter_json(*shelters[0]) if shelters else None,
+            "emergency_contacts": backend.repo.list_emergency_contacts(),
+            # Ready-to-forward text, identical to the UI's SOS alert
+            "message": backend.format_sos_alert(request.city, weather, request.name, request.situation),
+        }
+
+    async def chat(request):
+        with request_budget("api_chat"):
+            reply = await get_backend().chat_with_gemini(request.message, request.history, request.city)
+        return {"city": request.city, "reply": reply}
+
+    @api.get("/weather")
+    async def weather(city: str = "Lahore"):
+        return weather_json((await weather_for([city]))[0])
+
+    @api.post("/weather/batch")
+    async def weather_batch(body: CitiesRequest):
+        return {"results": [weather_json(w) for w in await weather_for(body.cities)]}
+
+    @api.get("/risk")
+    async def risk(city: str = "Lahore"):
+        weather = (await weather_for([city]))[0]
+        return {"city": weather["city"], "live": weather["success"], **score_conditions([conditions(weather)])[0]}
+
+    @api.post("/risk/batch")
+    async def risk_batch(body: RiskRequest):
+        """Score cities (current weather) and/or raw observations, all in one vectorized pass"""
+        weathers = await weather_for(body.cities)
+        observations = [
+            (o.humidity, o.pressure, o.visibility, o.raining if o.raining is not None else is_raining(o.description, o.main))
+            for o in body.observations
+        ]
+        scores = score_conditions([conditions(w) for w in weathers] + observations)
+        return {
+            "cities": [{"city": w["city"], "live": w["success"], **score}
+                       for w, score in zip(weathers, scores)],
+            "observations": scores[len(weathers):],
+        }
+
+    @api.get("/shelters/nearest")
+    async def shelters_nearest(city: str = "Lahore", k: int = Query(1, ge=1, le=20),
+                               facility: List[str] = Query(default_factory=list)):
+        query = ShelterQuery(city=city, k=k, facilities=facility)
+        return nearest(query, (await weather_for([city]))[0])
+
+    @api.post("/shelters/nearest/batch")
+    async def shelters_nearest_batch(body: SheltersRequest):
+        weathers = await weather_for([query.city for query in body.queries])
+        return {"results": [nearest(query, weather) for query, weather in zip(body.queries, weathers)]}
+
+    @api.get("/statistics")
+    async def statistics():
+        backend = get_backend()
+        return {**backend.get_statistics(), **backend.get_occupancy_breakdown()}
+
+    @api.post("/sos")
+    async def sos_alert(body: SOSRequest, idempotency_key: Optional[str] = Header(None, max_length=200)):
+        """Log and dispatch an SOS alert; an Idempotency-Key header works like the body field"""
+        return await sos(body, idempotency_key)
+
+    @api.post("/sos/batch")
+    async def sos_batch(body: SOSBatchRequest):
+        return {"results": await asyncio.gather(*(sos(alert) for alert in body.alerts))}
+
+    @api.post("/chat")
+    async def chat_reply(body: ChatRequest):
+        return await chat(body)
+
+    @api.post("/chat/batch")
+    async def chat_batch(body: ChatBatchRequest):
+        return {"results": await asyncio.gather(*(chat(request) for request in body.requests))}
+
+    return api
+
+
+if __name__ == "__main__":
+    import logging
+
+    import uvicorn
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    uvicorn.run(create_api(), host=os.getenv("API_HOST", "0.0.0.0"), port=int(os.getenv("API_PORT", "8000")))
@@ -1,8 +1,59 @@
-import gradio as gr
-from backend import FloodAidBackend
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
 
-# Initialize backend
-backend = FloodAidBackend()
+import gradio as gr
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from deadlines import request_budget
+from lanes import Lane, lane_stats
+from metrics import CACHE_LOOKUPS, CONTENT_TYPE, REGISTRY, span
+from sessions import SessionStore
+
+# Backend (async, so waiting on Gemini/OpenWeather never holds a worker thread), built on
+# first use rather than at import so the server binds without waiting on data loading,
+# and the weather prefetcher starts with the first page load instead of before launch
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """The shared backend, constructed on first call"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                from async_backend import AsyncFloodAidBackend  # numpy, httpx and requests load here, not at import
+                _backend = AsyncFloodAidBackend(prefetch=os.getenv("WEATHER_PREFETCH", "1") == "1")
+    return _backend
+
+# Isolated concurrency lanes so slow Gemini chats never delay SOS or the weather panel.
+# Gradio's own per-event limit is disabled for these events; the lane enforces it and
+# tracks queue depth and wait time.
+CHAT_LANE = Lane("chat", int(os.getenv("CHAT_LANE_LIMIT", "200")))
+SOS_LANE = Lane("sos", int(os.getenv("SOS_LANE_LIMIT", "50")))
+WEATHER_LANE = Lane("weather", int(os.getenv("WEATHER_LANE_LIMIT", "500")))
+LANES = (CHAT_LANE, SOS_LANE, WEATHER_LANE)
+
+# Quiet period before a city textbox edit fetches weather (trailing-edge debounce)
+CITY_DEBOUNCE_SECONDS = float(os.getenv("CITY_DEBOUNCE_SECONDS", "0.5"))
+_city_input_seq = {}
+
+# Repeat SOS presses from one session and city within this window are deduplicated (0 disables)
+SOS_DEDUP_SECONDS = float(os.getenv("SOS_DEDUP_SECONDS", "60"))
+
+# Chat turns kept server-side per browser session, so respond never re-parses the chat history
+sessions = SessionStore(
+    max_turns=int(os.getenv("SESSION_MAX_TURNS", "16")),
+    max_bytes=int(os.getenv("SESSION_MAX_BYTES", str(32 * 1024))),
+    idle_ttl=float(os.getenv("SESSION_IDLE_TTL", "3600")),
+    max_sessions=int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+)
+
+RENDER = REGISTRY.histogram("floodaid_render_seconds", "HTML render time per view", ("view",),
+                            buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1))
 
 # Custom CSS for beautiful design
 custom_css = """
@@ -149,10 +200,87 @@ custom_css = """
 }
 """
 
-def create_weather_display(city):
+@WEATHER_LANE
+async def create_weather_display(city):
     """Create beautiful weather display"""
-    weather = backend.get_weather(city)
-    risk = backend.assess_flood_risk(weather)
+    with request_budget("weather"):
+        weather = await get_backend().get_weather(city)
+    with span("render", RENDER, view="weather"):
+        return render_weather_html(weather)
+
+async def debounced_weather_display(city, request: gr.Request):
+    """Update the weather panel only for the last edit in a burst of keystrokes"""
+    session = request.session_hash
+    seq = _city_input_seq[session] = _city_input_seq.get(session, 0) + 1
+    await asyncio.sleep(CITY_DEBOUNCE_SECONDS)
+    if _city_input_seq.get(session) != seq:
+        return gr.skip()  # A newer keystroke superseded this one
+    del _city_input_seq[session]
+    if not city.strip():
+        return gr.skip()
+    return await create_weather_display(city)
+
+@CHAT_LANE
+async def respond(message, chat_history, city, request: gr.Request = None):
+    if not message.strip():
+        yield chat_history, ""
+        return
+    
+    # Turns for the backend come from the session store as (user, assistant) tuples;
+    # the browser's chat_history is only appended to for display
+    session = request.session_hash if request is not None else None
+    history_tuples = sessions.history(session) if session else []
+    
+    # Stream the reply into the chat in new dict format as tokens arrive
+    chat_history = chat_history or []
+    chat_history.append({"role": "user", "content": message})
+    chat_history.append({"role": "assistant", "content": ""})
+    yield chat_history, ""
+    
+    # The budget bounds the weather fetch, the quota wait and the Gemini call, and sets the hedge percentile
+    with request_budget("chat"):
+        async for chunk in get_backend().stream_chat_with_gemini(message, history_tuples, city):
+            chat_history[-1]["content"] += chunk
+            yield chat_history, ""
+    
+    if session:
+        sessions.append(session, message, chat_history[-1]["content"])
+
+@SOS_LANE
+async def send_sos(city, request: gr.Request = None):
+    backend = get_backend()
+    # Logged and queued for dispatch before anything else; repeat presses from one
+    # session within the dedup window are the same alert
+    key = None
+    if request is not None and SOS_DEDUP_SECONDS > 0:
+        key = f"ui:{request.session_hash}:{backend.city_key(city)}:{int(time.time() // SOS_DEDUP_SECONDS)}"
+    alert, duplicate = await backend.submit_sos(city, key=key)
+    status = "already received" if duplicate else "received"
+    reply = f"🚨 **SOS ALERT SENT!** (reference #{alert['id']}, {status})\n\nPlease call emergency services immediately:\n\n🆘 **Rescue 1122: 1122**\n🚑 **Edhi: 115**\n📞 **PDMA: 1129**\n\nStay calm and follow emergency instructions. Help is on the way!"
+    yield [
+        {"role": "user", "content": f"🚨 **EMERGENCY SOS ALERT** 🚨\n**LOCATION:** {city}"},
+        {"role": "assistant", "content": reply}
+    ]
+    
+    with request_budget("sos"):
+        sos_message = await backend.generate_sos_alert(city)
+    # The chat is replaced by the alert, so the session history restarts from it too
+    if request is not None:
+        sessions.reset(request.session_hash)
+        sessions.append(request.session_hash, sos_message, reply)
+    yield [
+        {"role": "user", "content": sos_message},
+        {"role": "assistant", "content": reply}
+    ]
+
+def clear_chat(request: gr.Request):
+    """Clear the chat window and the session's server-side history"""
+    sessions.reset(request.session_hash)
+    return None
+
+def render_weather_html(weather):
+    """Render the weather card and flood risk banner for a weather snapshot"""
+    risk = get_backend().assess_flood_risk(weather)
     
     risk_class = f"risk-{risk['color']}"
     
@@ -182,41 +310,70 @@ def create_weather_display(city):
     """
     return html
 
-def create_shelter_display():
-    """Create beautiful shelter cards"""
-    html = "<h2>🏠 Emergency Shelters</h2>"
-    for shelter in backend.shelters[:5]:  # Show first 5
-        available_pct = (shelter['available'] / shelter['capacity']) * 100
-        status_color = "#27ae60" if available_pct > 30 else "#e67e22" if available_pct > 10 else "#e74c3c"
+def versioned(*collections):
+    """Memoize a renderer's HTML until one of the backend collections it reads changes version"""
+    def decorator(render):
+        cached = [None]  # (versions, html), swapped atomically
         
-        html += f"""
+        @functools.wraps(render)
+        def wrapper():
+            key = tuple(get_backend().versions.get(name, 0) for name in collections)
+            entry = cached[0]
+            if entry is None or entry[0] != key:
+                CACHE_LOOKUPS.inc(cache="html", result="miss")
+                with span("render", RENDER, view=render.__name__):
+                    entry = cached[0] = (key, render())
+            else:
+                CACHE_LOOKUPS.inc(cache="html", result="fresh")
+            return entry[1]
+        return wrapper
+    return decorator
+
+@functools.lru_cache(maxsize=4096)
+def render_shelter_card(name, address, phone, capacity, available, facilities):
+    """Render one shelter card; cached on its field values so only changed shelters re-render"""
+    available_pct = (available / capacity) * 100
+    status_color = "#27ae60" if available_pct > 30 else "#e67e22" if available_pct > 10 else "#e74c3c"
+    
+    return f"""
         <div class="shelter-card">
-            <h3 style="margin: 0 0 10px 0;">{shelter['name']}</h3>
-            <p style="margin: 5px 0;">📍 {shelter['address']}</p>
-            <p style="margin: 5px 0;">📞 {shelter['phone']}</p>
+            <h3 style="margin: 0 0 10px 0;">{name}</h3>
+            <p style="margin: 5px 0;">📍 {address}</p>
+            <p style="margin: 5px 0;">📞 {phone}</p>
             <div style="display: flex; gap: 10px; margin-top: 15px;">
                 <div style="flex: 1; background: white; padding: 10px; border-radius: 8px; text-align: center;">
-                    <p style="margin: 0; font-size: 24px; font-weight: bold; color: #667eea;">{shelter['capacity']}</p>
+                    <p style="margin: 0; font-size: 24px; font-weight: bold; color: #667eea;">{capacity}</p>
                     <p style="margin: 5px 0; font-size: 12px;">Total Capacity</p>
                 </div>
                 <div style="flex: 1; background: white; padding: 10px; border-radius: 8px; text-align: center;">
-                    <p style="margin: 0; font-size: 24px; font-weight: bold; color: {status_color};">{shelter['available']}</p>
+                    <p style="margin: 0; font-size: 24px; font-weight: bold; color: {status_color};">{available}</p>
                     <p style="margin: 5px 0; font-size: 12px;">Available Now</p>
                 </div>
             </div>
-            <p style="margin: 10px 0 0 0; font-size: 14px;">🏥 Facilities: {', '.join(shelter['facilities'])}</p>
+            <p style="margin: 10px 0 0 0; font-size: 14px;">🏥 Facilities: {', '.join(facilities)}</p>
         </div>
         """
-    return html
 
+@versioned("shelters")
+def create_shelter_display():
+    """Create beautiful shelter cards"""
+    parts = ["<h2>🏠 Emergency Shelters</h2>"]
+    for shelter in get_backend().repo.list_shelters(limit=5):  # Show first 5
+        parts.append(render_shelter_card(
+            shelter['name'], shelter['address'], shelter['phone'],
+            shelter['capacity'], shelter['available'], tuple(shelter['facilities'])
+        ))
+    return "".join(parts)
+
+@versioned("emergency_contacts")
 def create_contacts_display():
     """Create categorized emergency contacts"""
-    html = "<h2>📞 Emergency Contacts</h2>"
+    parts = ["<h2>📞 Emergency Contacts</h2>"]
     
-    for category, contacts in backend.emergency_contacts.items():
-        html += f"<h3 style='color: #667eea; margin-top: 20px;'>{category}</h3>"
+    for category, contacts in get_backend().repo.list_emergency_contacts().items():
+        parts.append(f"<h3 style='color: #667eea; margin-top: 20px;'>{category}</h3>")
         for contact in contacts:
-            html += f"""
+            parts.append(f"""
             <div class="contact-item">
                 <div style="display: flex; justify-content: space-between; align-items: center;">
                     <div>
@@ -226,16 +383,17 @@ def create_contacts_display():
                     <a href="tel:{contact['number']}" style="background: #667eea; color: white; padding: 10px 20px; border-radius: 8px; text-decoration: none; font-weight: bold; font-size: 18px;">{contact['number']}</a>
                 </div>
             </div>
-            """
-    return html
+            """)
+    return "".join(parts)
 
+@versioned("medical_tips")
 def create_medical_display():
     """Create medical tips display"""
-    html = "<h2>⚕️ Medical Assistance & Health Tips</h2>"
+    parts = ["<h2>⚕️ Medical Assistance & Health Tips</h2>"]
     
-    for tip in backend.medical_tips:
+    for tip in get_backend().repo.list_medical_tips():
         priority_class = f"priority-{tip['priority'].lower()}"
-        html += f"""
+        parts.append(f"""
         <div class="feature-card">
             <div style="display: flex; justify-content: between; align-items: center; margin-bottom: 10px;">
                 <h3 style="margin: 0; flex: 1;">{tip['title']}</h3>
@@ -243,9 +401,9 @@ def create_medical_display():
             </div>
             <p style="margin: 10px 0; color: #555;">{tip['desc']}</p>
         </div>
-        """
+        """)
     
-    html += """
+    parts.append("""
     <div style="background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%); color: white; padding: 20px; border-radius: 12px; margin-top: 20px;">
         <h3>🚑 Emergency Medical Hotlines</h3>
         <p style="font-size: 18px; margin: 10px 0;">
@@ -254,15 +412,16 @@ def create_medical_display():
             <strong>Red Crescent:</strong> <a href="tel:051-9250404" style="color: white;">051-9250404</a>
         </p>
     </div>
-    """
-    return html
+    """)
+    return "".join(parts)
 
+@versioned("relief_camps", "donation_needs")
 def create_relief_display():
     """Create relief camps and donation needs display"""
-    html = "<h2>📦 Relief Camps & Supply Distribution</h2>"
+    parts = ["<h2>📦 Relief Camps & Supply Distribution</h2>"]
     
-    for camp in backend.relief_camps:
-        html += f"""
+    for camp in get_backend().repo.list_relief_camps():
+        parts.append(f"""
         <div class="feature-card">
             <h3 style="margin: 0 0 10px 0; color: #667eea;">🏕️ {camp['name']}</h3>
             <p style="margin: 5px 0;">📍 <strong>City:</strong> {camp['city']}</p>
@@ -270,14 +429,14 @@ def create_relief_display():
             <p style="margin: 5px 0;">📞 <strong>Contact:</strong> <a href="tel:{camp['contact']}">{camp['contact']}</a></p>
             <p style="margin: 5px 0;">🕐 <strong>Hours:</strong> {camp['open']}</p>
         </div>
-        """
+        """)
     
-    html += "<h2 style='margin-top: 30px;'>👐 Urgent Donation Needs</h2>"
-    html += "<p>Help us provide essential supplies to flood victims. These items are critically needed:</p>"
+    parts.append("<h2 style='margin-top: 30px;'>👐 Urgent Donation Needs</h2>")
+    parts.append("<p>Help us provide essential supplies to flood victims. These items are critically needed:</p>")
     
-    for item in backend.donation_needs:
+    for item in get_backend().repo.list_donation_needs():
         priority_class = f"priority-{item['priority'].lower()}"
-        html += f"""
+        parts.append(f"""
         <div class="feature-card" style="border-left: 4px solid {'#ff6b6b' if item['priority'] == 'Critical' else '#ffa502' if item['priority'] == 'High' else '#ffd93d'};">
             <div style="display: flex; justify-content: space-between; align-items: center;">
                 <div style="flex: 1;">
@@ -288,29 +447,31 @@ def create_relief_display():
                 <span class="{priority_class}">{item['priority']}</span>
             </div>
         </div>
-        """
-    return html
+        """)
+    return "".join(parts)
 
+@versioned("safety_tips")
 def create_safety_display():
     """Create safety guidelines display"""
-    html = "<h2>🛡️ Safety Guidelines & Flood Preparedness</h2>"
+    parts = ["<h2>🛡️ Safety Guidelines & Flood Preparedness</h2>"]
     
-    for phase, tips in backend.safety_tips.items():
+    for phase, tips in get_backend().safety_tips.items():
         color = "#667eea" if phase == "Before Flood" else "#ffa502" if phase == "During Flood" else "#27ae60"
-        html += f"""
+        parts.append(f"""
         <div style="background: {color}; color: white; padding: 20px; border-radius: 12px; margin: 20px 0;">
             <h3 style="margin: 0 0 15px 0;">⚠️ {phase}</h3>
             <ul style="margin: 0; padding-left: 20px;">
-        """
+        """)
         for tip in tips:
-            html += f"<li style='margin: 8px 0;'>{tip}</li>"
-        html += "</ul></div>"
+            parts.append(f"<li style='margin: 8px 0;'>{tip}</li>")
+        parts.append("</ul></div>")
     
-    return html
+    return "".join(parts)
 
+@versioned("shelters", "relief_camps", "emergency_contacts")
 def create_statistics_display():
     """Create live statistics dashboard"""
-    stats = backend.get_statistics()
+    stats = get_backend().get_statistics()
     
     html = """
     <div style="display: grid; grid-template-columns: repeat(2, 1fr); gap: 15px; margin: 20px 0;">
@@ -335,6 +496,11 @@ def create_statistics_display():
     
     return html
 
+def render_initial_tabs():
+    """HTML for the statistics dashboard and every tab, in page order"""
+    return (create_statistics_display(), create_shelter_display(), create_medical_display(),
+            create_relief_display(), create_safety_display(), create_contacts_display())
+
 # Main Gradio Interface - Compatible with older Gradio versions
 with gr.Blocks(title="FloodAid AI") as app:
     # Add CSS using gr.HTML at the top
@@ -350,7 +516,7 @@ with gr.Blocks(title="FloodAid AI") as app:
     """)
     
     # Statistics Dashboard
-    stats_display = gr.HTML(create_statistics_display())
+    stats_display = gr.HTML()
     
     with gr.Row():
         # Left Column - Main Chat
@@ -375,7 +541,8 @@ with gr.Blocks(title="FloodAid AI") as app:
                     )
                     
                     chatbot = gr.Chatbot(
-                        label="FloodAid AI Assistant"
+                        label="FloodAid AI Assistant",
+                        type="messages"
                     )
                     
                     with gr.Row():
@@ -403,24 +570,24 @@ with gr.Blocks(title="FloodAid AI") as app:
                 
                 # Shelters Tab
                 with gr.Tab("🏠 Emergency Shelters"):
-                    shelters_html = gr.HTML(create_shelter_display())
+                    shelters_html = gr.HTML()
                     refresh_shelters_btn = gr.Button("🔄 Refresh Shelter Information")
                 
                 # Medical Tab
                 with gr.Tab("⚕️ Medical Assistance"):
-                    medical_html = gr.HTML(create_medical_display())
+                    medical_html = gr.HTML()
                     
                 # Relief Tab
                 with gr.Tab("📦 Relief & Donations"):
-                    relief_html = gr.HTML(create_relief_display())
+                    relief_html = gr.HTML()
                 
                 # Safety Tab
                 with gr.Tab("🛡️ Safety Guidelines"):
-                    safety_html = gr.HTML(create_safety_display())
+                    safety_html = gr.HTML()
                 
                 # Emergency Contacts Tab
                 with gr.Tab("📞 Emergency Contacts"):
-                    contacts_html = gr.HTML(create_contacts_display())
+                    contacts_html = gr.HTML()
         
         # Right Column - Weather & Alerts
         with gr.Column(scale=2):
@@ -432,7 +599,7 @@ with gr.Blocks(title="FloodAid AI") as app:
                 placeholder="Enter city name"
             )
             
-            weather_html = gr.HTML(create_weather_display("Lahore"))
+            weather_html = gr.HTML()
             
             weather_refresh_btn = gr.Button("🔄 Update Weather")
             
@@ -473,61 +640,33 @@ with gr.Blocks(title="FloodAid AI") as app:
             </div>
             """)
     
-    # Event Handlers
-    def respond(message, chat_history, city):
-        if not message.strip():
-            return chat_history, ""
-        
-        # Convert chat_history to the format backend expects (list of tuples)
-        history_tuples = []
-        if chat_history:
-            for msg in chat_history:
-                if isinstance(msg, dict):
-                    # New format: dict with 'role' and 'content'
-                    if msg.get('role') == 'user':
-                        user_msg = msg.get('content', '')
-                        history_tuples.append((user_msg, ''))
-                    elif msg.get('role') == 'assistant' and history_tuples:
-                        history_tuples[-1] = (history_tuples[-1][0], msg.get('content', ''))
-                elif isinstance(msg, tuple):
-                    # Old format: tuple
-                    history_tuples.append(msg)
-        
-        bot_response = backend.chat_with_gemini(message, history_tuples, city)
-        
-        # Return in new dict format
-        chat_history.append({"role": "user", "content": message})
-        chat_history.append({"role": "assistant", "content": bot_response})
-        return chat_history, ""
-    
-    def send_sos(city):
-        sos_message = backend.generate_sos_alert(city)
-        return [
-            {"role": "user", "content": sos_message},
-            {"role": "assistant", "content": "🚨 **SOS ALERT PREPARED!**\n\nPlease call emergency services immediately:\n\n🆘 **Rescue 1122: 1122**\n🚑 **Edhi: 115**\n📞 **PDMA: 1129**\n\nStay calm and follow emergency instructions. Help is on the way!"}
-        ]
-    
     # Button Actions
     submit_btn.click(
         respond,
         inputs=[msg, chatbot, city_input],
-        outputs=[chatbot, msg]
+        outputs=[chatbot, msg],
+        concurrency_limit=None,
+        concurrency_id=CHAT_LANE.name
     )
     
     msg.submit(
         respond,
         inputs=[msg, chatbot, city_input],
-        outputs=[chatbot, msg]
+        outputs=[chatbot, msg],
+        concurrency_limit=None,
+        concurrency_id=CHAT_LANE.name
     )
     
     sos_btn.click(
         send_sos,
         inputs=[city_input],
-        outputs=[chatbot]
+        outputs=[chatbot],
+        concurrency_limit=None,
+        concurrency_id=SOS_LANE.name
     )
     
     clear_btn.click(
-        lambda: None,
+        clear_chat,
         None,
         chatbot,
         queue=False
@@ -536,18 +675,48 @@ with gr.Blocks(title="FloodAid AI") as app:
     weather_refresh_btn.click(
         create_weather_display,
         inputs=[weather_city],
-        outputs=[weather_html]
+        outputs=[weather_html],
+        concurrency_limit=None,
+        concurrency_id=WEATHER_LANE.name
     )
     
     city_input.change(
-        create_weather_display,
+        debounced_weather_display,
         inputs=[city_input],
-        outputs=[weather_html]
+        outputs=[weather_html],
+        concurrency_limit=None,
+        concurrency_id=WEATHER_LANE.name,
+        trigger_mode="multiple",
+        show_progress="hidden"
     )
     
+    # Cached read-only renderer: skip the queue entirely
     refresh_shelters_btn.click(
         lambda: create_shelter_display(),
-        outputs=[shelters_html]
+        outputs=[shelters_html],
+        queue=False
+    )
+    
+    # Per-lane queue depth and wait time, as an API-only endpoint
+    def get_lane_stats() -> dict:
+        return lane_stats(LANES)
+    
+    gr.api(get_lane_stats, api_name="lane_stats")
+    
+    # Dashboard and tab contents, rendered when a page loads (memoized, so cheap) rather than at import
+    app.load(
+        render_initial_tabs,
+        outputs=[stats_display, shelters_html, medical_html, relief_html, safety_html, contacts_html],
+        queue=False
+    )
+    
+    # Initial weather panel, fetched after the page loads
+    app.load(
+        create_weather_display,
+        inputs=[weather_city],
+        outputs=[weather_html],
+        concurrency_limit=None,
+        concurrency_id=WEATHER_LANE.name
     )
     
     # Initial welcome message
@@ -573,10 +742,24 @@ Type your question or click the 🚨 SOS button if you need immediate emergency
         outputs=[chatbot]
     )
 
+def create_server():
+    """FastAPI app serving the Gradio UI at /, the JSON API at /api and Prometheus metrics at /metrics"""
+    server = FastAPI()
+    
+    @server.get("/metrics", include_in_schema=False)
+    def metrics():
+        return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+    
+    from api import create_api  # Imports the risk engine (numpy); only needed once serving
+    
+    # JSON API for the SMS gateway and partners, sharing the UI's backend
+    server.mount("/api", create_api(get_backend))
+    return gr.mount_gradio_app(server, app, path="/", show_error=True)
+
 # Launch the application
 if __name__ == "__main__":
-    app.launch(
-        server_name="0.0.0.0",
-        server_port=7860,
-        show_error=True
-    )
+    import uvicorn
+    
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    uvicorn.run(create_server(), host=os.getenv("GRADIO_SERVER_NAME", "0.0.0.0"),
+                port=int(os.getenv("GRADIO_SERVER_PORT", "7860")))
@@ -0,0 +1,369 @@
+import asyncio
+import contextlib
+import contextvars
+import logging
+import os
+import sys
+import time
+
+import httpx
+
+from backend import GEMINI_REQUEST, WEATHER_FETCH, FloodAidBackend
+from deadlines import current_budget, detach_budget, request_budget
+from hedging import hedge_async
+from metrics import span
+from singleflight import AsyncSingleFlight
+from transport import HttpTransport, retry_delay
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncHttpTransport:
+    """Asyncio counterpart of HttpTransport built on a pooled httpx.AsyncClient"""
+
+    IDEMPOTENT_METHODS = HttpTransport.IDEMPOTENT_METHODS
+    RETRY_STATUSES = HttpTransport.RETRY_STATUSES
+
+    def __init__(self, pool_size=1000, pool_limits=None, connect_timeout=3.05,
+                 read_timeout=30, retries=2, backoff=0.25, client=None):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+
+        # Per-host pools are separate httpx transports mounted on the base URL
+        mounts = {
+            base_url: httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(max_connections=limit, max_keepalive_connections=limit)
+            )
+            for base_url, limit in (pool_limits or {}).items()
+        }
+        self.client = client or httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            mounts=mounts
+        )
+
+    def _timeout(self, read_timeout):
+        return httpx.Timeout(current_budget().timeout(read_timeout if read_timeout is not None else self.read_timeout),
+                             connect=self.connect_timeout)
+
+    async def request(self, method, url, timeout=None, **kwargs):
+        """Send a request, retrying idempotent methods on transient failures"""
+        method = method.upper()
+        attempts = 1 + (self.retries if method in self.IDEMPOTENT_METHODS else 0)
+        for attempt in range(attempts):
+            try:
+                response = await self.client.request(method, url, timeout=self._timeout(timeout), **kwargs)
+            except httpx.TransportError:
+                delay = retry_delay(self.backoff, attempt, attempts)
+                if delay is None:
+                    raise
+            else:
+                if response.status_code not in self.RETRY_STATUSES:
+                    return response
+                delay = retry_delay(self.backoff, attempt, attempts)
+                if delay is None:
+                    return response
+            await asyncio.sleep(delay)
+
+    async def get(self, url, timeout=None, **kwargs):
+        return await self.request("GET", url, timeout=timeout, **kwargs)
+
+    async def post(self, url, timeout=None, **kwargs):
+        return await self.request("POST", url, timeout=timeout, **kwargs)
+
+    def stream(self, method, url, timeout=None, **kwargs):
+        """Async context manager yielding a streaming response (never retried)"""
+        return self.client.stream(method, url, timeout=self._timeout(timeout), **kwargs)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class AsyncFloodAidBackend(FloodAidBackend):
+    """Asyncio-native FloodAidBackend.
+
+    get_weather, chat_with_gemini, stream_chat_with_gemini, submit_sos
+    and generate_sos_alert are coroutines (or an async generator) that never
+    block a worker thread while waiting on OpenWeather or Gemini. Data,
+    caches, prompt building and risk scoring are shared with the sync backend.
+    """
+
+    TIMEOUT_ERRORS = FloodAidBackend.TIMEOUT_ERRORS + (httpx.TimeoutException,)
+    CONNECTION_ERRORS = FloodAidBackend.CONNECTION_ERRORS + (httpx.TransportError,)
+    CANCELLED_ERRORS = (asyncio.CancelledError,)
+
+    def __init__(self, async_transport=None, **kwargs):
+        super().__init__(**kwargs)
+        self.async_transport = async_transport if async_transport is not None else AsyncHttpTransport(
+            pool_size=int(os.getenv("ASYNC_HTTP_POOL_SIZE", "1000")),
+            pool_limits={
+                HttpTransport.host_of(self.weather_base_url): int(os.getenv("WEATHER_POOL_SIZE", "20")),
+                HttpTransport.host_of(self.gemini_base_url): int(os.getenv("ASYNC_GEMINI_POOL_SIZE", "500"))
+            },
+            connect_timeout=float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05")),
+            retries=int(os.getenv("HTTP_RETRIES", "2"))
+        )
+        self.async_weather_flight = AsyncSingleFlight()
+        self._background_tasks = set()
+
+    def _spawn(self, coro):
+        """Run a coroutine in the background, keeping a reference until it finishes; it outlives the request, so it
+        runs without the request's budget"""
+        context = contextvars.copy_context()
+        context.run(detach_budget)
+        task = asyncio.get_running_loop().create_task(coro, context=context)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
+    async def get_weather(self, city="Lahore"):
+        """Get weather for a city from the shared cache, fetching asynchronously on a miss"""
+        key = self.city_key(city)
+        weather, state = self.weather_cache.lookup(key)
+        if state == "fresh":
+            return weather
+        if state == "stale":
+            if self.weather_cache.claim_refresh(key):
+                self._spawn(self._refresh_weather(key, city))
+            return weather
+
+        failed, state = self.weather_failures.lookup(key)
+        if state == "fresh":
+            return failed  # A recent fetch failed: demo data until the failure window passes
+
+        # Past the request's budget it moves on with demo data; the fetch carries on and fills the cache for the next one
+        budget = current_budget()
+        try:
+            return await asyncio.wait_for(asyncio.shield(self._spawn(self._store_weather(key, city))), budget.remaining())
+        except asyncio.TimeoutError:
+            budget.exceeded("weather")
+            return self._fallback_weather(city)
+
+    async def _store_weather(self, key, city):
+        weather = self._note_failure(key, await self.async_weather_flight.do(key, lambda: self._fetch_weather_async(city)))
+        if weather["success"]:
+            self.weather_cache.set(key, weather)
+        return weather
+
+    async def _refresh_weather(self, key, city):
+        try:
+            await self._store_weather(key, city)
+        finally:
+            self.weather_cache.release_refresh(key)
+
+    async def _fetch_weather_async(self, city):
+        """Fetch real-time weather from OpenWeather API without blocking"""
+        try:
+            # The fetch's own budget caps all its attempts together, so a hung upstream costs 5 s rather than 3 x 5 s
+            with request_budget("weather_fetch"), \
+                    self._upstream_call("weather.fetch", "openweather", WEATHER_FETCH, city=city) as record:
+                url, params = self._weather_request(city)
+                response = await self.async_transport.get(url, params=params, timeout=current_budget().timeout(5))
+                record["labels"]["status"] = response.status_code
+
+                if response.status_code == 200:
+                    return self._parse_weather(response.json())
+            logger.warning("Weather API returned status %s for %s", response.status_code, city)
+        except Exception as e:
+            logger.warning("Weather API error for %s: %s", city, e)
+
+        return self._fallback_weather(city)
+
+    async def retrieve_async(self, message, city):
+        """retrieve() for the event loop: building the knowledge index (seconds at 100k records) runs on a thread"""
+        if self.knowledge_stale():
+            await asyncio.to_thread(lambda: self.knowledge_index)
+        return self.retrieve(message, city)
+
+    async def _generate_async(self, model, prompt, budget, window=None):
+        """One generateContent call to ``model`` within the budget; its latency goes into ``window``"""
+        with self._upstream_call("gemini.generate", "gemini", GEMINI_REQUEST, method="generate", model=model) as record:
+            start = time.perf_counter()
+            try:
+                response = await self.async_transport.post(
+                    self._gemini_url("generateContent", model), json=self._gemini_payload(prompt), timeout=budget.timeout(30)
+                )
+            except asyncio.CancelledError:
+                # A call that lost to its hedge took at least this long; leaving it out would skew the window fast
+                if window is not None:
+                    window.observe(time.perf_counter() - start)
+                raise
+            record["labels"]["status"] = response.status_code
+            if response.status_code == 200 and window is not None:
+                window.observe(time.perf_counter() - start)
+            return response
+
+    async def _open_stream(self, model, prompt, budget, window=None):
+        """Start a streamGenerateContent call to ``model`` and read up to its first text chunk.
+
+        Returns (stack, response, first text, remaining lines); closing
+        ``stack`` ends the call and its span. The text is None for a non-200
+        (whose body has been read) or a stream that ended without any.
+        Time to the first chunk goes into ``window``.
+        """
+        stack = contextlib.AsyncExitStack()
+        start = time.perf_counter()
+        try:
+            record = stack.enter_context(
+                self._upstream_call("gemini.stream", "gemini", GEMINI_REQUEST, method="stream", model=model)
+            )
+            response = await stack.enter_async_context(self.async_transport.stream(
+                "POST",
+                self._gemini_url("streamGenerateContent", model) + "&alt=sse",
+                json=self._gemini_payload(prompt),
+                timeout=budget.timeout(30)
+            ))
+            record["labels"]["status"] = response.status_code
+            if response.status_code != 200:
+                await response.aread()
+                return stack, response, None, None
+            lines = response.aiter_lines()
+            async for line in lines:
+                text = self._sse_text(line)
+                if text:
+                    elapsed = self._first_chunk(record, start)
+                    if window is not None:
+                        window.observe(elapsed)
+                    return stack, response, text, lines
+            return stack, response, None, lines
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError) and window is not None:
+                window.observe(time.perf_counter() - start)
+            await stack.__aexit__(*sys.exc_info())
+            raise
+
+    async def chat_with_gemini(self, message, history, city):
+        """Async AI chat; returns the same messages as the sync backend"""
+        routed = self.route_intent(message, city)
+        if routed is not None:
+            return routed
+
+        if not self.gemini_key:
+            return self._fallback_answer(await self.retrieve_async(message, city), self.MISSING_KEY_MESSAGE)
+
+        budget = current_budget()
+        retrieved = []
+        with span("chat", mode="generate", city=city):
+            try:
+                weather = await self.get_weather(city)
+                answer_key = self._answer_key(message, history, weather)
+                cached = self._cached_answer(answer_key)
+                if cached is not None:
+                    return cached
+
+                retrieved = await self.retrieve_async(message, city)
+                full_prompt = self.build_prompt(message, history, city, weather=weather, retrieved=retrieved)
+
+                if not await asyncio.wrap_future(self._gemini_slot(message, weather, full_prompt, budget)):
+                    return self._fallback_answer(retrieved, self.BUSY_MESSAGE)
+
+                logger.debug("Sending async Gemini request: %.50s", message)
+                # The hedge goes to a different model with its own quota, so it doesn't wait for the scheduler
+                response = await hedge_async(
+                    "gemini.generate",
+                    lambda: self._generate_async(self.GEMINI_MODEL, full_prompt, budget, self.gemini_latency["generate"]),
+                    lambda: self._generate_async(self.gemini_hedge_model, full_prompt, budget),
+                    self._hedge_delay("generate", budget),
+                    lambda response: response.status_code == 200
+                )
+                if response.status_code != 200:
+                    return self._fallback_answer(retrieved, self._gemini_error(response))
+                data = response.json()
+
+                ai_response = self._candidate_text(data)
+                if ai_response is None:
+                    logger.warning("Unexpected Gemini response structure: %s", data)
+                    return self._fallback_answer(retrieved, self.UNEXPECTED_FORMAT_MESSAGE)
+                self._store_answer(answer_key, ai_response)
+                return ai_response
+
+            except Exception as e:
+                if isinstance(e, self.TIMEOUT_ERRORS) and budget.remaining() == 0:
+                    budget.exceeded("gemini")
+                return self._fallback_answer(retrieved, self._exception_message(e))
+
+    async def stream_chat_with_gemini(self, message, history, city):
+        """Async generator streaming the AI reply as text chunks"""
+        routed = self.route_intent(message, city)
+        if routed is not None:
+            yield routed
+            return
+
+        if not self.gemini_key:
+            yield self._fallback_answer(await self.retrieve_async(message, city), self.MISSING_KEY_MESSAGE)
+            return
+
+        budget = current_budget()
+        chunks = []
+        retrieved = []
+        with span("chat", mode="stream", city=city):
+            try:
+                weather = await self.get_weather(city)
+                answer_key = self._answer_key(message, history, weather)
+                cached = self._cached_answer(answer_key)
+                if cached is not None:
+                    yield cached
+                    return
+
+                retrieved = await self.retrieve_async(message, city)
+                full_prompt = self.build_prompt(message, history, city, weather=weather, retrieved=retrieved)
+
+                if not await asyncio.wrap_future(self._gemini_slot(message, weather, full_prompt, budget)):
+                    yield self._fallback_answer(retrieved, self.BUSY_MESSAGE)
+                    return
+
+                logger.debug("Streaming async Gemini request: %.50s", message)
+                # Streams are hedged on time to the first chunk; whichever model sends text first streams the reply
+                stack, response, text, lines = await hedge_async(
+                    "gemini.stream",
+                    lambda: self._open_stream(self.GEMINI_MODEL, full_prompt, budget, self.gemini_latency["stream"]),
+                    lambda: self._open_stream(self.gemini_hedge_model, full_prompt, budget),
+                    self._hedge_delay("stream", budget),
+                    lambda opened: opened[2] is not None,
+                    lambda opened: opened[0].aclose()
+                )
+                async with stack:
+                    if response.status_code != 200:
+                        yield self._fallback_answer(retrieved, self._gemini_error(response))
+                        return
+
+                    if text is not None:
+                        chunks.append(text)
+                        yield text
+                    async for line in lines:
+                        text = self._sse_text(line)
+                        if text:
+                            chunks.append(text)
+                            yield text
+
+                if not chunks:
+                    yield self._fallback_answer(retrieved, self.UNEXPECTED_FORMAT_MESSAGE)
+                    return
+                self._store_answer(answer_key, "".join(chunks))
+
+            except Exception as e:
+                if isinstance(e, self.TIMEOUT_ERRORS) and budget.remaining() == 0:
+                    budget.exceeded("gemini")
+                error_message = self._exception_message(e)
+                # Mid-stream failures keep the partial reply; only a reply that never started falls back to records
+                yield "\n\n" + error_message if chunks else self._fallback_answer(retrieved, error_message)
+
+    async def submit_sos(self, city, user_name="", situation="", key=None, source="ui"):
+        """Durably record an SOS alert and queue it for dispatch, without blocking the event loop"""
+        with span("sos.submit", city=city):
+            record = self._sos_record(city, user_name, situation, source)
+            return await asyncio.wrap_future(self.sos_pipeline.submit(record, key=key))
+
+    async def generate_sos_alert(self, city, user_name="", situation=""):
+        """Generate comprehensive SOS emergency alert without blocking"""
+        with span("sos", city=city):
+            return self.format_sos_alert(city, await self.get_weather(city), user_name, situation)
+
+    async def aclose(self):
+        """Release pooled upstream connections and cancel background refreshes"""
+        for task in list(self._background_tasks):
+            task.cancel()
+        await self.async_transport.aclose()
+        self.close()
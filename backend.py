@@ -2,35 +2,169 @@ import requests
 from datetime import datetime
 import os
 import json
+import contextlib
+import functools
+import itertools
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+from cache import TTLCache
+from deadlines import current_budget, request_budget
+from geo import haversine_km, lookup_city, normalize_city
+from hedging import LatencyWindow, hedge_sync
+from intents import IntentRouter, message_priority, shelter_facility, supply_terms
+from history import RollingSummarizer, compact_history, estimate_tokens, truncate_to_tokens
+from metrics import IN_FLIGHT, REGISTRY, UPSTREAM_RESPONSES, span
+from occupancy import OccupancyTracker
+from prefetch import WeatherPrefetcher
+from retrieval import SearchIndex
+from risk import assess_flood_risk_batch, assess_flood_risk_one, is_raining, risk_dict
+from scheduler import PRIORITIES, QuotaScheduler, retry_after_seconds
+from singleflight import SingleFlight
+from sos import LogSink, SMSSink, SOSPipeline, WebhookSink
+from store import MemoryRepository, SQLiteRepository, shelter_city
+from transport import HttpTransport
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+WEATHER_FETCH = REGISTRY.histogram("floodaid_weather_fetch_seconds", "OpenWeather fetch latency")
+WEATHER_FALLBACKS = REGISTRY.counter("floodaid_weather_fallback_total", "Weather requests answered with demo data")
+GEMINI_REQUEST = REGISTRY.histogram("floodaid_gemini_request_seconds", "Gemini call latency (whole stream for streaming calls)",
+                                    ("method",))
+GEMINI_FIRST_CHUNK = REGISTRY.histogram("floodaid_gemini_first_chunk_seconds", "Time to the first streamed Gemini chunk")
+PROMPT_BUILD = REGISTRY.histogram("floodaid_prompt_build_seconds", "Gemini prompt build time",
+                                  buckets=(0.00001, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05))
+RETRIEVAL = REGISTRY.histogram("floodaid_retrieval_seconds", "Knowledge index query time",
+                               buckets=(0.00001, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05))
+OFFLINE_ANSWERS = REGISTRY.counter("floodaid_offline_answers_total", "Chat replies built from local records because Gemini failed")
+INTENT_CLASSIFY = REGISTRY.histogram("floodaid_intent_classify_seconds", "Chat message intent classification time",
+                                     buckets=(0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.0005, 0.001))
+INTENT_ROUTES = REGISTRY.counter("floodaid_intent_routes_total",
+                                 "Chat messages by fast-path intent answered from local records (llm: sent to Gemini)",
+                                 ("intent",))
+PROMPT_TOKENS = REGISTRY.histogram("floodaid_prompt_tokens", "Estimated Gemini prompt size in tokens",
+                                   buckets=(250, 500, 750, 1000, 1500, 2000, 3000, 4000, 8000))
+
+# Monotonic version stamped on each fetched weather snapshot (demo data is version 0)
+_weather_versions = itertools.count(1)
+
 class FloodAidBackend:
-    def __init__(self):
+    GEMINI_MODEL = "gemini-2.5-flash"
+    GEMINI_MAX_OUTPUT_TOKENS = 1024
+    
+    # Transport exception types mapped to the timeout / network error messages
+    TIMEOUT_ERRORS = (requests.exceptions.Timeout,)
+    CONNECTION_ERRORS = (requests.exceptions.ConnectionError,)
+    # Exception types of a call abandoned by its caller (e.g. the losing side of a hedge)
+    CANCELLED_ERRORS = ()
+    
+    def __init__(self, weather_cache=None, transport=None, weather_base_url=None, gemini_base_url=None,
+                 prefetch=False, answer_cache=None, repository=None, sos_pipeline=None):
         self.gemini_key = os.getenv("GOOGLE_API_KEY")
         self.weather_key = os.getenv("OPENWEATHER_API_KEY")
+        self.weather_base_url = weather_base_url or os.getenv("OPENWEATHER_BASE_URL", "http://api.openweathermap.org")
+        self.gemini_base_url = gemini_base_url or os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com")
         
-        # Debug: Print API key status (first 10 chars only for security)
-        print(f"🔑 Gemini API Key loaded: {'Yes' if self.gemini_key else 'No'}")
-        if self.gemini_key:
-            print(f"🔑 Key starts with: {self.gemini_key[:10]}...")
-        print(f"🔑 Weather API Key loaded: {'Yes' if self.weather_key else 'No'}")
+        # Pooled keep-alive HTTP transport (injectable so tests can point at a stub server)
+        self.transport = transport if transport is not None else HttpTransport(
+            pool_size=int(os.getenv("HTTP_POOL_SIZE", "40")),
+            pool_limits={
+                HttpTransport.host_of(self.weather_base_url): int(os.getenv("WEATHER_POOL_SIZE", "20")),
+                HttpTransport.host_of(self.gemini_base_url): int(os.getenv("GEMINI_POOL_SIZE", "40"))
+            },
+            connect_timeout=float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05")),
+            retries=int(os.getenv("HTTP_RETRIES", "2"))
+        )
+        
+        # Per-city weather cache shared by chat, SOS and the weather panel
+        self.weather_cache = weather_cache if weather_cache is not None else TTLCache(
+            ttl=float(os.getenv("WEATHER_CACHE_TTL", "600")),
+            max_size=int(os.getenv("WEATHER_CACHE_SIZE", "256")),
+            stale_ttl=float(os.getenv("WEATHER_CACHE_STALE_TTL", "1800")),
+            name="weather"
+        )
+        # Failed fetches: their demo data is served for WEATHER_FAILURE_TTL seconds (0 disables), so an outage costs
+        # one slow call per city per window rather than one per request
+        self.weather_failures = TTLCache(ttl=float(os.getenv("WEATHER_FAILURE_TTL", "30")),
+                                         max_size=int(os.getenv("WEATHER_CACHE_SIZE", "256")), stale_ttl=0)
+        # Concurrent cache misses for the same city share one upstream request
+        self.weather_flight = SingleFlight()
+        
+        logger.info("Gemini API key loaded: %s", "yes" if self.gemini_key else "no")
+        logger.info("Weather API key loaded: %s", "yes" if self.weather_key else "no")
         
         # Comprehensive shelter database
         self.shelters = [
-            {"name": "Lahore Central Relief Camp", "address": "Mall Road, Lahore", "capacity": 500, "available": 200, "facilities": ["Medical", "Food", "Water", "Sanitation"], "phone": "042-99201234"},
-            {"name": "Shalamar Emergency Shelter", "address": "Shalamar Gardens, Lahore", "capacity": 300, "available": 150, "facilities": ["Food", "Water", "Beds"], "phone": "042-99205678"},
-            {"name": "Gulberg Relief Point", "address": "Gulberg III, Lahore", "capacity": 400, "available": 100, "facilities": ["Medical", "Food", "Water", "Electricity"], "phone": "042-99209012"},
-            {"name": "Karachi Saddar Shelter", "address": "Saddar Town, Karachi", "capacity": 600, "available": 350, "facilities": ["Medical", "Food", "Water", "Security"], "phone": "021-99301234"},
-            {"name": "Clifton Emergency Camp", "address": "Clifton Block 5, Karachi", "capacity": 450, "available": 280, "facilities": ["Food", "Water", "Beds", "Sanitation"], "phone": "021-99305678"},
-            {"name": "Islamabad F-7 Relief Center", "address": "F-7 Markaz, Islamabad", "capacity": 450, "available": 200, "facilities": ["Medical", "Food", "Water", "Electricity"], "phone": "051-99401234"},
-            {"name": "Rawalpindi Cantonment Shelter", "address": "Mall Road, Rawalpindi", "capacity": 380, "available": 180, "facilities": ["Food", "Water", "Medical"], "phone": "051-99405678"},
-            {"name": "Multan Ghanta Ghar Relief Camp", "address": "Ghanta Ghar, Multan", "capacity": 350, "available": 150, "facilities": ["Food", "Water", "Beds"], "phone": "061-99501234"},
-            {"name": "Faisalabad Clock Tower Shelter", "address": "Ghanta Ghar, Faisalabad", "capacity": 420, "available": 220, "facilities": ["Medical", "Food", "Water"], "phone": "041-99601234"},
-            {"name": "Peshawar Hayatabad Relief Point", "address": "Hayatabad Phase 1, Peshawar", "capacity": 300, "available": 120, "facilities": ["Food", "Water", "Security"], "phone": "091-99701234"}
+            {"name": "Lahore Central Relief Camp", "address": "Mall Road, Lahore", "lat": 31.558, "lon": 74.3294, "capacity": 500, "available": 200, "facilities": ["Medical", "Food", "Water", "Sanitation"], "phone": "042-99201234"},
+            {"name": "Shalamar Emergency Shelter", "address": "Shalamar Gardens, Lahore", "lat": 31.586, "lon": 74.382, "capacity": 300, "available": 150, "facilities": ["Food", "Water", "Beds"], "phone": "042-99205678"},
+            {"name": "Gulberg Relief Point", "address": "Gulberg III, Lahore", "lat": 31.512, "lon": 74.345, "capacity": 400, "available": 100, "facilities": ["Medical", "Food", "Water", "Electricity"], "phone": "042-99209012"},
+            {"name": "Karachi Saddar Shelter", "address": "Saddar Town, Karachi", "lat": 24.856, "lon": 67.029, "capacity": 600, "available": 350, "facilities": ["Medical", "Food", "Water", "Security"], "phone": "021-99301234"},
+            {"name": "Clifton Emergency Camp", "address": "Clifton Block 5, Karachi", "lat": 24.815, "lon": 67.03, "capacity": 450, "available": 280, "facilities": ["Food", "Water", "Beds", "Sanitation"], "phone": "021-99305678"},
+            {"name": "Islamabad F-7 Relief Center", "address": "F-7 Markaz, Islamabad", "lat": 33.721, "lon": 73.056, "capacity": 450, "available": 200, "facilities": ["Medical", "Food", "Water", "Electricity"], "phone": "051-99401234"},
+            {"name": "Rawalpindi Cantonment Shelter", "address": "Mall Road, Rawalpindi", "lat": 33.594, "lon": 73.051, "capacity": 380, "available": 180, "facilities": ["Food", "Water", "Medical"], "phone": "051-99405678"},
+            {"name": "Multan Ghanta Ghar Relief Camp", "address": "Ghanta Ghar, Multan", "lat": 30.198, "lon": 71.472, "capacity": 350, "available": 150, "facilities": ["Food", "Water", "Beds"], "phone": "061-99501234"},
+            {"name": "Faisalabad Clock Tower Shelter", "address": "Ghanta Ghar, Faisalabad", "lat": 31.418, "lon": 73.079, "capacity": 420, "available": 220, "facilities": ["Medical", "Food", "Water"], "phone": "041-99601234"},
+            {"name": "Peshawar Hayatabad Relief Point", "address": "Hayatabad Phase 1, Peshawar", "lat": 33.989, "lon": 71.448, "capacity": 300, "available": 120, "facilities": ["Food", "Water", "Security"], "phone": "091-99701234"}
         ]
         
+        # Radius used when counting shelters "in" a city
+        self.shelter_radius_km = float(os.getenv("SHELTER_RADIUS_KM", "25"))
+        
+        # Per-collection change counters; derived caches key on these. "shelters" also counts availability changes,
+        # "shelter_records" only changes to the shelter list itself (imports)
+        self.versions = {"shelters": 0, "shelter_records": 0, "relief_camps": 0, "donation_needs": 0,
+                         "medical_tips": 0, "emergency_contacts": 0, "safety_tips": 0}
+        # Opt-in answer cache for repeated history-free questions (CHAT_CACHE_TTL > 0 enables it)
+        chat_cache_ttl = float(os.getenv("CHAT_CACHE_TTL", "0"))
+        self.answer_cache = answer_cache if answer_cache is not None else (TTLCache(
+            ttl=chat_cache_ttl,
+            max_size=int(os.getenv("CHAT_CACHE_SIZE", "1024")),
+            stale_ttl=0,
+            name="answer"
+        ) if chat_cache_ttl > 0 else None)
+        # Memoized per-city system prompts
+        self.prompt_cache = TTLCache(ttl=float("inf"), max_size=int(os.getenv("PROMPT_CACHE_SIZE", "512")), name="prompt")
+        # Token budget for the whole prompt; history gets what the system prompt and message leave
+        self.prompt_token_budget = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+        self.history_max_turns = int(os.getenv("HISTORY_MAX_TURNS", "4"))
+        self.turn_token_limit = int(os.getenv("HISTORY_TURN_TOKENS", "512"))
+        self.message_token_limit = int(os.getenv("MESSAGE_TOKEN_LIMIT", "2048"))
+        # Opt-in rolling summary of turns that no longer fit (HISTORY_SUMMARY=1), built off the request path
+        self.summary_token_limit = int(os.getenv("HISTORY_SUMMARY_TOKENS", "200"))
+        self.summarizer = RollingSummarizer(self._summarize_turns) if os.getenv("HISTORY_SUMMARY", "0") == "1" else None
+        # Records retrieved per message for the prompt (and offline answers), and their token cap; RETRIEVAL_K=0 disables
+        self.retrieval_k = int(os.getenv("RETRIEVAL_K", "5"))
+        self.retrieval_token_limit = int(os.getenv("RETRIEVAL_TOKENS", "400"))
+        # Least retrieval score (0-1) for a record to be shown on its own when Gemini is unavailable
+        self.offline_min_score = float(os.getenv("OFFLINE_MIN_SCORE", "0.2"))
+        self._knowledge = None  # (versions, records, SearchIndex), built on first use
+        self._knowledge_lock = threading.Lock()
+        # Outbound Gemini quota (GEMINI_RPM / GEMINI_TPM, 0 = unlimited): calls queue most urgent first for at most
+        # GEMINI_QUEUE_TIMEOUT seconds, and a 429 holds them all back for its Retry-After (GEMINI_RETRY_AFTER if absent)
+        self.gemini_scheduler = QuotaScheduler(
+            rpm=int(os.getenv("GEMINI_RPM", "0")),
+            tpm=int(os.getenv("GEMINI_TPM", "0")),
+            burst_seconds=float(os.getenv("GEMINI_BURST_SECONDS", "10"))
+        )
+        self.gemini_queue_timeout = float(os.getenv("GEMINI_QUEUE_TIMEOUT", "10"))
+        self.gemini_retry_after = float(os.getenv("GEMINI_RETRY_AFTER", "5"))
+        # A Gemini call still running at its endpoint's hedge percentile of recent latencies (deadlines.ENDPOINTS)
+        # is raced against the same prompt on GEMINI_HEDGE_MODEL and the first answer wins; "" disables hedging
+        self.gemini_hedge_model = os.getenv("GEMINI_HEDGE_MODEL", "gemini-2.5-flash-lite")
+        window = int(os.getenv("GEMINI_HEDGE_WINDOW", "200"))
+        min_samples = int(os.getenv("GEMINI_HEDGE_MIN_SAMPLES", "20"))
+        self.gemini_latency = {"generate": LatencyWindow(window, min_samples), "stream": LatencyWindow(window, min_samples)}
+        self.hedge_executor = ThreadPoolExecutor(max_workers=int(os.getenv("GEMINI_HEDGE_THREADS", "64")),
+                                                 thread_name_prefix="gemini-hedge")
+        # Lookups (nearest shelter, contact numbers, camp supplies) answered from the records without Gemini; INTENT_ROUTER=0 disables
+        self.intent_router = IntentRouter() if os.getenv("INTENT_ROUTER", "1") == "1" else None
+        
         # Emergency contacts with categories
         self.emergency_contacts = {
             "Emergency Services": [
@@ -109,34 +243,185 @@ class FloodAidBackend:
                 "Document damage for insurance claims"
             ]
         }
+        
+        # Data repository: the lists above by default, or SQLite when FLOODAID_DB is set
+        self.repo = repository if repository is not None else self._default_repository()
+        
+        # Running occupancy aggregates, persisted to the repository on every update
+        self.occupancy = OccupancyTracker(
+            self.repo.list_shelters(),
+            persist=lambda name, available: self.repo.update_shelter(name, available=available)
+        )
+        
+        # Background weather refresh for every shelter / relief camp city
+        self.prefetcher = WeatherPrefetcher(
+            self,
+            interval=float(os.getenv("WEATHER_PREFETCH_INTERVAL", "480")),
+            jitter=float(os.getenv("WEATHER_PREFETCH_JITTER", "30")),
+            max_workers=int(os.getenv("WEATHER_PREFETCH_WORKERS", "4"))
+        )
+        if prefetch:
+            self.prefetcher.start()
+        
+        # Durable SOS log and dispatch workers, opened on the first SOS rather than at start-up
+        self._sos_pipeline = sos_pipeline
+        self._sos_lock = threading.Lock()
+    
+    def _default_repository(self):
+        """SQLite repository at $FLOODAID_DB (seeded from the built-in lists if empty), else in-memory"""
+        seed = (self.shelters, self.relief_camps, self.donation_needs, self.medical_tips, self.emergency_contacts)
+        db_path = os.getenv("FLOODAID_DB")
+        if not db_path:
+            return MemoryRepository(*seed)
+        repo = SQLiteRepository(db_path)
+        if repo.is_empty():
+            repo.seed(*seed)
+        return repo
+    
+    @property
+    def sos_pipeline(self):
+        if self._sos_pipeline is None:
+            with self._sos_lock:
+                if self._sos_pipeline is None:
+                    self._sos_pipeline = self._default_sos_pipeline()
+        return self._sos_pipeline
+    
+    def _default_sos_pipeline(self):
+        """SOS pipeline logging to $SOS_LOG_PATH, dispatching to the configured webhook / SMS gateway (else the log)"""
+        sinks = []
+        if os.getenv("SOS_WEBHOOK_URL"):
+            sinks.append(WebhookSink(os.getenv("SOS_WEBHOOK_URL"), self.transport))
+        if os.getenv("SOS_SMS_URL"):
+            recipients = [number.strip() for number in os.getenv("SOS_SMS_RECIPIENTS", "").split(",") if number.strip()]
+            sinks.append(SMSSink(os.getenv("SOS_SMS_URL"), recipients, self.transport))
+        return SOSPipeline(
+            os.getenv("SOS_LOG_PATH", "sos_alerts.log"),
+            sinks or [LogSink()],
+            batch_size=int(os.getenv("SOS_BATCH_SIZE", "100")),
+            linger=float(os.getenv("SOS_BATCH_LINGER", "0.05")),
+            fsync_interval=float(os.getenv("SOS_FSYNC_INTERVAL", "0"))
+        )
+    
+    @staticmethod
+    def city_key(city):
+        """Normalized city name, for cache and deduplication keys"""
+        return " ".join(city.split()).lower()
     
     def get_weather(self, city="Lahore"):
+        """Get weather for a city, served from the shared TTL cache when possible"""
+        key = self.city_key(city)
+        return self.weather_cache.get_or_load(
+            key,
+            lambda: self._load_weather(key, city),
+            should_cache=lambda weather: weather["success"]
+        )
+    
+    def _load_weather(self, key, city):
+        """Demo data while a recent fetch for the city failed, else one shared upstream fetch"""
+        failed, state = self.weather_failures.lookup(key)
+        if state == "fresh":
+            return failed
+        return self.weather_flight.do(key, lambda: self._note_failure(key, self._fetch_weather(city)))
+    
+    def _note_failure(self, key, weather):
+        """Remember a failed fetch's demo data for the failure window; returns the weather"""
+        if not weather["success"]:
+            self.weather_failures.set(key, weather)
+        return weather
+    
+    def refresh_weather(self, city):
+        """Fetch weather now and store it in the cache, ignoring any fresh entry"""
+        key = self.city_key(city)
+        weather = self.weather_flight.do(key, lambda: self._note_failure(key, self._fetch_weather(city)))
+        if weather["success"]:
+            self.weather_cache.set(key, weather)
+        return weather
+    
+    def known_cities(self):
+        """Cities we serve: shelter address cities plus relief camp cities"""
+        return list(dict.fromkeys(self.repo.shelter_cities() + self.repo.relief_camp_cities()))
+    
+    def _weather_request(self, city):
+        """URL and query parameters for an OpenWeather current-weather call"""
+        return f"{self.weather_base_url}/data/2.5/weather", {"q": f"{city},PK", "appid": self.weather_key, "units": "metric"}
+    
+    def _fetch_weather(self, city):
         """Fetch real-time weather from OpenWeather API"""
         try:
-            url = f"http://api.openweathermap.org/data/2.5/weather?q={city},PK&appid={self.weather_key}&units=metric"
-            response = requests.get(url, timeout=5)
-            
-            if response.status_code == 200:
-                data = response.json()
-                return {
-                    "success": True,
-                    "city": data["name"],
-                    "temp": round(data["main"]["temp"], 1),
-                    "feels_like": round(data["main"]["feels_like"], 1),
-                    "humidity": data["main"]["humidity"],
-                    "pressure": data["main"]["pressure"],
-                    "description": data["weather"][0]["description"],
-                    "main": data["weather"][0]["main"],
-                    "wind_speed": round(data["wind"]["speed"], 1),
-                    "clouds": data["clouds"]["all"],
-                    "visibility": data.get("visibility", 10000) / 1000
-                }
+            # The fetch's own budget caps all its attempts together, so a hung upstream costs 5 s rather than 3 x 5 s
+            with request_budget("weather_fetch"), \
+                    self._upstream_call("weather.fetch", "openweather", WEATHER_FETCH, city=city) as record:
+                url, params = self._weather_request(city)
+                response = self.transport.get(url, params=params, timeout=current_budget().timeout(5))
+                record["labels"]["status"] = response.status_code
+                
+                if response.status_code == 200:
+                    return self._parse_weather(response.json())
+            logger.warning("Weather API returned status %s for %s", response.status_code, city)
         except Exception as e:
-            print(f"Weather API Error: {e}")
+            logger.warning("Weather API error for %s: %s", city, e)
+        
+        return self._fallback_weather(city)
+    
+    @classmethod
+    def _failure_status(cls, e):
+        """Status label for an upstream call that raised instead of responding"""
+        if isinstance(e, cls.TIMEOUT_ERRORS):
+            return "timeout"
+        if isinstance(e, cls.CONNECTION_ERRORS):
+            return "connection_error"
+        if isinstance(e, cls.CANCELLED_ERRORS):
+            return "cancelled"
+        return "error"
+    
+    @contextlib.contextmanager
+    def _upstream_call(self, name, upstream, histogram, **labels):
+        """Span one upstream call: in-flight gauge, latency histogram and status counter.
         
-        # Fallback demo data
+        The block sets record["labels"]["status"] once a response arrives;
+        calls that raise first are counted as timeout / connection_error / cancelled / error.
+        """
+        with IN_FLIGHT.track(kind="upstream", name=upstream), \
+                span(name, histogram, upstream=upstream, **labels) as record:
+            try:
+                yield record
+            except (Exception, *self.CANCELLED_ERRORS) as e:
+                record["labels"].setdefault("status", self._failure_status(e))
+                raise
+            finally:
+                if "status" in record["labels"]:
+                    UPSTREAM_RESPONSES.inc(upstream=upstream, status=record["labels"]["status"])
+    
+    def _fallback_weather(self, city):
+        WEATHER_FALLBACKS.inc()
+        return self._demo_weather(city)
+    
+    @staticmethod
+    def _parse_weather(data):
+        """Convert an OpenWeather response body into our weather dict"""
+        return {
+            "success": True,
+            "version": next(_weather_versions),
+            "city": data["name"],
+            "temp": round(data["main"]["temp"], 1),
+            "feels_like": round(data["main"]["feels_like"], 1),
+            "humidity": data["main"]["humidity"],
+            "pressure": data["main"]["pressure"],
+            "description": data["weather"][0]["description"],
+            "main": data["weather"][0]["main"],
+            "wind_speed": round(data["wind"]["speed"], 1),
+            "clouds": data["clouds"]["all"],
+            "visibility": data.get("visibility", 10000) / 1000,
+            "lat": data.get("coord", {}).get("lat"),
+            "lon": data.get("coord", {}).get("lon")
+        }
+    
+    @staticmethod
+    def _demo_weather(city):
+        """Fallback demo data used when the weather API is unavailable"""
         return {
             "success": False,
+            "version": 0,
             "city": city,
             "temp": 28.5,
             "feels_like": 31.0,
@@ -151,48 +436,17 @@ class FloodAidBackend:
     
     def assess_flood_risk(self, weather_data):
         """Calculate flood risk based on weather conditions"""
-        risk_score = 0
-        factors = []
-        
-        # High humidity
-        if weather_data["humidity"] > 85:
-            risk_score += 30
-            factors.append("Very high humidity")
-        elif weather_data["humidity"] > 75:
-            risk_score += 20
-            factors.append("High humidity")
-        
-        # Rain conditions
-        if "rain" in weather_data["description"].lower() or weather_data["main"] == "Rain":
-            risk_score += 40
-            factors.append("Active rainfall")
-        
-        # Low pressure
-        if weather_data["pressure"] < 1000:
-            risk_score += 20
-            factors.append("Low atmospheric pressure")
-        
-        # Poor visibility
-        if weather_data["visibility"] < 5:
-            risk_score += 10
-            factors.append("Poor visibility")
-        
-        # Determine risk level
-        if risk_score >= 70:
-            return {"level": "Critical", "score": risk_score, "factors": factors, "color": "red"}
-        elif risk_score >= 40:
-            return {"level": "High", "score": risk_score, "factors": factors, "color": "orange"}
-        elif risk_score >= 20:
-            return {"level": "Moderate", "score": risk_score, "factors": factors, "color": "yellow"}
-        else:
-            return {"level": "Low", "score": risk_score, "factors": factors, "color": "green"}
+        return risk_dict(*assess_flood_risk_one(
+            weather_data["humidity"],
+            weather_data["pressure"],
+            weather_data["visibility"],
+            is_raining(weather_data["description"], weather_data["main"])
+        ))
     
-    def chat_with_gemini(self, message, history, city):
-        """Enhanced AI chat with proper error handling and debugging"""
-        
-        # Check if API key exists
-        if not self.gemini_key:
-            return """❌ **API Configuration Error**
+    # Vectorized scoring for columnar data (many locations x forecast steps)
+    assess_flood_risk_batch = staticmethod(assess_flood_risk_batch)
+    
+    MISSING_KEY_MESSAGE = """❌ **API Configuration Error**
             
 The Gemini API key is not configured. Please:
 1. Create a `.env` file in your project root
@@ -203,13 +457,18 @@ Meanwhile, I can still help you with:
 📞 Emergency contacts  
 ⚕️ Medical tips
 📦 Relief camp locations"""
-
-        try:
-            weather = self.get_weather(city)
-            risk = self.assess_flood_risk(weather)
-            
-            # Build system context
-            system_prompt = f"""You are FloodAid AI, an expert disaster relief assistant for Pakistan with deep knowledge of:
+    
+    UNEXPECTED_FORMAT_MESSAGE = "I received an unexpected response format. Please try rephrasing your question."
+    
+    BUSY_MESSAGE = """⏳ **AI Assistant Busy**
+Too many people are asking right now. Please try again in a minute.
+**For immediate emergency help:**
+🆘 Rescue 1122: **1122**
+🚑 Edhi Ambulance: **115**
+📞 PDMA: **1129**"""
+    
+    # Static parts of the system prompt, built once per process
+    PROMPT_HEADER = """You are FloodAid AI, an expert disaster relief assistant for Pakistan with deep knowledge of:
 - Flood safety and emergency protocols
 - Pakistani geography and infrastructure
 - Local relief organizations and resources
@@ -217,13 +476,8 @@ Meanwhile, I can still help you with:
 - Psychological support during disasters
 CURRENT SITUATION:
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-📍 Location: {weather['city']}, Pakistan
-🌡️ Temperature: {weather['temp']}°C (feels like {weather['feels_like']}°C)
-🌦️ Conditions: {weather['description']}
-💧 Humidity: {weather['humidity']}% | 💨 Wind: {weather['wind_speed']} m/s
-⚠️ Flood Risk: {risk['level']} ({risk['score']}/100)
-🚨 Risk Factors: {', '.join(risk['factors']) if risk['factors'] else 'None'}
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+    PROMPT_INSTRUCTIONS = """━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 INSTRUCTIONS:
 ✅ Be empathetic and supportive - people are scared
 ✅ Provide specific, actionable advice
@@ -238,87 +492,447 @@ EMERGENCY CONTACTS:
 🆘 Rescue 1122: **1122** (Primary Emergency)
 🚑 Edhi Ambulance: **115**
 📞 PDMA Helpline: **1129**
-Available shelters in {weather['city']}: {len([s for s in self.shelters if city.lower() in s['address'].lower()])}"""
-
-            # Build conversation history
-            conversation = ""
-            if history:
-                for human, assistant in history[-4:]:  # Last 4 exchanges
-                    conversation += f"User: {human}\nAssistant: {assistant}\n\n"
-            
-            full_prompt = system_prompt + "\n\nCONVERSATION:\n" + conversation + f"User: {message}\nAssistant:"
-            
-            print(f"🤖 Sending request to Gemini API...")
-            print(f"📝 Message: {message[:50]}...")
-            
-            # Use the correct Gemini API endpoint
-            url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={self.gemini_key}"
-            
-            payload = {
-                "contents": [{
-                    "parts": [{"text": full_prompt}]
-                }],
-                "generationConfig": {
-                    "temperature": 0.7,
-                    "maxOutputTokens": 1024,
-                    "topP": 0.9,
-                    "topK": 40
-                },
-                "safetySettings": [
-                    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-                    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-                    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-                    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"}
-                ]
-            }
+"""
+    
+    def touch(self, collection):
+        """Mark a data collection (e.g. "shelters") as changed, invalidating derived caches"""
+        with self.occupancy.lock:
+            self.versions[collection] = self.versions.get(collection, 0) + 1
+    
+    def system_prompt(self, city, weather):
+        """System prompt for a city, memoized on (city, weather snapshot, shelter data version)"""
+        key = (self.city_key(city), weather["version"], self.versions["shelters"])
+        prompt, state = self.prompt_cache.lookup(key)
+        if state != "miss":
+            return prompt
+        
+        risk = self.assess_flood_risk(weather)
+        situation = f"""📍 Location: {weather['city']}, Pakistan
+🌡️ Temperature: {weather['temp']}°C (feels like {weather['feels_like']}°C)
+🌦️ Conditions: {weather['description']}
+💧 Humidity: {weather['humidity']}% | 💨 Wind: {weather['wind_speed']} m/s
+⚠️ Flood Risk: {risk['level']} ({risk['score']}/100)
+🚨 Risk Factors: {', '.join(risk['factors']) if risk['factors'] else 'None'}
+"""
+        shelters = f"Available shelters in {weather['city']}: {self.count_shelters_near(city, weather)}"
+        prompt = self.PROMPT_HEADER + situation + self.PROMPT_INSTRUCTIONS + shelters
+        self.prompt_cache.set(key, prompt)
+        return prompt
+    
+    # Collections whose text is indexed; shelter availability is read live, so check-ins don't force a rebuild
+    KNOWLEDGE_COLLECTIONS = ("shelter_records", "relief_camps", "donation_needs", "medical_tips", "emergency_contacts",
+                             "safety_tips")
+    
+    def _knowledge_records(self):
+        """(kind, record, city or None) for every record chat answers can draw on"""
+        for shelter in self.repo.list_shelters():
+            yield "shelter", shelter, shelter_city(shelter)
+        for camp in self.repo.list_relief_camps():
+            yield "relief_camp", camp, camp["city"]
+        for tip in self.repo.list_medical_tips():
+            yield "medical_tip", tip, None
+        for phase, tips in self.safety_tips.items():
+            for tip in tips:
+                yield "safety_tip", {"phase": phase, "tip": tip}, None
+        for category, contacts in self.repo.list_emergency_contacts().items():
+            for contact in contacts:
+                yield "contact", dict(contact, category=category), None
+        for need in self.repo.list_donation_needs():
+            yield "donation_need", need, None
+    
+    @staticmethod
+    def _knowledge_text(kind, record):
+        """Indexed text of a record, including words people use when asking for that kind of help"""
+        if kind == "shelter":
+            return f"shelter stay sleep {record['name']} {record['address']} {' '.join(record['facilities'])} {record['phone']}"
+        if kind == "relief_camp":
+            return f"relief camp supplies {record['name']} {record['city']} {' '.join(record['supplies'])} {record['contact']}"
+        if kind == "medical_tip":
+            return f"medical health doctor {record['title']} {record['desc']}"
+        if kind == "safety_tip":
+            return f"safety {record['phase']} {record['tip']}"
+        if kind == "contact":
+            return f"emergency contact call phone number helpline {record['category']} {record['name']} {record['number']}"
+        return f"donation donate need {record['item']} {record['priority']} {record['urgency']}"
+    
+    def _knowledge_line(self, kind, record):
+        """One-line rendering of a retrieved record for the prompt or an offline answer"""
+        if kind == "shelter":
+            available = self.occupancy.available(record["name"], record["available"])
+            return (f"Shelter: {record['name']}, {record['address']} | {available}/{record['capacity']} spaces free | "
+                    f"{', '.join(record['facilities'])} | 📞 {record['phone']}")
+        if kind == "relief_camp":
+            return (f"Relief camp: {record['name']}, {record['city']} | {', '.join(record['supplies'])} | "
+                    f"open {record['open']} | 📞 {record['contact']}")
+        if kind == "medical_tip":
+            return f"Medical ({record['priority']}): {record['title']} - {record['desc']}"
+        if kind == "safety_tip":
+            return f"Safety ({record['phase']}): {record['tip']}"
+        if kind == "contact":
+            return f"Contact ({record['category']}): {record['name']} {record['number']} ({record['available']})"
+        return f"Donation need ({record['priority']}, {record['urgency']}): {record['item']}, {record['quantity']}"
+    
+    # Score weight per record kind: listings match questions on incidental words (a shelter's "Water"
+    # facility, a camp's "Medical Aid"), so advice outranks them unless the question is about the listing itself
+    KNOWLEDGE_WEIGHTS = {"shelter": 0.6, "relief_camp": 0.6, "medical_tip": 1.0, "safety_tip": 1.0, "contact": 0.8,
+                         "donation_need": 0.5}
+    
+    def _build_knowledge(self):
+        entries = list(self._knowledge_records())
+        index = SearchIndex((self._knowledge_text(kind, record), normalize_city(city) if city else None,
+                             self.KNOWLEDGE_WEIGHTS[kind])
+                            for kind, record, city in entries)
+        return [(kind, record) for kind, record, _ in entries], index
+    
+    def _knowledge_versions(self):
+        return tuple(self.versions[collection] for collection in self.KNOWLEDGE_COLLECTIONS)
+    
+    def knowledge_stale(self):
+        """True if the next retrieval has to (re)build the index"""
+        return self._knowledge is None or self._knowledge[0] != self._knowledge_versions()
+    
+    @property
+    def knowledge_index(self):
+        """(records, SearchIndex over them), rebuilt when an indexed collection changes"""
+        versions = self._knowledge_versions()
+        knowledge = self._knowledge
+        if knowledge is None or knowledge[0] != versions:
+            with self._knowledge_lock:
+                knowledge = self._knowledge
+                if knowledge is None or knowledge[0] != versions:
+                    with span("retrieval.build"):
+                        knowledge = self._knowledge = (versions, *self._build_knowledge())
+        return knowledge[1], knowledge[2]
+    
+    def retrieve(self, message, city, k=None):
+        """Top (kind, record, score) matches for a message, preferring records in the user's city"""
+        k = self.retrieval_k if k is None else k
+        if not k:
+            return []
+        records, index = self.knowledge_index
+        with RETRIEVAL.time():
+            hits = index.search(message, k, group=normalize_city(city))
+        return [(*records[doc], score) for doc, score in hits]
+    
+    def _knowledge_section(self, retrieved):
+        """Prompt block listing retrieved records, cut to retrieval_token_limit tokens"""
+        if not retrieved:
+            return ""
+        lines = []
+        used = 0
+        for kind, record, _ in retrieved:
+            line = "- " + self._knowledge_line(kind, record) + "\n"
+            cost = estimate_tokens(line)
+            if used + cost > self.retrieval_token_limit:
+                if not lines:
+                    lines.append(truncate_to_tokens(line, self.retrieval_token_limit) + "\n")
+                break
+            lines.append(line)
+            used += cost
+        return "\n\nRELEVANT FLOODAID RECORDS (prefer these details when they answer the question):\n" + "".join(lines)
+    
+    OFFLINE_HEADER = "⚠️ **AI assistant unavailable** - here is what FloodAid has on record for your question:\n\n"
+    EMERGENCY_FOOTER = "\n\n🆘 Rescue 1122: **1122** | 🚑 Edhi: **115** | 📞 PDMA: **1129**"
+    
+    def _fallback_answer(self, retrieved, error_message):
+        """Answer from the relevant retrieved records when Gemini can't, else the error message"""
+        relevant = [(kind, record) for kind, record, score in retrieved if score >= self.offline_min_score]
+        if not relevant:
+            return error_message
+        OFFLINE_ANSWERS.inc()
+        return (self.OFFLINE_HEADER
+                + "\n".join(f"- {self._knowledge_line(kind, record)}" for kind, record in relevant)
+                + self.EMERGENCY_FOOTER)
+    
+    def route_intent(self, message, city):
+        """Answer a lookup message straight from the records, or None if it needs Gemini"""
+        if self.intent_router is None:
+            return None
+        with INTENT_CLASSIFY.time():
+            intent = self.intent_router.classify(message)
+        answer = None
+        if intent is not None:
+            handler = getattr(self, "_answer_" + intent["intent"])
+            answer = handler(intent["city"] or city, intent["item"], intent["org"])
+        INTENT_ROUTES.inc(intent=intent["intent"] if answer else "llm")
+        return answer
+    
+    def _answer_nearest_shelter(self, city, item, org):
+        facility = shelter_facility(item)
+        nearest = self.find_nearest_shelters(city, k=3, facilities=(facility,) if facility else ())
+        if not nearest:
+            return None
+        lines = [f"- {'' if distance is None else f'{distance:.1f} km: '}{self._knowledge_line('shelter', shelter)}"
+                 for distance, shelter in nearest]
+        title = f"🏠 **Nearest shelters with space to {city.title()}**" + (f" ({facility})" if facility else "")
+        return title + "\n\n" + "\n".join(lines) + self.EMERGENCY_FOOTER
+    
+    def _answer_contact(self, city, item, org):
+        contacts = [dict(contact, category=category)
+                    for category, entries in self.repo.list_emergency_contacts().items() for contact in entries]
+        camps = []
+        if org:
+            contacts = [contact for contact in contacts if org in contact["name"].lower()]
+            # Camps run by the organisation, the user's city first
+            camps = sorted((camp for camp in self.repo.list_relief_camps() if org in camp["name"].lower()),
+                           key=lambda camp: normalize_city(camp["city"]) != normalize_city(city))[:3]
+        lines = ([f"- {self._knowledge_line('contact', contact)}" for contact in contacts]
+                 + [f"- {self._knowledge_line('relief_camp', camp)}" for camp in camps])
+        if not lines:
+            return None
+        title = f"📞 **{org.title()} contacts**" if org else "📞 **Emergency contacts**"
+        return title + "\n\n" + "\n".join(lines) + self.EMERGENCY_FOOTER
+    
+    def _answer_relief_camp(self, city, item, org):
+        def wanted(camp):
+            return ((not org or org in camp["name"].lower())
+                    and (not item or any(term in supply.lower() for supply in camp["supplies"] for term in supply_terms(item))))
+        
+        camps = [camp for camp in self.repo.list_relief_camps(city) if wanted(camp)]
+        if camps:
+            title = f"📦 **Relief camps in {city.title()}**" + (f" with {item}" if item else "")
+        else:
+            camps = [camp for camp in self.repo.list_relief_camps() if wanted(camp)]
+            if not camps:
+                return None
+            # Closest camp cities first when both ends are in the gazetteer
+            coords = self.locate_city(city)
+            if coords is not None:
+                def distance(camp):
+                    camp_coords = lookup_city(camp["city"])
+                    return haversine_km(*coords, *camp_coords) if camp_coords else float("inf")
+                camps.sort(key=distance)
+            title = (f"📦 **No camp in {city.title()} lists {item}; closest on record**" if item
+                     else f"📦 **No relief camp on record in {city.title()}; closest ones**")
+        lines = [f"- {self._knowledge_line('relief_camp', camp)}" for camp in camps[:5]]
+        return title + "\n\n" + "\n".join(lines) + self.EMERGENCY_FOOTER
+    
+    def build_prompt(self, message, history, city, weather=None, retrieved=None):
+        """Build the full Gemini prompt: system context, relevant records, recent history and the new message"""
+        return self.assemble_prompt(message, history, city, weather, retrieved)[0]
+    
+    def assemble_prompt(self, message, history, city, weather=None, retrieved=None):
+        """(prompt, estimated token counts) with the history compacted to the prompt token budget.
+        
+        ``retrieved`` records (looked up if not given) are listed after the
+        system prompt, capped at retrieval_token_limit. The newest turns
+        that fit are kept (each message truncated to turn_token_limit, at
+        most history_max_turns of them); older turns are represented by the
+        rolling summary when one is enabled and ready.
+        """
+        if weather is None:
+            weather = self.get_weather(city)
+        if retrieved is None:
+            retrieved = self.retrieve(message, city)
+        
+        with span("prompt.build", PROMPT_BUILD) as record:
+            system = self.system_prompt(city, weather)
+            knowledge = self._knowledge_section(retrieved)
+            message = truncate_to_tokens(message, self.message_token_limit)
+            counts = {"system": self._system_tokens(system), "retrieved": estimate_tokens(knowledge),
+                      "message": estimate_tokens(message)}
             
-            response = requests.post(url, json=payload, timeout=30)
+            # Build conversation history
+            budget = self.prompt_token_budget - counts["system"] - counts["retrieved"] - counts["message"]
+            if self.summarizer is not None:
+                budget -= self.summary_token_limit
+            turns, older = compact_history(history or [], budget, self.history_max_turns, self.turn_token_limit)
+            summary = self.summarizer.summary_for(older) if older and self.summarizer is not None else None
             
-            print(f"📡 Response Status: {response.status_code}")
+            conversation = ""
+            if summary:
+                summary = truncate_to_tokens(summary, self.summary_token_limit)
+                conversation = f"Summary of earlier conversation: {summary}\n\n"
+            conversation += "".join(f"User: {human}\nAssistant: {assistant}\n\n" for human, assistant in turns)
             
-            if response.status_code == 200:
-                data = response.json()
-                print(f"✅ Response received successfully")
-                
-                # Check if response has the expected structure
-                if "candidates" in data and len(data["candidates"]) > 0:
-                    ai_response = data["candidates"][0]["content"]["parts"][0]["text"]
-                    return ai_response
-                else:
-                    print(f"⚠️ Unexpected response structure: {data}")
-                    return "I received an unexpected response format. Please try rephrasing your question."
-                    
-            elif response.status_code == 400:
+            prompt = system + knowledge + "\n\nCONVERSATION:\n" + conversation + f"User: {message}\nAssistant:"
+            counts.update(
+                summary=estimate_tokens(summary),
+                history=sum(estimate_tokens(human) + estimate_tokens(assistant) for human, assistant in turns),
+                turns_kept=len(turns),
+                turns_dropped=len(older)
+            )
+            # Sum of the parts plus the "User:/Assistant:" scaffolding, instead of re-encoding the whole prompt
+            counts["total"] = (counts["system"] + counts["retrieved"] + counts["summary"] + counts["history"] + counts["message"]
+                               + self.PROMPT_SCAFFOLD_TOKENS * (len(turns) + 1) + (10 if summary else 0))
+            record["labels"].update(prompt_tokens=counts["total"], turns_kept=len(turns), turns_dropped=len(older))
+        PROMPT_TOKENS.observe(counts["total"])
+        return prompt, counts
+    
+    # Estimated tokens of "User: ...\nAssistant: ...\n\n" around each turn
+    PROMPT_SCAFFOLD_TOKENS = 5
+    
+    # System prompts are memoized, so the same string objects recur; their estimates can be too
+    _system_tokens = staticmethod(functools.lru_cache(maxsize=512)(estimate_tokens))
+    
+    SUMMARY_INSTRUCTIONS = ("Summarize this flood-relief conversation in under 80 words for the assistant's memory. "
+                            "Keep the user's location, situation and needs, and any shelters, contacts or advice "
+                            "already given.\n\n")
+    
+    def _summarize_turns(self, previous, turns):
+        """Fold turns into the previous rolling summary with a short Gemini call (runs off the request path,
+        behind every chat call in the quota queue)"""
+        text = self.SUMMARY_INSTRUCTIONS
+        if previous:
+            text += f"Summary so far: {previous}\n\n"
+        text += "".join(
+            f"User: {truncate_to_tokens(human, self.turn_token_limit)}\n"
+            f"Assistant: {truncate_to_tokens(assistant, self.turn_token_limit)}\n\n"
+            for human, assistant in turns
+        )
+        budget = current_budget()
+        slot = self.gemini_scheduler.submit(estimate_tokens(text) + self.GEMINI_MAX_OUTPUT_TOKENS, PRIORITIES.index("low"),
+                                            timeout=budget.timeout(self.gemini_queue_timeout))
+        if not slot.result():
+            return None
+        with self._upstream_call("gemini.summarize", "gemini", GEMINI_REQUEST, method="summarize") as record:
+            response = self.transport.post(self._gemini_url("generateContent"), json=self._gemini_payload(text),
+                                           timeout=budget.timeout(30))
+            if response.status_code == 429:
+                self.gemini_scheduler.pause(retry_after_seconds(response.headers.get("Retry-After"), self.gemini_retry_after))
+            record["labels"]["status"] = response.status_code
+            if response.status_code != 200:
+                return None
+            return self._candidate_text(response.json())
+    
+    @staticmethod
+    def _normalize_query(message):
+        """Lowercase, strip punctuation and collapse whitespace"""
+        return " ".join(re.sub(r"[^\w\s]", " ", message.lower()).split())
+    
+    def _answer_key(self, message, history, weather):
+        """Answer-cache key (query, canonical city, risk level), or None if the turn can't be cached"""
+        if self.answer_cache is None or history:
+            return None
+        return (self._normalize_query(message), weather["city"].lower(), self.assess_flood_risk(weather)["level"])
+    
+    def _cached_answer(self, key):
+        if key is None:
+            return None
+        answer, state = self.answer_cache.lookup(key)
+        return answer if state == "fresh" else None
+    
+    def _store_answer(self, key, answer):
+        if key is not None:
+            self.answer_cache.set(key, answer)
+    
+    def _gemini_url(self, method, model=None):
+        """Gemini REST endpoint for generateContent / streamGenerateContent"""
+        return f"{self.gemini_base_url}/v1beta/models/{model or self.GEMINI_MODEL}:{method}?key={self.gemini_key}"
+    
+    @staticmethod
+    def _gemini_payload(prompt):
+        return {
+            "contents": [{
+                "parts": [{"text": prompt}]
+            }],
+            "generationConfig": {
+                "temperature": 0.7,
+                "maxOutputTokens": FloodAidBackend.GEMINI_MAX_OUTPUT_TOKENS,
+                "topP": 0.9,
+                "topK": 40
+            },
+            "safetySettings": [
+                {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+                {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+                {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+                {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"}
+            ]
+        }
+    
+    @staticmethod
+    def _candidate_text(data):
+        """Extract the text of the first candidate, or None if there is none"""
+        candidates = data.get("candidates") or []
+        if not candidates:
+            return None
+        parts = candidates[0].get("content", {}).get("parts", [])
+        return "".join(part.get("text", "") for part in parts)
+    
+    @classmethod
+    def _sse_text(cls, line):
+        """Text carried by one line of a streamGenerateContent SSE response"""
+        if not line or not line.startswith("data:"):
+            return None
+        return cls._candidate_text(json.loads(line[5:]))
+    
+    @staticmethod
+    def _status_error_message(status_code, response):
+        """User-facing message for a non-200 Gemini response"""
+        if status_code == 400:
+            try:
                 error_data = response.json()
-                print(f"❌ API Error 400: {error_data}")
-                return f"""❌ **API Request Error**
+            except ValueError:
+                error_data = {}
+            logger.error("Gemini API error 400: %s", error_data)
+            return f"""❌ **API Request Error**
 There was an issue with the request. This might be due to:
 - Invalid API key format
 - API key restrictions
 - Request format issue
 Error details: {error_data.get('error', {}).get('message', 'Unknown error')}
 Please check your API key at: https://makersuite.google.com/app/apikey"""
-                
-            elif response.status_code == 403:
-                print(f"❌ API Error 403: Permission denied")
-                return """❌ **API Permission Error**
+            
+        elif status_code == 429:
+            logger.warning("Gemini API rate limited (429)")
+            return FloodAidBackend.BUSY_MESSAGE
+            
+        elif status_code == 403:
+            logger.error("Gemini API error 403: permission denied")
+            return """❌ **API Permission Error**
 Your API key doesn't have permission to access this model. Please:
 1. Go to https://makersuite.google.com/app/apikey
 2. Create a new API key or check your current key's permissions
 3. Ensure the Gemini API is enabled for your project"""
-                
-            else:
-                print(f"❌ API Error {response.status_code}: {response.text}")
-                return f"""⚠️ **API Connection Issue** (Status: {response.status_code})
+            
+        else:
+            logger.error("Gemini API error %s: %s", status_code, response.text)
+            return f"""⚠️ **API Connection Issue** (Status: {status_code})
 I'm having trouble connecting right now. 
 **For immediate emergency help:**
 🆘 Rescue 1122: **1122**
 🚑 Edhi Ambulance: **115**
 📞 PDMA: **1129**
 Please try again in a moment."""
-        
-        except requests.exceptions.Timeout:
-            print("❌ Request timeout")
+    
+    def _gemini_slot(self, message, weather, prompt, budget):
+        """Scheduler future for a Gemini call: quota for the prompt and the longest reply, ranked by the message's urgency"""
+        priority = message_priority(message, self.assess_flood_risk(weather)["level"])
+        return self.gemini_scheduler.submit(estimate_tokens(prompt) + self.GEMINI_MAX_OUTPUT_TOKENS, priority,
+                                            timeout=budget.timeout(self.gemini_queue_timeout))
+    
+    def _hedge_delay(self, method, budget):
+        """Seconds before hedging a Gemini call under ``budget``, or None not to hedge"""
+        if not self.gemini_hedge_model or not budget.hedge_percentile:
+            return None
+        delay = self.gemini_latency[method].percentile(budget.hedge_percentile)
+        remaining = budget.remaining()
+        if delay is None or (remaining is not None and delay >= remaining):
+            return None  # Too few samples yet, or the hedge could not start before the deadline
+        return delay
+    
+    def _generate(self, model, prompt, budget, window=None):
+        """One generateContent call to ``model`` within the budget; a 200's latency goes into ``window``"""
+        with self._upstream_call("gemini.generate", "gemini", GEMINI_REQUEST, method="generate", model=model) as record:
+            start = time.perf_counter()
+            response = self.transport.post(
+                self._gemini_url("generateContent", model), json=self._gemini_payload(prompt), timeout=budget.timeout(30)
+            )
+            record["labels"]["status"] = response.status_code
+            if response.status_code == 200 and window is not None:
+                window.observe(time.perf_counter() - start)
+            return response
+    
+    def _gemini_error(self, response):
+        """User-facing message for a non-200 Gemini response; a 429 also holds calls back for its Retry-After"""
+        if response.status_code == 429:
+            self.gemini_scheduler.pause(retry_after_seconds(response.headers.get("Retry-After"), self.gemini_retry_after))
+        return self._status_error_message(response.status_code, response)
+    
+    def _exception_message(self, e):
+        """User-facing message for a failed Gemini call"""
+        if isinstance(e, self.TIMEOUT_ERRORS):
+            logger.warning("Gemini request timed out")
             return """⏱️ **Request Timeout**
 The request took too long. Please:
 1. Check your internet connection
@@ -326,20 +940,17 @@ The request took too long. Please:
 **Emergency contacts remain available:**
 🆘 Rescue 1122: **1122**"""
             
-        except requests.exceptions.ConnectionError:
-            print("❌ Connection error")
+        if isinstance(e, self.CONNECTION_ERRORS):
+            logger.warning("Gemini connection error: %s", e)
             return """🌐 **Network Connection Error**
 Cannot reach the AI service. Please check your internet connection.
 **Emergency contacts:**
 🆘 Rescue 1122: **1122**
 🚑 Edhi: **115**"""
             
-        except Exception as e:
-            print(f"❌ Unexpected error: {type(e).__name__}: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            
-            return f"""⚠️ **Unexpected Error**
+        logger.exception("Unexpected Gemini error: %s: %s", type(e).__name__, e)
+        
+        return f"""⚠️ **Unexpected Error**
 Error type: {type(e).__name__}
 Details: {str(e)[:100]}
 **For immediate emergency assistance:**
@@ -348,9 +959,169 @@ Details: {str(e)[:100]}
 📞 PDMA: **1129**
 Please try again or contact support."""
     
+    def chat_with_gemini(self, message, history, city):
+        """Enhanced AI chat with proper error handling and debugging"""
+        
+        # Lookups answered from the records need neither the API key nor a Gemini call
+        routed = self.route_intent(message, city)
+        if routed is not None:
+            return routed
+        
+        # Check if API key exists
+        if not self.gemini_key:
+            return self._fallback_answer(self.retrieve(message, city), self.MISSING_KEY_MESSAGE)
+
+        budget = current_budget()
+        retrieved = []
+        with span("chat", mode="generate", city=city):
+            try:
+                weather = self.get_weather(city)
+                answer_key = self._answer_key(message, history, weather)
+                cached = self._cached_answer(answer_key)
+                if cached is not None:
+                    return cached
+                
+                retrieved = self.retrieve(message, city)
+                full_prompt = self.build_prompt(message, history, city, weather=weather, retrieved=retrieved)
+                
+                if not self._gemini_slot(message, weather, full_prompt, budget).result():
+                    return self._fallback_answer(retrieved, self.BUSY_MESSAGE)
+                
+                logger.debug("Sending Gemini request: %.50s", message)
+                # The hedge goes to a different model with its own quota, so it doesn't wait for the scheduler
+                response = hedge_sync(
+                    "gemini.generate",
+                    lambda: self._generate(self.GEMINI_MODEL, full_prompt, budget, self.gemini_latency["generate"]),
+                    lambda: self._generate(self.gemini_hedge_model, full_prompt, budget),
+                    self._hedge_delay("generate", budget),
+                    lambda response: response.status_code == 200,
+                    self.hedge_executor
+                )
+                if response.status_code != 200:
+                    return self._fallback_answer(retrieved, self._gemini_error(response))
+                data = response.json()
+                
+                # Check if response has the expected structure
+                ai_response = self._candidate_text(data)
+                if ai_response is None:
+                    logger.warning("Unexpected Gemini response structure: %s", data)
+                    return self._fallback_answer(retrieved, self.UNEXPECTED_FORMAT_MESSAGE)
+                self._store_answer(answer_key, ai_response)
+                return ai_response
+            
+            except Exception as e:
+                if isinstance(e, self.TIMEOUT_ERRORS) and budget.remaining() == 0:
+                    budget.exceeded("gemini")
+                return self._fallback_answer(retrieved, self._exception_message(e))
+    
+    def stream_chat_with_gemini(self, message, history, city):
+        """Stream the AI reply as text chunks via Gemini's SSE streamGenerateContent.
+        
+        Errors before or during the stream are yielded as the same
+        user-facing messages chat_with_gemini returns, so callers can
+        simply append every chunk.
+        """
+        routed = self.route_intent(message, city)
+        if routed is not None:
+            yield routed
+            return
+        
+        if not self.gemini_key:
+            yield self._fallback_answer(self.retrieve(message, city), self.MISSING_KEY_MESSAGE)
+            return
+        
+        budget = current_budget()
+        chunks = []
+        retrieved = []
+        with span("chat", mode="stream", city=city):
+            try:
+                weather = self.get_weather(city)
+                answer_key = self._answer_key(message, history, weather)
+                cached = self._cached_answer(answer_key)
+                if cached is not None:
+                    yield cached
+                    return
+                
+                retrieved = self.retrieve(message, city)
+                full_prompt = self.build_prompt(message, history, city, weather=weather, retrieved=retrieved)
+                
+                if not self._gemini_slot(message, weather, full_prompt, budget).result():
+                    yield self._fallback_answer(retrieved, self.BUSY_MESSAGE)
+                    return
+                
+                logger.debug("Streaming Gemini request: %.50s", message)
+                with self._upstream_call("gemini.stream", "gemini", GEMINI_REQUEST, method="stream") as record:
+                    start = time.perf_counter()
+                    response = self.transport.post(
+                        self._gemini_url("streamGenerateContent") + "&alt=sse",
+                        json=self._gemini_payload(full_prompt),
+                        timeout=budget.timeout(30),
+                        stream=True
+                    )
+                    record["labels"]["status"] = response.status_code
+                    with response:
+                        if response.status_code != 200:
+                            yield self._fallback_answer(retrieved, self._gemini_error(response))
+                            return
+                        
+                        # Byte lines decoded here: without a charset requests would decode the stream as ISO-8859-1
+                        # and split lines inside multi-byte characters (U+0085 is a line break)
+                        for line in response.iter_lines():
+                            text = self._sse_text(line.decode("utf-8"))
+                            if text:
+                                if not chunks:
+                                    self.gemini_latency["stream"].observe(self._first_chunk(record, start))
+                                chunks.append(text)
+                                yield text
+                
+                if not chunks:
+                    yield self._fallback_answer(retrieved, self.UNEXPECTED_FORMAT_MESSAGE)
+                    return
+                self._store_answer(answer_key, "".join(chunks))
+            
+            except Exception as e:
+                if isinstance(e, self.TIMEOUT_ERRORS) and budget.remaining() == 0:
+                    budget.exceeded("gemini")
+                error_message = self._exception_message(e)
+                # Mid-stream failures keep the partial reply; only a reply that never started falls back to records
+                yield "\n\n" + error_message if chunks else self._fallback_answer(retrieved, error_message)
+    
+    @staticmethod
+    def _first_chunk(record, start):
+        """Record time to the first streamed chunk on the span and histogram; returns it in seconds"""
+        elapsed = time.perf_counter() - start
+        record["labels"]["first_chunk_ms"] = round(elapsed * 1000, 3)
+        GEMINI_FIRST_CHUNK.observe(elapsed)
+        return elapsed
+    
+    def _sos_record(self, city, user_name, situation, source):
+        """What the dispatch sinks get: who, where and what, without waiting on a weather lookup"""
+        coords = lookup_city(city)
+        return {
+            "city": city,
+            "lat": coords[0] if coords else None,
+            "lon": coords[1] if coords else None,
+            "name": user_name or None,
+            "situation": situation or None,
+            "source": source,
+        }
+    
+    def submit_sos(self, city, user_name="", situation="", key=None, source="ui"):
+        """Durably record an SOS alert and queue it for dispatch.
+        
+        Returns (alert, duplicate) once the alert is on disk; a repeated
+        ``key`` returns the alert first logged under it.
+        """
+        with span("sos.submit", city=city):
+            return self.sos_pipeline.submit(self._sos_record(city, user_name, situation, source), key=key).result()
+    
     def generate_sos_alert(self, city, user_name="", situation=""):
         """Generate comprehensive SOS emergency alert"""
-        weather = self.get_weather(city)
+        with span("sos", city=city):
+            return self.format_sos_alert(city, self.get_weather(city), user_name, situation)
+    
+    def format_sos_alert(self, city, weather, user_name="", situation=""):
+        """SOS alert text for a city given its already fetched weather (shared by the UI and the JSON API)"""
         risk = self.assess_flood_risk(weather)
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
@@ -375,32 +1146,111 @@ Please try again or contact support."""
 👮 Police Emergency: **15**
 📞 PDMA Helpline: **1129**
 **NEAREST SHELTER:**
-{self.get_nearest_shelter(city)}
+{self.get_nearest_shelter(city, weather=weather)}
 ⚠️ **This is an automated emergency alert from FloodAid AI**
 Help has been notified. Stay calm and follow emergency instructions."""
         
         return alert
     
-    def get_nearest_shelter(self, city):
-        """Find nearest shelter based on city"""
-        city_lower = city.lower()
-        for shelter in self.shelters:
-            if city_lower in shelter['address'].lower():
-                return f"📍 {shelter['name']}\n{shelter['address']}\n📞 {shelter['phone']}"
-        return f"📍 Contact local PDMA at 1129 for nearest shelter"
+    def locate_city(self, city, weather=None):
+        """(lat, lon) for a city from the gazetteer or OpenWeather coordinates, else None"""
+        coords = lookup_city(city)
+        if coords is None and weather and weather.get("lat") is not None:
+            coords = (weather["lat"], weather["lon"])
+        return coords
+    
+    def find_nearest_shelters(self, city, k=1, facilities=(), weather=None):
+        """Up to k (distance_km, shelter) pairs with free space and the required facilities"""
+        coords = self.locate_city(city, weather)
+        if coords is None:
+            # Unknown location: fall back to shelters whose address names the city
+            nearest = [(None, s) for s in self.repo.shelters_matching(city, k=k, facilities=facilities)]
+        else:
+            nearest = self.repo.nearest_shelters(coords[0], coords[1], k=k, facilities=facilities)
+        # The query runs without the occupancy lock so lookups don't queue behind each other; the results'
+        # free spaces are then re-read in one snapshot, dropping any shelter a concurrent check-in just filled
+        available = self.occupancy.snapshot([shelter["name"] for _, shelter in nearest])
+        return [(distance, dict(shelter, available=available.get(shelter["name"], shelter["available"])))
+                for distance, shelter in nearest if available.get(shelter["name"], shelter["available"]) > 0]
+    
+    def count_shelters_near(self, city, weather=None):
+        """Shelters with free space within shelter_radius_km of the city"""
+        coords = self.locate_city(city, weather)
+        if coords is None:
+            return len(self.repo.shelters_matching(city))
+        return self.repo.count_shelters_near(coords[0], coords[1], self.shelter_radius_km)
+    
+    def get_nearest_shelter(self, city, facilities=(), weather=None):
+        """Find nearest shelter with available space"""
+        nearest = self.find_nearest_shelters(city, k=1, facilities=facilities, weather=weather)
+        if nearest:
+            distance, shelter = nearest[0]
+            away = f"\n🧭 {distance:.1f} km away" if distance is not None else ""
+            return f"📍 {shelter['name']}\n{shelter['address']}\n📞 {shelter['phone']}{away}"
+        return "📍 Contact local PDMA at 1129 for nearest shelter"
     
     def get_statistics(self):
         """Generate real-time statistics"""
-        total_capacity = sum(s['capacity'] for s in self.shelters)
-        total_available = sum(s['available'] for s in self.shelters)
-        occupancy_rate = ((total_capacity - total_available) / total_capacity * 100)
+        shelter_count, total_capacity, total_available = self.occupancy.totals()
+        occupancy_rate = ((total_capacity - total_available) / total_capacity * 100) if total_capacity else 0.0
         
         return {
-            "active_shelters": len(self.shelters),
+            "active_shelters": shelter_count,
             "total_capacity": total_capacity,
             "available_spaces": total_available,
             "occupancy_rate": round(occupancy_rate, 1),
-            "relief_camps": len(self.relief_camps),
-            "emergency_contacts": sum(len(contacts) for contacts in self.emergency_contacts.values()),
-            "people_assisted": 3247 + (len(self.shelters) * 10)  # Simulated growing number
+            "relief_camps": self.repo.count_relief_camps(),
+            "emergency_contacts": self.repo.count_emergency_contacts(),
+            "people_assisted": 3247 + (shelter_count * 10)  # Simulated growing number
         }
+    
+    def check_in(self, shelter_name, people=1):
+        """Record people arriving at a shelter; returns its remaining free spaces"""
+        available = self.occupancy.check_in(shelter_name, people)
+        self.touch("shelters")
+        return available
+    
+    def check_out(self, shelter_name, people=1):
+        """Record people leaving a shelter; returns its remaining free spaces"""
+        available = self.occupancy.check_out(shelter_name, people)
+        self.touch("shelters")
+        return available
+    
+    def set_shelter_available(self, shelter_name, available):
+        """Overwrite a shelter's free spaces, e.g. after a manual headcount"""
+        available = self.occupancy.set_available(shelter_name, available)
+        self.touch("shelters")
+        return available
+    
+    def import_records(self, collection, records):
+        """Bulk-import records into the repository, keeping occupancy and derived caches in step; returns the count"""
+        return self._import(collection, lambda: self.repo.import_records(collection, records))
+    
+    def import_file(self, collection, path):
+        """Bulk-load a CSV or JSON file into a collection, as import_records"""
+        return self._import(collection, lambda: self.repo.import_file(collection, path))
+    
+    def _import(self, collection, load):
+        with self.occupancy.lock:  # No check-in lands between the import and the tracker's reload
+            count = load()
+            if collection == "shelters":
+                self.occupancy.reload(self.repo.list_shelters())
+                self.touch("shelter_records")
+            self.touch(collection)
+        return count
+    
+    def get_occupancy_breakdown(self):
+        """Per-city and per-facility capacity, availability and occupancy rate"""
+        return self.occupancy.breakdown()
+    
+    def close(self):
+        """Stop background work (prefetch, SOS dispatch, Gemini queue and hedges) and release pooled upstream connections"""
+        self.prefetcher.stop()
+        self.gemini_scheduler.close()
+        self.hedge_executor.shutdown(wait=False)
+        if self.summarizer is not None:
+            self.summarizer.close()
+        if self._sos_pipeline is not None:
+            self._sos_pipeline.close()
+        self.transport.close()
+        self.repo.close()
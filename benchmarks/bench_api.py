@@ -0,0 +1,148 @@
+"""Benchmark: requests/sec of the JSON API against the Gradio event path for the same work.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_api [--clients 50] [--seconds 10] [--batch 20]
+
+Starts the local OpenWeather / Gemini stub and `python app.py` on a free
+port (the JSON API mounted at /api beside the UI), then drives each path
+with N concurrent closed-loop clients over HTTP. Gradio calls go through
+its public REST protocol: POST /gradio_api/call/<name> for an event id,
+then read the event stream until it completes - which is what a script or
+SMS gateway has to do without the API. Batch rows report items/sec.
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.bench_startup import free_port
+from benchmarks.load_test import CITIES
+from benchmarks.stub_servers import add_profile_arguments, lite_profile_from_args, profiles_from_args, start_in_process
+
+
+async def gradio_call(client, name, data):
+    response = await client.post(f"/gradio_api/call/{name}", json={"data": data})
+    response.raise_for_status()
+    event_id = response.json()["event_id"]
+    async with client.stream("GET", f"/gradio_api/call/{name}/{event_id}") as stream:
+        event = None
+        async for line in stream.aiter_lines():
+            if line.startswith("event:"):
+                event = line.split(":", 1)[1].strip()
+            if event == "complete" and line.startswith("data:"):
+                return True
+            if event == "error":
+                return False
+    return False
+
+
+def scenarios(batch):
+    async def api_weather(client, rng):
+        return (await client.get("/api/weather", params={"city": rng.choice(CITIES)})).status_code == 200, 1
+
+    async def api_weather_batch(client, rng):
+        body = {"cities": [rng.choice(CITIES) for _ in range(batch)]}
+        return (await client.post("/api/weather/batch", json=body)).status_code == 200, batch
+
+    async def api_sos(client, rng):
+        return (await client.post("/api/sos", json={"city": rng.choice(CITIES)})).status_code == 200, 1
+
+    async def api_sos_batch(client, rng):
+        body = {"alerts": [{"city": rng.choice(CITIES)} for _ in range(batch)]}
+        return (await client.post("/api/sos/batch", json=body)).status_code == 200, batch
+
+    async def gradio_weather(client, rng):
+        return await gradio_call(client, "create_weather_display", [rng.choice(CITIES)]), 1
+
+    async def gradio_sos(client, rng):
+        return await gradio_call(client, "send_sos", [rng.choice(CITIES)]), 1
+
+    return {
+        "api weather": api_weather,
+        "gradio weather": gradio_weather,
+        f"api weather x{batch}": api_weather_batch,
+        "api sos": api_sos,
+        "gradio sos": gradio_sos,
+        f"api sos x{batch}": api_sos_batch,
+    }
+
+
+async def run(base_url, call, clients, seconds):
+    """Closed loop for ``seconds``: each client sends its next request as soon as one returns"""
+    deadline = time.perf_counter() + seconds
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+
+    async def client_loop(client, uid):
+        rng = random.Random(uid)
+        done = items = errors = 0
+        while time.perf_counter() < deadline:
+            try:
+                ok, count = await call(client, rng)
+            except httpx.HTTPError:
+                ok, count = False, 0
+            done += 1
+            items += count if ok else 0
+            errors += not ok
+        return done, items, errors
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        start = time.perf_counter()
+        results = await asyncio.gather(*(client_loop(client, uid) for uid in range(clients)))
+        elapsed = time.perf_counter() - start
+    requests, items, errors = (sum(column) for column in zip(*results))
+    return requests / elapsed, items / elapsed, errors
+
+
+def wait_until_listening(base_url, process, timeout=120):
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"app.py exited with status {process.returncode}")
+        try:
+            if httpx.get(base_url + "/api/statistics", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError("app.py did not start listening in time")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=50, help="concurrent closed-loop clients")
+    parser.add_argument("--seconds", type=float, default=10, help="duration of each scenario")
+    parser.add_argument("--batch", type=int, default=20, help="items per batch request")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    weather_profile, gemini_profile = profiles_from_args(args)
+    stub, stub_url = start_in_process(weather=weather_profile, gemini=gemini_profile,
+                                      gemini_lite=lite_profile_from_args(args))
+    port = free_port()
+    env = dict(os.environ, OPENWEATHER_BASE_URL=stub_url, GEMINI_BASE_URL=stub_url, OPENWEATHER_API_KEY="stub",
+               GOOGLE_API_KEY="stub", WEATHER_PREFETCH="0", GRADIO_ANALYTICS_ENABLED="False",
+               GRADIO_SERVER_NAME="127.0.0.1", GRADIO_SERVER_PORT=str(port), LOG_LEVEL="WARNING",
+               SOS_LOG_PATH=os.path.join(tempfile.mkdtemp(prefix="floodaid-bench-"), "sos_alerts.log"))
+    server = subprocess.Popen([sys.executable, "app.py"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_listening(base_url, server)
+        print(f"app at {base_url}; {args.clients} clients x {args.seconds:g}s per scenario")
+        for name, call in scenarios(args.batch).items():
+            requests_per_s, items_per_s, errors = asyncio.run(run(base_url, call, args.clients, args.seconds))
+            print(f"  {name:<16} {requests_per_s:9.1f} req/s  {items_per_s:9.1f} items/s  errors {errors}")
+    finally:
+        server.terminate()
+        server.wait()
+        stub.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Benchmark: Gemini tail latency with and without hedging to the lite model, under a request deadline.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_hedging [--users 20] [--requests 10] [--percentile 95] [--deadline 5]
+        [--gemini-latency lognormal:800:1.0] [--gemini-lite-latency lognormal:300:0.3]
+
+Starts the local Gemini stub with a heavy-tailed primary model and a
+faster lite model (the hedge), then runs closed-loop chat requests under
+an "api_chat" budget of --deadline seconds: async generate, async stream
+and sync generate, each once with hedging off and once hedged at
+--percentile of recent latencies. Reports p50/p95/p99 latency (and time
+to first chunk for streams), replies that fell back to the records, how
+many calls hedged and which side won, requests that ran out of budget,
+and the extra upstream calls the hedges cost.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.load_test import CITIES, MESSAGES, distribution, upstream_counts
+from benchmarks.stub_servers import REPLY, start_in_process
+
+MODES = ("generate", "stream", "sync")
+
+
+async def run_async(backend, mode, users, requests):
+    from deadlines import request_budget
+
+    async def user(uid):
+        rng = random.Random(uid)
+        samples = []
+        for _ in range(requests):
+            start, first, reply = time.perf_counter(), None, ""
+            with request_budget("api_chat"):
+                if mode == "stream":
+                    async for chunk in backend.stream_chat_with_gemini(rng.choice(MESSAGES), [], rng.choice(CITIES)):
+                        if first is None:
+                            first = time.perf_counter() - start
+                        reply += chunk
+                else:
+                    reply = await backend.chat_with_gemini(rng.choice(MESSAGES), [], rng.choice(CITIES))
+            samples.append((time.perf_counter() - start, first, reply.strip() == REPLY))
+        return samples
+
+    return [s for samples in await asyncio.gather(*(user(uid) for uid in range(users))) for s in samples]
+
+
+def run_sync(backend, users, requests):
+    from deadlines import request_budget
+
+    def user(uid):
+        rng = random.Random(uid)
+        samples = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            with request_budget("api_chat"):
+                reply = backend.chat_with_gemini(rng.choice(MESSAGES), [], rng.choice(CITIES))
+            samples.append((time.perf_counter() - start, None, reply.strip() == REPLY))
+        return samples
+
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        return [s for samples in pool.map(user, range(users)) for s in samples]
+
+
+def counters(base_url):
+    from deadlines import DEADLINE_EXCEEDED
+    from hedging import HEDGED_CALLS
+
+    counts = upstream_counts(base_url)
+    return {
+        **{winner: sum(HEDGED_CALLS.value(call=call, winner=winner) for call in ("gemini.generate", "gemini.stream"))
+           for winner in ("primary", "hedge", "neither")},
+        "deadline": sum(DEADLINE_EXCEEDED.value(endpoint="api_chat", stage=stage) for stage in ("weather", "gemini")),
+        "primary_calls": counts.get("gemini", 0) + counts.get("gemini_stream", 0),
+        "lite_calls": counts.get("gemini_lite", 0) + counts.get("gemini_lite_stream", 0),
+    }
+
+
+def run(args, base_url, mode, hedged):
+    from async_backend import AsyncFloodAidBackend
+    from backend import FloodAidBackend
+
+    os.environ["API_CHAT_HEDGE_PERCENTILE"] = str(args.percentile if hedged else 0)
+
+    async def measure(backend):
+        await run_async(backend, mode, args.users, args.warmup)  # Fills the latency window
+        before = counters(base_url)
+        start = time.perf_counter()
+        samples = await run_async(backend, mode, args.users, args.requests)
+        elapsed = time.perf_counter() - start
+        await backend.aclose()
+        return samples, elapsed, before
+
+    if mode == "sync":
+        backend = FloodAidBackend()
+        run_sync(backend, args.users, args.warmup)
+        before = counters(base_url)
+        start = time.perf_counter()
+        samples = run_sync(backend, args.users, args.requests)
+        elapsed = time.perf_counter() - start
+        backend.close()
+    else:
+        samples, elapsed, before = asyncio.run(measure(AsyncFloodAidBackend()))
+    after = counters(base_url)
+    delta = {name: after[name] - before[name] for name in after}
+
+    latency = distribution([latency for latency, _, _ in samples])
+    first = distribution([first for _, first, _ in samples if first is not None])
+    hedges = delta["primary"] + delta["hedge"] + delta["neither"]
+    line = (f"  {mode:<8} {'hedged' if hedged else 'off':<6} p50 {latency['p50']:7.0f}  p95 {latency['p95']:7.0f}  "
+            f"p99 {latency['p99']:7.0f} ms")
+    if first:
+        line += f"  ttft p50 {first['p50']:6.0f} p95 {first['p95']:6.0f} p99 {first['p99']:6.0f} ms"
+    print(line)
+    print(f"  {'':<15} {len(samples) / elapsed:5.1f} req/s  fallback {sum(not ok for _, _, ok in samples):3}/{len(samples)}  "
+          f"deadline {delta['deadline']:3}  hedged {hedges:3} (hedge won {delta['hedge']}, primary {delta['primary']}, "
+          f"neither {delta['neither']})  upstream calls +{delta['lite_calls'] / max(1, delta['primary_calls']):.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20, help="concurrent simulated users")
+    parser.add_argument("--requests", type=int, default=10, help="measured requests per user per run")
+    parser.add_argument("--warmup", type=int, default=2, help="unmeasured requests per user first, to fill the window")
+    parser.add_argument("--percentile", type=float, default=95, help="hedge once a call outlasts this latency percentile")
+    parser.add_argument("--deadline", type=float, default=5, help="request budget in seconds (0 = none)")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"comma-separated subset of {', '.join(MODES)}")
+    parser.add_argument("--gemini-latency", default="lognormal:800:1.0")
+    parser.add_argument("--gemini-lite-latency", default="lognormal:300:0.3")
+    args = parser.parse_args()
+
+    stub, base_url = start_in_process(weather={"latency": "fixed:20"}, gemini={"latency": args.gemini_latency},
+                                      gemini_lite={"latency": args.gemini_lite_latency})
+    os.environ.update({
+        "OPENWEATHER_BASE_URL": base_url,
+        "GEMINI_BASE_URL": base_url,
+        "OPENWEATHER_API_KEY": "stub",
+        "GOOGLE_API_KEY": "stub",
+        "WEATHER_PREFETCH": "0",
+        "INTENT_ROUTER": "0",  # Every message goes to Gemini
+        "API_CHAT_DEADLINE": str(args.deadline),
+        "SOS_LOG_PATH": os.path.join(tempfile.mkdtemp(prefix="floodaid-hedging-"), "sos_alerts.log"),
+    })
+    print(f"primary {args.gemini_latency}, lite {args.gemini_lite_latency}, deadline {args.deadline:g}s, "
+          f"hedge at p{args.percentile:g}; {args.users} users x {args.requests} requests per run")
+    for mode in [name.strip() for name in args.modes.split(",") if name.strip()]:
+        for hedged in (False, True):
+            run(args, base_url, mode, hedged)
+    stub.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Benchmark: intent classification cost and fast-path hit rate for chat messages.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_intents [--repeat 2000] [--records 0]
+
+Classifies lookup queries in English, Roman Urdu and Urdu script plus the
+load test's general questions, and reports per-message classification
+time, the time to answer a routed message from the records, and which
+messages took the fast path instead of a Gemini call. --records grows the
+dataset (as in bench_retrieval) to show answer time at scale.
+"""
+import argparse
+import random
+import time
+
+from backend import FloodAidBackend
+from benchmarks.bench_retrieval import grow
+from benchmarks.load_test import MESSAGES, distribution
+from store import MemoryRepository
+
+LOOKUPS = {
+    "english": [
+        "nearest shelter in Karachi", "Edhi number", "where can I get baby formula", "emergency numbers",
+        "shelter with medical facilities near me", "Rescue 1122 contact", "relief camps in Lahore",
+        "where can I find blankets in Lahore", "Red Crescent helpline", "I need water",
+    ],
+    "roman urdu": [
+        "qareebi panahgah kahan hai", "Edhi ka number kya hai", "Lahore mein khana kahan milega",
+        "pindi mein shelter batao", "doodh kahan milega", "Saylani ka number", "kambal chahiye",
+        "rehne ki jagah Multan",
+    ],
+    "urdu": [
+        "سب سے قریبی پناہ گاہ", "ایدھی کا نمبر", "مجھے دودھ کہاں ملے گا", "کراچی میں پناہ گاہ", "پانی کہاں ملے گا",
+        "ریسکیو کا نمبر",
+    ],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=2000, help="classifications per message")
+    parser.add_argument("--records", type=int, default=0, help="grow the dataset to about this many records")
+    args = parser.parse_args()
+
+    backend = FloodAidBackend()
+    if args.records:
+        backend = FloodAidBackend(repository=MemoryRepository(*grow(backend, args.records)))
+    router = backend.intent_router
+    corpus = [(language, message) for language, messages in LOOKUPS.items() for message in messages]
+    corpus += [("general", message) for message in MESSAGES]
+
+    samples = []
+    for _, message in corpus:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            router.classify(message)
+        samples.append((time.perf_counter() - start) / args.repeat * 1e6)
+    samples.sort()
+    print(f"classify       p50 {samples[len(samples) // 2]:6.1f}  p95 {samples[int(len(samples) * 0.95)]:6.1f}  "
+          f"max {samples[-1]:6.1f} us per message")
+
+    rng = random.Random(0)
+    answers, routed = [], {}
+    for language, message in corpus:
+        city = rng.choice(["Lahore", "Karachi", "Islamabad", "Quetta"])
+        start = time.perf_counter()
+        answer = backend.route_intent(message, city)
+        answers.append(time.perf_counter() - start)
+        routed.setdefault(language, []).append((message, answer is not None))
+    answer = distribution(answers)
+    print(f"route+answer   p50 {answer['p50']:6.2f}  p95 {answer['p95']:6.2f}  max {answer['max']:6.2f} ms "
+          f"({len(backend.repo.list_relief_camps())} relief camps, {len(backend.repo.list_shelters())} shelters)")
+
+    hits = 0
+    for language, results in routed.items():
+        language_hits = sum(hit for _, hit in results)
+        hits += language_hits
+        print(f"  {language:<11} {language_hits:3}/{len(results)} fast path")
+        for message, hit in results:
+            if (language == "general") == hit:
+                print(f"      {'fast path' if hit else 'to Gemini'}: {message}")
+    print(f"hit rate       {hits / len(corpus):.0%} of {len(corpus)} messages")
+
+
+if __name__ == "__main__":
+    main()
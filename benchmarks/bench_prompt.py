@@ -0,0 +1,49 @@
+"""Benchmark: Gemini prompt assembly cost, cold vs memoized.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_prompt [--iterations 20000]
+
+Weather is supplied directly so only prompt assembly is timed. "cold"
+clears the per-city prompt cache before every build; "warm" reuses it,
+which is the steady state between weather refreshes.
+"""
+import argparse
+import statistics
+import time
+
+from backend import FloodAidBackend
+
+HISTORY = [
+    ("Where is the nearest emergency shelter?", "The nearest shelter is Gulberg Relief Point, Gulberg III."),
+    ("Is there medical help there?", "Yes, it has Medical, Food, Water and Electricity facilities."),
+]
+
+
+def time_builds(backend, weather, iterations, clear):
+    samples = []
+    for i in range(iterations):
+        if clear:
+            backend.prompt_cache.invalidate()
+        start = time.perf_counter()
+        backend.build_prompt(f"Question {i}", HISTORY, "Lahore", weather=weather)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    backend = FloodAidBackend()
+    weather = backend._demo_weather("Lahore")
+    for name, clear in (("cold", True), ("warm", False)):
+        samples = time_builds(backend, weather, args.iterations, clear)
+        print(f"  {name:<5} p50 {statistics.median(samples):7.2f} us   mean {statistics.fmean(samples):7.2f} us")
+    print(f"  prompt cache: {backend.prompt_cache.stats()}")
+    print(f"  prompt tokens: {backend.assemble_prompt('Question', HISTORY, 'Lahore', weather=weather)[1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark: knowledge index build and query latency, and prompt size, as the dataset grows.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_retrieval [--records 100000] [--queries 2000]
+
+Grows the built-in shelters, relief camps, medical tips, donation needs
+and contacts to --records synthetic records spread over the gazetteer's
+cities, then times FloodAidBackend's index build and retrieve() for the
+load test's chat messages. Also prints the retrieved-records share of the
+prompt, which stays within RETRIEVAL_TOKENS however large the data gets.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from backend import FloodAidBackend
+from benchmarks.load_test import MESSAGES
+from geo import CITY_COORDINATES
+from store import MemoryRepository
+
+CITIES = [city.title() for city in CITY_COORDINATES]
+AREAS = ["Model Town", "Saddar", "Cantonment", "Civil Lines", "Old City", "Satellite Town", "Gulshan", "Railway Colony"]
+WORDS = ["boil", "water", "wound", "fever", "children", "elderly", "snake", "bite", "diarrhea", "dehydration",
+         "mosquito", "malaria", "skin", "infection", "clean", "bandage", "medicine", "insulin", "pregnant", "shock"]
+
+
+def grow(seed_backend, n, seed=0):
+    """Repository arguments with about n records, cloned from the built-in ones with varied details"""
+    rng = random.Random(seed)
+    shelters, camps, tips, needs = [], [], [], []
+    contacts = {category: list(entries) for category, entries in seed_backend.emergency_contacts.items()}
+    for i in range(n):
+        city = rng.choice(CITIES)
+        lat, lon = CITY_COORDINATES[city.lower()]
+        roll = rng.random()
+        if roll < 0.5:
+            base = rng.choice(seed_backend.shelters)
+            shelters.append(dict(base, name=f"{rng.choice(AREAS)} Shelter {i}", address=f"{rng.choice(AREAS)}, {city}",
+                                 lat=lat + rng.uniform(-0.2, 0.2), lon=lon + rng.uniform(-0.2, 0.2),
+                                 facilities=list(base["facilities"])))
+        elif roll < 0.8:
+            base = rng.choice(seed_backend.relief_camps)
+            camps.append(dict(base, name=f"{base['name'].split(' - ')[0]} - {rng.choice(AREAS)} {i}", city=city))
+        elif roll < 0.95:
+            base = rng.choice(seed_backend.medical_tips)
+            tips.append(dict(base, title=f"{base['title']} {i}", desc=f"{base['desc']} {' '.join(rng.sample(WORDS, 4))}"))
+        elif roll < 0.99:
+            base = rng.choice(seed_backend.donation_needs)
+            needs.append(dict(base, item=f"{base['item']} ({city})"))
+        else:
+            contacts.setdefault(f"{city} Volunteers", []).append(
+                {"name": f"{city} Relief Desk {i}", "number": f"0300-{i:07d}", "available": "24/7"})
+    return shelters, camps, needs, tips, contacts
+
+
+def time_queries(backend, queries, rng):
+    samples = []
+    for _ in range(queries):
+        message, city = rng.choice(MESSAGES), rng.choice(CITIES)
+        start = time.perf_counter()
+        backend.retrieve(message, city)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    seed_backend = FloodAidBackend()
+    for label, backend in (("built-in", seed_backend),
+                           (f"{args.records}", FloodAidBackend(repository=MemoryRepository(*grow(seed_backend, args.records))))):
+        start = time.perf_counter()
+        records, index = backend.knowledge_index
+        build = time.perf_counter() - start
+        memory = index.docs.nbytes + index.weights.nbytes + index.offsets.nbytes
+        samples = time_queries(backend, args.queries, random.Random(1))
+        weather = backend._demo_weather("Lahore")
+        tokens = [backend.assemble_prompt(message, [], "Lahore", weather=weather)[1] for message in MESSAGES]
+        print(f"  {label:>8} records: {len(records):6} indexed, {len(index.vocabulary):6} terms, "
+              f"{memory / 1e6:.1f} MB postings, build {build * 1000:8.1f} ms")
+        print(f"           query p50 {samples[len(samples) // 2]:8.1f} us  p95 {samples[int(len(samples) * 0.95)]:8.1f} us  "
+              f"mean {statistics.fmean(samples):8.1f} us")
+        print(f"           prompt tokens: retrieved max {max(t['retrieved'] for t in tokens)} "
+              f"(cap {backend.retrieval_token_limit}), total max {max(t['total'] for t in tokens)}")
+
+
+if __name__ == "__main__":
+    main()
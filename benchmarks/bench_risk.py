@@ -0,0 +1,102 @@
+"""Micro-benchmark: per-dict vs batched flood-risk scoring.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_risk [--locations 500] [--steps 40]
+
+Scores a random locations x forecast-steps grid three ways: the original
+if-chain scorer (reference), FloodAidBackend.assess_flood_risk called once
+per dict, and one assess_flood_risk_batch call over columnar arrays. It
+checks that all three agree exactly before reporting throughput.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from backend import FloodAidBackend
+from risk import assess_flood_risk_batch, factor_labels, is_raining, LEVELS
+
+
+def reference_assess(weather_data):
+    """The original scalar scorer, kept here as the correctness oracle"""
+    risk_score = 0
+    factors = []
+    if weather_data["humidity"] > 85:
+        risk_score += 30
+        factors.append("Very high humidity")
+    elif weather_data["humidity"] > 75:
+        risk_score += 20
+        factors.append("High humidity")
+    if "rain" in weather_data["description"].lower() or weather_data["main"] == "Rain":
+        risk_score += 40
+        factors.append("Active rainfall")
+    if weather_data["pressure"] < 1000:
+        risk_score += 20
+        factors.append("Low atmospheric pressure")
+    if weather_data["visibility"] < 5:
+        risk_score += 10
+        factors.append("Poor visibility")
+    if risk_score >= 70:
+        level = "Critical"
+    elif risk_score >= 40:
+        level = "High"
+    elif risk_score >= 20:
+        level = "Moderate"
+    else:
+        level = "Low"
+    return level, risk_score, factors
+
+
+def make_grid(locations, steps, seed=0):
+    rng = np.random.default_rng(seed)
+    shape = (locations, steps)
+    humidity = rng.integers(40, 101, shape)
+    pressure = rng.integers(985, 1025, shape)
+    visibility = rng.integers(0, 101, shape) / 10
+    descriptions = np.array(["clear sky", "light rain", "overcast clouds", "heavy intensity rain", "mist"])
+    mains = np.array(["Clear", "Rain", "Clouds", "Rain", "Mist"])
+    kind = rng.integers(0, len(descriptions), shape)
+    return humidity, pressure, visibility, descriptions[kind], mains[kind]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--locations", type=int, default=500)
+    parser.add_argument("--steps", type=int, default=40)
+    args = parser.parse_args()
+
+    humidity, pressure, visibility, description, main_ = make_grid(args.locations, args.steps)
+    dicts = [
+        {"humidity": int(h), "pressure": int(p), "visibility": float(v), "description": str(d), "main": str(m)}
+        for h, p, v, d, m in zip(humidity.ravel(), pressure.ravel(), visibility.ravel(),
+                                 description.ravel(), main_.ravel())
+    ]
+    rain = np.vectorize(is_raining)(description, main_)
+    n = len(dicts)
+
+    start = time.perf_counter()
+    reference = [reference_assess(d) for d in dicts]
+    reference_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    per_dict = [FloodAidBackend.assess_flood_risk(None, d) for d in dicts]
+    per_dict_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = assess_flood_risk_batch(humidity, pressure, visibility, rain)
+    batch_s = time.perf_counter() - start
+
+    scores, levels, masks = batch["score"].ravel(), batch["level"].ravel(), batch["factors"].ravel()
+    for i, (level, score, factors) in enumerate(reference):
+        got = per_dict[i]
+        assert (got["level"], got["score"], got["factors"]) == (level, score, factors), dicts[i]
+        assert (LEVELS[levels[i]], int(scores[i]), factor_labels(int(masks[i]))) == (level, score, factors), dicts[i]
+
+    print(f"{n} points ({args.locations} locations x {args.steps} steps), results identical")
+    for name, seconds in (("reference if-chain", reference_s), ("per-dict wrapper", per_dict_s), ("batched", batch_s)):
+        print(f"  {name:<20} {seconds * 1000:9.2f} ms  {n / seconds:14,.0f} points/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Benchmark: Gemini quota scheduler wait per priority under an over-quota burst.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_scheduler [--rpm 600] [--tpm 1000000] [--load 2] [--seconds 20]
+        [--timeout 10] [--retry-after 5]
+
+Offers a QuotaScheduler calls as a Poisson process at --load times the
+RPM quota, drawn from the load test's chat messages (plus donation
+questions) and ranked by message_priority. Halfway through, a
+simulated 429 pauses calls for --retry-after seconds. Reports the
+granted call rate against the quota, and per priority the granted /
+rejected / expired counts with queue wait percentiles - once with every
+call at the same priority (FIFO) and once ranked.
+"""
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import wait
+
+from benchmarks.load_test import MESSAGES, distribution
+from history import estimate_tokens
+from intents import message_priority
+from scheduler import PRIORITIES, QuotaScheduler
+
+CHAT_MESSAGES = MESSAGES + ["How can I donate blankets to flood victims?", "Can I volunteer at a relief camp?"]
+
+
+def run(args, ranked):
+    scheduler = QuotaScheduler(rpm=args.rpm, tpm=args.tpm, burst_seconds=args.burst_seconds)
+    results = {name: {"granted": [], "rejected": 0, "expired": 0} for name in PRIORITIES}
+    lock = threading.Lock()
+    rng = random.Random(0)
+    rate = args.rpm / 60 * args.load
+    pause_at = args.seconds / 2
+    paused = False
+    pending = []
+
+    def record(priority, start):
+        def done(future):
+            waited = time.monotonic() - start
+            with lock:
+                if future.result():
+                    results[priority]["granted"].append(waited)
+                else:
+                    results[priority]["rejected" if waited < 0.001 else "expired"] += 1
+        return done
+
+    # Open loop: calls arrive as a Poisson process at `load` times the quota, whatever the queue does
+    begin = next_arrival = time.monotonic()
+    while next_arrival - begin < args.seconds:
+        time.sleep(max(0.0, next_arrival - time.monotonic()))
+        if not paused and next_arrival - begin >= pause_at:
+            scheduler.pause(args.retry_after)
+            paused = True
+        message = rng.choice(CHAT_MESSAGES)
+        priority = message_priority(message) if ranked else 2
+        future = scheduler.submit(estimate_tokens(message) + 1500, priority, timeout=args.timeout)
+        future.add_done_callback(record(PRIORITIES[priority], time.monotonic()))
+        pending.append(future)
+        next_arrival += rng.expovariate(rate)
+    wait(pending)
+    elapsed = time.monotonic() - begin
+    scheduler.close()
+
+    granted = sum(len(result["granted"]) for result in results.values())
+    print(f"{'ranked' if ranked else 'fifo':>6}: {len(pending) / args.seconds * 60:6.0f} calls/min offered, "
+          f"{granted / elapsed * 60:6.0f} granted (quota {args.rpm} rpm, {args.retry_after:g}s pause at {pause_at:g}s)")
+    for name, result in results.items():
+        if not (result["granted"] or result["rejected"] or result["expired"]):
+            continue
+        waits = distribution(result["granted"])
+        wait_text = f"wait p50 {waits['p50']:8.1f}  p95 {waits['p95']:8.1f}  max {waits['max']:8.1f} ms" if waits else ""
+        print(f"  {name:<7} granted {len(result['granted']):5}  rejected {result['rejected']:5}  "
+              f"expired {result['expired']:4}  {wait_text}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rpm", type=int, default=600, help="requests-per-minute quota")
+    parser.add_argument("--tpm", type=int, default=1000000, help="tokens-per-minute quota")
+    parser.add_argument("--burst-seconds", type=float, default=10)
+    parser.add_argument("--load", type=float, default=2, help="offered load as a multiple of the RPM quota")
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--timeout", type=float, default=10, help="longest a call may wait for quota")
+    parser.add_argument("--retry-after", type=float, default=5, help="pause from a simulated 429 halfway through")
+    args = parser.parse_args()
+
+    for ranked in (False, True):
+        run(args, ranked)
+
+
+if __name__ == "__main__":
+    main()
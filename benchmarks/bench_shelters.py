@@ -0,0 +1,73 @@
+"""Benchmark: nearest-shelter queries on a provincial-scale registry.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_shelters [--shelters 10000] [--queries 2000]
+
+Places random shelters across Pakistan and reports ShelterIndex
+per-query latency for k-nearest (with availability / facility filters)
+and radius counts. tests/test_geo.py checks the results against a
+brute-force scan.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from geo import ShelterIndex
+
+FACILITIES = ["Medical", "Food", "Water", "Sanitation", "Beds", "Electricity", "Security"]
+
+
+def make_shelters(n, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "name": f"Shelter {i}",
+            "lat": rng.uniform(24.0, 36.5),
+            "lon": rng.uniform(61.0, 77.0),
+            "capacity": 500,
+            "available": rng.choice([0, 0, 10, 50, 200]),
+            "facilities": rng.sample(FACILITIES, rng.randint(2, 5)),
+        }
+        for i in range(n)
+    ]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shelters", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    shelters = make_shelters(args.shelters)
+    start = time.perf_counter()
+    index = ShelterIndex(shelters)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    rng = random.Random(1)
+    queries = [(rng.uniform(24.5, 36.0), rng.uniform(62.0, 76.0), rng.choice([(), ("Medical",), ("Medical", "Food")]))
+               for _ in range(args.queries)]
+
+    nearest_us, count_us = [], []
+    for lat, lon, facilities in queries:
+        start = time.perf_counter()
+        index.nearest(lat, lon, k=args.k, facilities=facilities)
+        nearest_us.append((time.perf_counter() - start) * 1e6)
+        start = time.perf_counter()
+        index.count_within(lat, lon, 25)
+        count_us.append((time.perf_counter() - start) * 1e6)
+
+    print(f"{args.shelters} shelters, index built in {build_ms:.1f} ms")
+    for name, samples in ((f"nearest k={args.k}", nearest_us), ("count within 25 km", count_us)):
+        print(f"  {name:<20} p50 {statistics.median(samples):8.1f} us   p99 {percentile(samples, 99):8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Benchmark: SOS pipeline enqueue latency and sustained alerts/sec under a surge.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_sos [--clients 50] [--alerts 200] [--sink-latency fixed:20]
+        [--sink-error-rate 0.05] [--batch-size 100] [--fsync-interval 0]
+
+Starts the stub sink endpoints (benchmarks.stub_servers) in a child
+process and an SOSPipeline with a webhook and an SMS sink pointed at them,
+logging to a temporary directory. N client threads then submit alerts back
+to back. Reports enqueue latency (submit until fsynced), how many records
+shared each fsync, durable submits/sec, and the time until both sinks had
+every alert - the sustained end-to-end rate - checked against the distinct
+alert ids the stub received.
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.load_test import CITIES, distribution, upstream_counts
+from benchmarks.stub_servers import start_in_process
+from sos import SOS_FSYNC_BATCH, SMSSink, SOSPipeline, WebhookSink
+from transport import HttpTransport
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=50, help="concurrent submitting threads")
+    parser.add_argument("--alerts", type=int, default=200, help="alerts per client")
+    parser.add_argument("--batch-size", type=int, default=100, help="alerts per sink request")
+    parser.add_argument("--linger", type=float, default=0.05, help="seconds a sink waits for a batch to fill")
+    parser.add_argument("--fsync-interval", type=float, default=0.0, help="seconds the log waits before each fsync")
+    parser.add_argument("--recipients", type=int, default=2, help="SMS recipients per alert")
+    parser.add_argument("--sink-latency", default="fixed:20", help="fixed:MS | uniform:MIN:MAX | lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--sink-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    stub, base_url = start_in_process(sink={"latency": args.sink_latency, "error_rate": args.sink_error_rate})
+    transport = HttpTransport(pool_size=4)
+    sinks = [WebhookSink(base_url + "/sos/webhook", transport),
+             SMSSink(base_url + "/sos/sms", [f"+92300000{i:04d}" for i in range(args.recipients)], transport)]
+    path = os.path.join(tempfile.mkdtemp(prefix="floodaid-sos-"), "sos_alerts.log")
+    pipeline = SOSPipeline(path, sinks, batch_size=args.batch_size, linger=args.linger,
+                           fsync_interval=args.fsync_interval)
+    total = args.clients * args.alerts
+    print(f"{args.clients} clients x {args.alerts} alerts -> {path}")
+
+    def client(uid):
+        latencies = []
+        for n in range(args.alerts):
+            start = time.perf_counter()
+            pipeline.submit({"city": CITIES[(uid + n) % len(CITIES)], "name": f"user-{uid}",
+                             "situation": "Water entering the house"}, key=f"bench:{uid}:{n}").result()
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        latencies = [latency for result in pool.map(client, range(args.clients)) for latency in result]
+    submitted = time.perf_counter() - start
+    while any(pipeline.stats()["pending"].values()):
+        time.sleep(0.01)
+    drained = time.perf_counter() - start
+
+    fsyncs, records = SOS_FSYNC_BATCH.summary()
+    enqueue = distribution(latencies)
+    print(f"  enqueue        p50 {enqueue['p50']:.2f}  p95 {enqueue['p95']:.2f}  p99 {enqueue['p99']:.2f}  "
+          f"max {enqueue['max']:.2f} ms")
+    print(f"  durable        {total / submitted:9.1f} alerts/s  ({fsyncs} fsyncs, {records / fsyncs:.1f} records each)")
+    print(f"  delivered      {total / drained:9.1f} alerts/s  (all sinks done after {drained:.2f}s)")
+
+    pipeline.close()
+    counts = upstream_counts(base_url)
+    for name in ("webhook", "sms"):
+        print(f"  stub {name:<8}  {counts.get(f'sos_{name}', 0):6} requests  "
+              f"{counts.get(f'sos_{name}_alerts', 0):6} distinct alerts of {total}")
+    stub.terminate()
+    transport.close()
+
+
+if __name__ == "__main__":
+    main()
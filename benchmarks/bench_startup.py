@@ -0,0 +1,84 @@
+"""Benchmark: cold-start cost - module import times and app time-to-listening.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup [--runs 5]
+
+Each measurement runs in a fresh interpreter. Import rows also report
+whether the module pulled in gradio (backend and async_backend must not).
+Time-to-listening starts `python app.py` on a free port and polls until
+the UI answers HTTP 200.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+MODULES = ["backend", "async_backend", "gradio", "app"]
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - start, "gradio": "gradio" in sys.modules}}))
+"""
+
+
+def time_import(module, env):
+    result = subprocess.run([sys.executable, "-c", IMPORT_PROBE.format(module=module)],
+                            capture_output=True, text=True, env=env, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_listening(env, timeout=120):
+    port = free_port()
+    env = dict(env, GRADIO_SERVER_NAME="127.0.0.1", GRADIO_SERVER_PORT=str(port))
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "app.py"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"app.py exited with status {process.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(0.05)
+        raise RuntimeError("app.py did not start listening in time")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    # Keep startup off the network: no prefetch, no analytics ping
+    env = dict(os.environ, WEATHER_PREFETCH="0", GRADIO_ANALYTICS_ENABLED="False")
+    for module in MODULES:
+        samples = [time_import(module, env) for _ in range(args.runs)]
+        seconds = statistics.median(sample["seconds"] for sample in samples)
+        print(f"  import {module:<14} p50 {seconds * 1000:8.1f} ms   gradio loaded: {samples[0]['gradio']}")
+
+    samples = [time_to_listening(env) for _ in range(args.runs)]
+    print(f"  time to listening     p50 {statistics.median(samples) * 1000:8.1f} ms   "
+          f"(min {min(samples) * 1000:.1f}, max {max(samples) * 1000:.1f})")
+
+
+if __name__ == "__main__":
+    main()
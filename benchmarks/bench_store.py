@@ -0,0 +1,88 @@
+"""Benchmark: SQLite repository bulk import and query latency.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_store [--rows 100000] [--db /tmp/floodaid-bench.db]
+
+Writes a CSV of synthetic shelters, bulk-imports it with
+SQLiteRepository.import_file, then times the queries used by
+get_nearest_shelter, get_statistics and the shelter renderer.
+"""
+import argparse
+import csv
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from store import SQLiteRepository
+
+FACILITIES = ["Medical", "Food", "Water", "Sanitation", "Beds", "Electricity", "Security"]
+CITIES = ["Lahore", "Karachi", "Islamabad", "Rawalpindi", "Multan", "Faisalabad", "Peshawar", "Quetta", "Sukkur"]
+
+
+def write_csv(path, rows, seed=0):
+    rng = random.Random(seed)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "address", "lat", "lon", "capacity", "available", "facilities", "phone"])
+        for i in range(rows):
+            city = rng.choice(CITIES)
+            capacity = rng.randint(50, 800)
+            writer.writerow([
+                f"Shelter {i}", f"Block {i % 97}, {city}",
+                round(rng.uniform(24.0, 36.5), 5), round(rng.uniform(61.0, 77.0), 5),
+                capacity, rng.randint(0, capacity), "|".join(rng.sample(FACILITIES, rng.randint(2, 5))),
+                f"0300-{i:07d}",
+            ])
+
+
+def time_us(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "floodaid-bench.db"))
+    args = parser.parse_args()
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(args.db + suffix):
+            os.remove(args.db + suffix)
+    csv_path = args.db + ".csv"
+    write_csv(csv_path, args.rows)
+
+    repo = SQLiteRepository(args.db)
+    start = time.perf_counter()
+    imported = repo.import_file("shelters", csv_path)
+    import_s = time.perf_counter() - start
+    print(f"imported {imported} shelters in {import_s:.2f} s ({imported / import_s:,.0f} rows/s)")
+
+    rng = random.Random(1)
+    points = [(rng.uniform(25, 35), rng.uniform(63, 75)) for _ in range(200)]
+    it = iter(points * 10)
+    queries = {
+        "nearest k=1": lambda: repo.nearest_shelters(*next(it), k=1),
+        "nearest k=3 Medical": lambda: repo.nearest_shelters(*next(it), k=3, facilities=("Medical",)),
+        "count within 25 km": lambda: repo.count_shelters_near(*next(it), 25),
+        "shelters in city": lambda: repo.shelters_matching("Multan", k=5),
+        "totals (statistics)": repo.shelter_totals,
+        "first 5 (renderer)": lambda: repo.list_shelters(limit=5),
+    }
+    for name, fn in queries.items():
+        repeat = 20 if name.startswith("totals") else 200
+        print(f"  {name:<22} p50 {time_us(fn, repeat):9.1f} us")
+
+    repo.close()
+    os.remove(csv_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""Load test: end-to-end latency of the chat, SOS and weather paths under N concurrent users.
+
+Run from the repository root:
+
+    python -m benchmarks.load_test [--users 200] [--requests 5] [--scenarios respond,send_sos]
+        [--gemini-latency lognormal:800:0.5] [--gemini-429-rate 0.05] [--output benchmarks/results/load_test.json]
+
+Starts the local OpenWeather / Gemini stub (benchmarks.stub_servers) in a
+child process, points the backends and the Gradio handlers at it, and runs
+each scenario as a closed loop: every simulated user issues its next request
+as soon as the previous one finishes (plus optional think time). Reports
+throughput, p50/p95/p99 latency and, for streaming paths, time to first
+token, and writes everything to a JSON file so runs can be compared.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from benchmarks.stub_servers import add_profile_arguments, lite_profile_from_args, profiles_from_args, start_in_process
+
+CITIES = ["Lahore", "Karachi", "Islamabad", "Multan", "Peshawar", "Quetta", "Sukkur", "Hyderabad", "Faisalabad", "Swat"]
+MESSAGES = [
+    "Where is the nearest shelter?",
+    "What should I do if water enters my house?",
+    "Is it safe to drive to Multan today?",
+    "How do I purify drinking water?",
+    "My child has a fever after the flood, what should I do?",
+    "Which relief camps have food available?",
+]
+# Replies that start with one of these are the backend's user-facing error messages
+ERROR_PREFIXES = ("❌", "⚠️", "⏱️", "🌐", "⏳", "I received an unexpected response format")
+
+# Default home of run reports; ignored by git
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+SYNC_SCENARIOS = ("sync_chat",)
+ASYNC_SCENARIOS = ("async_chat", "async_stream", "respond", "send_sos", "weather")
+SCENARIOS = SYNC_SCENARIOS + ASYNC_SCENARIOS
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def distribution(values):
+    values = sorted(values)
+    if not values:
+        return None
+    return {
+        "p50": round(percentile(values, 50) * 1000, 2),
+        "p95": round(percentile(values, 95) * 1000, 2),
+        "p99": round(percentile(values, 99) * 1000, 2),
+        "mean": round(statistics.fmean(values) * 1000, 2),
+        "max": round(values[-1] * 1000, 2),
+    }
+
+
+def summarize(samples, elapsed):
+    """samples: (latency_s, ttft_s or None, ok) tuples"""
+    errors = sum(1 for _, _, ok in samples if not ok)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": distribution([latency for latency, _, _ in samples]),
+        "ttft_ms": distribution([ttft for _, ttft, _ in samples if ttft is not None]),
+    }
+
+
+def is_error_reply(text):
+    return not text or text.startswith(ERROR_PREFIXES)
+
+
+def run_threaded_users(users, requests_per_user, call, think):
+    """Closed-loop load with one OS thread per user, for the blocking backend"""
+    def user(uid):
+        rng = random.Random(uid)
+        samples = []
+        for _ in range(requests_per_user):
+            samples.append(call(rng))
+            if think:
+                time.sleep(rng.uniform(0, 2 * think))
+        return samples
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        results = list(pool.map(user, range(users)))
+    return summarize([s for samples in results for s in samples], time.perf_counter() - start)
+
+
+async def run_async_users(users, requests_per_user, call, think):
+    """Closed-loop load with one task per user, all on the event loop"""
+    async def user(uid):
+        rng = random.Random(uid)
+        samples = []
+        for _ in range(requests_per_user):
+            samples.append(await call(rng))
+            if think:
+                await asyncio.sleep(rng.uniform(0, 2 * think))
+        return samples
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(user(uid) for uid in range(users)))
+    return summarize([s for samples in results for s in samples], time.perf_counter() - start)
+
+
+def timed(fn):
+    """Wrap a blocking call returning ok -> (latency, None, ok)"""
+    def call(rng):
+        start = time.perf_counter()
+        try:
+            ok = fn(rng)
+        except Exception:
+            ok = False
+        return time.perf_counter() - start, None, ok
+    return call
+
+
+def timed_async(fn):
+    """Wrap a coroutine returning (ttft or None, ok) -> (latency, ttft, ok)"""
+    async def call(rng):
+        start = time.perf_counter()
+        try:
+            first, ok = await fn(rng, start)
+        except Exception:
+            first, ok = None, False
+        return time.perf_counter() - start, first, ok
+    return call
+
+
+def sync_scenarios():
+    from backend import FloodAidBackend
+
+    backend = FloodAidBackend()
+
+    def chat(rng):
+        return not is_error_reply(backend.chat_with_gemini(rng.choice(MESSAGES), [], rng.choice(CITIES)))
+
+    return backend, {"sync_chat": timed(chat)}
+
+
+def async_scenarios():
+    import app
+    from async_backend import AsyncFloodAidBackend
+
+    backend = AsyncFloodAidBackend()
+
+    async def chat(rng, start):
+        reply = await backend.chat_with_gemini(rng.choice(MESSAGES), [], rng.choice(CITIES))
+        return None, not is_error_reply(reply)
+
+    async def stream(rng, start):
+        first, reply = None, ""
+        async for chunk in backend.stream_chat_with_gemini(rng.choice(MESSAGES), [], rng.choice(CITIES)):
+            if first is None and chunk:
+                first = time.perf_counter() - start
+            reply += chunk
+        return first, not is_error_reply(reply)
+
+    async def respond(rng, start):
+        first, history = None, []
+        async for history, _ in app.respond(rng.choice(MESSAGES), [], rng.choice(CITIES)):
+            if first is None and history[-1]["content"]:
+                first = time.perf_counter() - start
+        return first, not is_error_reply(history[-1]["content"])
+
+    async def send_sos(rng, start):
+        first, messages = None, []
+        async for messages in app.send_sos(rng.choice(CITIES)):
+            if first is None:
+                first = time.perf_counter() - start  # The "alert sent" acknowledgement
+        return first, bool(messages and messages[0]["content"])
+
+    async def weather(rng, start):
+        return None, bool(await app.create_weather_display(rng.choice(CITIES)))
+
+    scenarios = {
+        "async_chat": timed_async(chat),
+        "async_stream": timed_async(stream),
+        "respond": timed_async(respond),
+        "send_sos": timed_async(send_sos),
+        "weather": timed_async(weather),
+    }
+    return (backend, app.get_backend()), scenarios
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def upstream_counts(base_url):
+    with urllib.request.urlopen(base_url + "/_stats", timeout=5) as response:
+        return json.load(response)
+
+
+def print_row(name, result):
+    latency, ttft = result["latency_ms"] or {}, result["ttft_ms"]
+    line = (f"  {name:<13} {result['requests']:>6} req  {result['throughput_rps']:>9.1f} req/s  "
+            f"err {result['error_rate'] * 100:5.1f}%  p50 {latency.get('p50', 0):8.1f}  "
+            f"p95 {latency.get('p95', 0):8.1f}  p99 {latency.get('p99', 0):8.1f} ms")
+    if ttft:
+        line += f"  ttft p50 {ttft['p50']:.1f} p95 {ttft['p95']:.1f} p99 {ttft['p99']:.1f} ms"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100, help="concurrent simulated users")
+    parser.add_argument("--requests", type=int, default=5, help="requests per user per scenario")
+    parser.add_argument("--think", type=float, default=0.0, help="mean think time between requests (s)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--weather-cache-ttl", type=float, default=600, help="0 disables the weather cache")
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "load_test.json"),
+                        help="JSON report (default under benchmarks/results/, which git ignores)")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    selected = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(selected) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    weather_profile, gemini_profile = profiles_from_args(args)
+    stub, base_url = start_in_process(weather=weather_profile, gemini=gemini_profile,
+                                      gemini_lite=lite_profile_from_args(args))
+    # The backends read these at construction time; app.py builds its backend on import
+    os.environ.update({
+        "OPENWEATHER_BASE_URL": base_url,
+        "GEMINI_BASE_URL": base_url,
+        "OPENWEATHER_API_KEY": "stub",
+        "GOOGLE_API_KEY": "stub",
+        "WEATHER_PREFETCH": "0",
+        "WEATHER_CACHE_TTL": str(args.weather_cache_ttl),
+        "SOS_LOG_PATH": os.path.join(tempfile.mkdtemp(prefix="floodaid-load-"), "sos_alerts.log"),
+    })
+    print(f"stub upstream at {base_url}; {args.users} users x {args.requests} requests per scenario")
+
+    results = {}
+    if any(name in SYNC_SCENARIOS for name in selected):
+        backend, calls = sync_scenarios()
+        for name in SYNC_SCENARIOS:
+            if name in selected:
+                results[name] = run_threaded_users(args.users, args.requests, calls[name], args.think)
+                print_row(name, results[name])
+        backend.close()
+
+    async def run_async():
+        backends, calls = async_scenarios()
+        for name in ASYNC_SCENARIOS:
+            if name in selected:
+                results[name] = await run_async_users(args.users, args.requests, calls[name], args.think)
+                print_row(name, results[name])
+        for backend in backends:
+            await backend.aclose()
+
+    if any(name in ASYNC_SCENARIOS for name in selected):
+        asyncio.run(run_async())
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "upstream_requests": upstream_counts(base_url),
+        "scenarios": results,
+    }
+    stub.terminate()
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
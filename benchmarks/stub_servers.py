@@ -0,0 +1,288 @@
+"""Local stand-ins for the OpenWeather and Gemini HTTP APIs.
+
+One server answers both APIs, plus the SOS dispatch sinks:
+
+    GET  /data/2.5/weather?q=<city>,PK
+    GET  /_stats                      (requests served per endpoint)
+    POST /v1beta/models/<model>:generateContent
+    POST /v1beta/models/<model>:streamGenerateContent?alt=sse
+    POST /sos/webhook                 ({"alerts": [...]}, as sent by sos.WebhookSink)
+    POST /sos/sms                     ({"messages": [...]}, as sent by sos.SMSSink)
+
+Latency, error rate and 429 rate are configurable per API, so load tests
+can reproduce slow or failing upstreams. Gemini models named "*lite*"
+(the hedge model) can get a latency of their own. Run standalone with
+
+    python -m benchmarks.stub_servers --port 8900 --gemini-latency lognormal:800:0.5 [--gemini-lite-latency lognormal:300:0.3]
+
+and point the backend at it with OPENWEATHER_BASE_URL / GEMINI_BASE_URL.
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+REPLY = ("السلام علیکم. Please move to higher ground and contact Rescue 1122 immediately. "
+         "The nearest open shelter has food, water and medical aid. Boil all drinking water "
+         "for at least five minutes and keep your phone charged.")
+
+
+class Latency:
+    """Latency distribution parsed from 'fixed:MS', 'uniform:MIN:MAX' or 'lognormal:MEDIAN:SIGMA'"""
+
+    def __init__(self, spec="fixed:0"):
+        kind, *params = spec.split(":")
+        self.spec = spec
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self):
+        """One latency sample in seconds"""
+        if self.kind == "fixed":
+            ms = self.params[0]
+        elif self.kind == "uniform":
+            ms = random.uniform(self.params[0], self.params[1])
+        else:
+            ms = random.lognormvariate(math.log(self.params[0]), self.params[1])
+        return ms / 1000
+
+
+class UpstreamProfile:
+    """Behaviour of one stubbed API"""
+
+    def __init__(self, latency="fixed:0", error_rate=0.0, rate_limit_rate=0.0, retry_after=1):
+        self.latency = Latency(latency)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+
+    def outcome(self):
+        """'ok', 'error' or 'rate_limited' for one request"""
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            return "rate_limited"
+        if roll < self.rate_limit_rate + self.error_rate:
+            return "error"
+        return "ok"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FloodAidStub/1.0"
+    # Headers and body go out in separate writes; with Nagle on, the body waits ~40 ms for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        data = body if isinstance(body, bytes) else json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _failure(self, profile, outcome):
+        if outcome == "rate_limited":
+            self._send(429, {"error": {"code": 429, "message": "Resource has been exhausted", "status": "RESOURCE_EXHAUSTED"}},
+                       headers={"Retry-After": profile.retry_after})
+        else:
+            self._send(500, {"error": {"code": 500, "message": "Internal error", "status": "INTERNAL"}})
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        if parts.path == "/_stats":
+            with self.server.lock:
+                return self._send(200, dict(self.server.counts))
+        if parts.path != "/data/2.5/weather":
+            return self._send(404, {"cod": "404", "message": "not found"})
+        self.server.count("weather")
+        profile = self.server.weather
+        time.sleep(profile.latency.sample())
+        outcome = profile.outcome()
+        if outcome != "ok":
+            return self._failure(profile, outcome)
+
+        city = parse_qs(parts.query).get("q", ["Lahore"])[0].split(",")[0].strip().title() or "Lahore"
+        rng = random.Random(city)
+        self._send(200, {
+            "coord": {"lat": round(rng.uniform(24, 36), 4), "lon": round(rng.uniform(61, 77), 4)},
+            "weather": [{"main": "Rain", "description": rng.choice(["light rain", "moderate rain", "heavy intensity rain"])}],
+            "main": {"temp": round(rng.uniform(24, 36), 2), "feels_like": round(rng.uniform(26, 40), 2),
+                     "humidity": rng.randint(60, 98), "pressure": rng.randint(990, 1015)},
+            "visibility": rng.choice([3000, 6000, 10000]),
+            "wind": {"speed": round(rng.uniform(1, 9), 2)},
+            "clouds": {"all": rng.randint(40, 100)},
+            "name": city,
+        })
+
+    def do_POST(self):
+        parts = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        if parts.path in ("/sos/webhook", "/sos/sms"):
+            return self._sink(parts.path.rsplit("/", 1)[1], json.loads(body))
+        if ":generateContent" not in parts.path and ":streamGenerateContent" not in parts.path:
+            return self._send(404, {"error": {"code": 404, "message": "not found"}})
+        streaming = ":streamGenerateContent" in parts.path
+        api = "gemini_lite" if "lite" in parts.path.rsplit("/", 1)[1].split(":")[0] else "gemini"
+        self.server.count(f"{api}_stream" if streaming else api)
+        profile = getattr(self.server, api)
+        latency = profile.latency.sample()
+        outcome = profile.outcome()
+        if outcome != "ok":
+            time.sleep(latency)
+            return self._failure(profile, outcome)
+
+        if not streaming:
+            time.sleep(latency)
+            return self._send(200, {"candidates": [{"content": {"parts": [{"text": REPLY}], "role": "model"}}]})
+
+        # Spread the latency over the chunks: first chunk after a share of it, like real token streaming
+        words = REPLY.split(" ")
+        chunks = [" ".join(words[i:i + 8]) + " " for i in range(0, len(words), 8)]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(latency * self.server.first_chunk_share)
+        gap = latency * (1 - self.server.first_chunk_share) / max(1, len(chunks) - 1)
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(gap)
+            event = b"data: " + json.dumps({"candidates": [{"content": {"parts": [{"text": chunk}], "role": "model"}}]},
+                                           ensure_ascii=False).encode() + b"\r\n\r\n"
+            self.wfile.write(f"{len(event):X}\r\n".encode() + event + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+
+    def _sink(self, name, payload):
+        """Count delivered alerts (and distinct alert ids, to spot redeliveries) for a dispatch sink"""
+        self.server.count(f"sos_{name}")
+        profile = self.server.sink
+        time.sleep(profile.latency.sample())
+        outcome = profile.outcome()
+        if outcome != "ok":
+            return self._failure(profile, outcome)
+        ids = [alert["id"] for alert in payload["alerts"]] if name == "webhook" else [m["ref"] for m in payload["messages"]]
+        with self.server.lock:
+            seen = self.server.alert_ids.setdefault(name, set())
+            seen.update(ids)
+            self.server.counts[f"sos_{name}_items"] = self.server.counts.get(f"sos_{name}_items", 0) + len(ids)
+            self.server.counts[f"sos_{name}_alerts"] = len(seen)
+        self._send(200, {"accepted": len(ids)})
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, weather=None, gemini=None, first_chunk_share=0.3, sink=None, gemini_lite=None):
+        super().__init__(address, StubHandler)
+        self.weather = weather or UpstreamProfile()
+        self.gemini = gemini or UpstreamProfile()
+        self.gemini_lite = gemini_lite or self.gemini
+        self.sink = sink or UpstreamProfile()
+        self.first_chunk_share = first_chunk_share
+        self.counts = {}
+        self.alert_ids = {}
+        self.lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # Clients hang up mid-response when a hedge or deadline cancels their call; that's expected, not an error
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def count(self, name):
+        """Bump a per-endpoint request counter (served at GET /_stats)"""
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_in_thread(port=0, **kwargs):
+    """Start a stub server on a daemon thread; returns the server (see .base_url)"""
+    server = StubServer(("127.0.0.1", port), **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _serve(port, weather_kwargs, gemini_kwargs, first_chunk_share, sink_kwargs, ready, gemini_lite_kwargs=None):
+    server = StubServer(("127.0.0.1", port), UpstreamProfile(**weather_kwargs), UpstreamProfile(**gemini_kwargs),
+                        first_chunk_share, UpstreamProfile(**sink_kwargs),
+                        UpstreamProfile(**gemini_lite_kwargs) if gemini_lite_kwargs else None)
+    ready.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_in_process(port=0, weather=None, gemini=None, first_chunk_share=0.3, sink=None, gemini_lite=None):
+    """Start a stub server in a child process so it doesn't share the GIL with the load generator.
+
+    ``weather`` / ``gemini`` / ``sink`` / ``gemini_lite`` are UpstreamProfile keyword dicts (``gemini_lite``
+    defaults to the gemini profile). Returns (process, base_url).
+    """
+    ready = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve, args=(port, weather or {}, gemini or {}, first_chunk_share,
+                                                           sink or {}, ready, gemini_lite),
+                                      daemon=True)
+    process.start()
+    return process, f"http://127.0.0.1:{ready.get(timeout=10)}"
+
+
+def add_profile_arguments(parser):
+    for api in ("weather", "gemini"):
+        parser.add_argument(f"--{api}-latency", default="fixed:50" if api == "weather" else "lognormal:800:0.5",
+                            help="fixed:MS | uniform:MIN:MAX | lognormal:MEDIAN:SIGMA")
+        parser.add_argument(f"--{api}-error-rate", type=float, default=0.0)
+        parser.add_argument(f"--{api}-429-rate", type=float, default=0.0)
+    parser.add_argument("--gemini-lite-latency", default=None,
+                        help="latency of *lite* models (the hedge model); defaults to --gemini-latency")
+    parser.add_argument("--retry-after", type=int, default=1)
+
+
+def profiles_from_args(args):
+    return tuple(
+        {"latency": getattr(args, f"{api}_latency"), "error_rate": getattr(args, f"{api}_error_rate"),
+         "rate_limit_rate": getattr(args, f"{api}_429_rate"), "retry_after": args.retry_after}
+        for api in ("weather", "gemini")
+    )
+
+
+def lite_profile_from_args(args):
+    """The gemini profile with --gemini-lite-latency, or None to serve lite models like the others"""
+    if args.gemini_lite_latency is None:
+        return None
+    return {**profiles_from_args(args)[1], "latency": args.gemini_lite_latency}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8900)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    weather, gemini = profiles_from_args(args)
+    gemini_lite = lite_profile_from_args(args)
+    server = StubServer(("127.0.0.1", args.port), UpstreamProfile(**weather), UpstreamProfile(**gemini),
+                        gemini_lite=UpstreamProfile(**gemini_lite) if gemini_lite else None)
+    print(f"Stub OpenWeather + Gemini listening on {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry TTL and stale-while-revalidate.
+
+    Entries younger than ``ttl`` seconds are fresh. Older entries are still
+    served for up to ``stale_ttl`` more seconds while exactly one caller
+    refreshes them in the background; after that they count as misses.
+    Named caches also report lookups to floodaid_cache_lookups_total.
+    """
+
+    def __init__(self, ttl=600, max_size=256, stale_ttl=1800, name=None):
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max_size
+        self.stale_ttl = stale_ttl
+        self._data = OrderedDict()  # key -> (value, stored_at)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def lookup(self, key):
+        """Return (value, state) where state is 'fresh', 'stale' or 'miss'"""
+        value, state = self._lookup(key)
+        if self.name is not None:
+            CACHE_LOOKUPS.inc(cache=self.name, result=state)
+        return value, state
+
+    def _lookup(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                age = now - stored_at
+                if age < self.ttl:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value, "fresh"
+                if age < self.ttl + self.stale_ttl:
+                    self._data.move_to_end(key)
+                    self.stale_hits += 1
+                    return value, "stale"
+                del self._data[key]
+            self.misses += 1
+            return None, "miss"
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entries if full"""
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key=None):
+        """Drop one entry, or everything when no key is given"""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def claim_refresh(self, key):
+        """Return True if the caller should refresh ``key`` (one refresher per key)"""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def release_refresh(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def get_or_load(self, key, loader, should_cache=None):
+        """Return a cached value, calling ``loader()`` on a miss.
+
+        Stale values are returned immediately and refreshed on a daemon
+        thread. ``should_cache(value)`` can veto storing a loaded value,
+        e.g. so fallback data never replaces a good cached entry.
+        """
+        value, state = self.lookup(key)
+        if state == "fresh":
+            return value
+        if state == "stale":
+            if self.claim_refresh(key):
+                threading.Thread(
+                    target=self._refresh, args=(key, loader, should_cache), daemon=True
+                ).start()
+            return value
+
+        value = loader()
+        if should_cache is None or should_cache(value):
+            self.set(key, value)
+        return value
+
+    def _refresh(self, key, loader, should_cache):
+        try:
+            value = loader()
+            if should_cache is None or should_cache(value):
+                self.set(key, value)
+        except Exception:
+            logger.exception("Cache refresh error for %r", key)
+        finally:
+            self.release_refresh(key)
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.stale_hits) / lookups, 3) if lookups else 0.0,
+            }
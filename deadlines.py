@@ -0,0 +1,93 @@
+import contextlib
+import contextvars
+import os
+import time
+
+from metrics import REGISTRY
+
+DEADLINE_EXCEEDED = REGISTRY.counter("floodaid_deadline_exceeded_total",
+                                     "Requests that ran out of time budget, by endpoint and stage (weather / gemini)",
+                                     ("endpoint", "stage"))
+
+# Per-endpoint (time budget in seconds or None, hedge percentile; 0 = no hedging).
+# <ENDPOINT>_DEADLINE and <ENDPOINT>_HEDGE_PERCENTILE override them, e.g. CHAT_DEADLINE=20, API_CHAT_HEDGE_PERCENTILE=90.
+ENDPOINTS = {
+    "chat": (30.0, 95.0),      # Gradio chat (streamed)
+    "api_chat": (30.0, 95.0),  # POST /api/chat
+    "weather": (10.0, 0.0),    # weather panel and /api/weather
+    "sos": (10.0, 0.0),        # SOS alert text
+    "weather_fetch": (5.0, 0.0),  # one OpenWeather fetch, retries included, nested in the caller's budget
+    "backend": (None, 0.0),    # backend calls made outside any endpoint (scripts, load tests)
+}
+
+# Floor for timeouts cut from an almost spent budget, so the call fails fast rather than with a zero timeout
+MIN_TIMEOUT = 0.05
+
+
+class Budget:
+    """Time budget of one request: a time.monotonic() deadline (None = unbounded) and its hedging policy"""
+
+    __slots__ = ("endpoint", "deadline", "hedge_percentile")
+
+    def __init__(self, endpoint, deadline, hedge_percentile):
+        self.endpoint = endpoint
+        self.deadline = deadline
+        self.hedge_percentile = hedge_percentile
+
+    def remaining(self):
+        """Seconds left, or None if unbounded"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def timeout(self, cap):
+        """``cap`` seconds, cut to what is left of the budget"""
+        remaining = self.remaining()
+        return cap if remaining is None else min(cap, max(remaining, MIN_TIMEOUT))
+
+    def exceeded(self, stage):
+        DEADLINE_EXCEEDED.inc(endpoint=self.endpoint, stage=stage)
+
+
+def endpoint_policy(endpoint):
+    """(seconds or None, hedge percentile) for an endpoint, with environment overrides"""
+    seconds, percentile = ENDPOINTS.get(endpoint, ENDPOINTS["backend"])
+    prefix = endpoint.upper()
+    seconds = float(os.getenv(f"{prefix}_DEADLINE", seconds or 0)) or None
+    percentile = float(os.getenv(f"{prefix}_HEDGE_PERCENTILE", percentile))
+    return seconds, percentile
+
+
+def _budget(endpoint, parent=None):
+    seconds, percentile = endpoint_policy(endpoint)
+    deadline = None if seconds is None else time.monotonic() + seconds
+    # A nested budget never extends the one around it
+    if parent is not None and parent.deadline is not None:
+        deadline = parent.deadline if deadline is None else min(deadline, parent.deadline)
+    return Budget(endpoint, deadline, percentile)
+
+
+_current_budget = contextvars.ContextVar("request_budget", default=None)
+
+
+def current_budget():
+    """Budget of the request being served; outside any endpoint, a fresh "backend" budget"""
+    return _current_budget.get() or _budget("backend")
+
+
+def detach_budget():
+    """Leave the request's budget behind in the current context, for background work that outlives the request"""
+    _current_budget.set(None)
+
+
+@contextlib.contextmanager
+def request_budget(endpoint):
+    """Give the block - and the weather fetches, queue waits and Gemini calls it makes - the endpoint's budget"""
+    parent = _current_budget.get()
+    budget = _budget(endpoint, parent)
+    # set() rather than a reset token, as in metrics.span: generators may resume this block in a copied context
+    _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.set(parent)
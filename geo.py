@@ -0,0 +1,198 @@
+import heapq
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# City centres used to place user queries on the map (lat, lon)
+CITY_COORDINATES = {
+    "lahore": (31.5204, 74.3587),
+    "karachi": (24.8607, 67.0011),
+    "islamabad": (33.6844, 73.0479),
+    "rawalpindi": (33.5651, 73.0169),
+    "multan": (30.1575, 71.5249),
+    "faisalabad": (31.4504, 73.1350),
+    "peshawar": (34.0151, 71.5249),
+    "quetta": (30.1798, 66.9750),
+    "hyderabad": (25.3960, 68.3578),
+    "gujranwala": (32.1877, 74.1945),
+    "sialkot": (32.4945, 74.5229),
+    "sargodha": (32.0836, 72.6711),
+    "bahawalpur": (29.3956, 71.6836),
+    "sukkur": (27.7052, 68.8574),
+    "larkana": (27.5570, 68.2264),
+    "sheikhupura": (31.7167, 73.9850),
+    "jhang": (31.2781, 72.3317),
+    "gujrat": (32.5731, 74.0789),
+    "kasur": (31.1187, 74.4636),
+    "okara": (30.8138, 73.4534),
+    "sahiwal": (30.6682, 73.1114),
+    "mardan": (34.1989, 72.0231),
+    "mingora": (34.7717, 72.3600),
+    "swat": (34.7717, 72.3600),
+    "abbottabad": (34.1688, 73.2215),
+    "nowshera": (34.0153, 71.9747),
+    "charsadda": (34.1482, 71.7406),
+    "dera ismail khan": (31.8314, 70.9019),
+    "dera ghazi khan": (30.0459, 70.6403),
+    "rahim yar khan": (28.4202, 70.2952),
+    "muzaffargarh": (30.0736, 71.1805),
+    "jacobabad": (28.2769, 68.4514),
+    "dadu": (26.7319, 67.7750),
+    "nawabshah": (26.2442, 68.4100),
+    "mirpur khas": (25.5276, 69.0111),
+    "thatta": (24.7461, 67.9243),
+    "badin": (24.6560, 68.8370),
+    "khairpur": (27.5295, 68.7592),
+    "gwadar": (25.1264, 62.3225),
+    "turbat": (26.0031, 63.0544),
+    "jhelum": (32.9405, 73.7276),
+    "chiniot": (31.7200, 72.9789),
+    "mianwali": (32.5839, 71.5370),
+    "muzaffarabad": (34.3700, 73.4711),
+    "gilgit": (35.9208, 74.3144),
+    "skardu": (35.2971, 75.6333),
+}
+
+
+def normalize_city(city):
+    return " ".join(city.replace(",", " ").split()).lower()
+
+
+def lookup_city(city):
+    """Coordinates of a known city, ignoring case, spacing and a trailing ', Pakistan'"""
+    name = normalize_city(city)
+    if name.endswith(" pakistan"):
+        name = name[:-len(" pakistan")]
+    return CITY_COORDINATES.get(name)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in kilometres"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class ShelterIndex:
+    """Uniform lat/lon grid over shelters for k-nearest and radius queries.
+
+    Shelters are bucketed into ``cell_deg`` x ``cell_deg`` cells. A query
+    scans rings of cells outward from the query cell and stops once the
+    k-th best distance is closer than anything the next ring could hold,
+    so cost depends on local density rather than registry size. The
+    ``available`` field is read live, so occupancy changes need no reindex.
+    """
+
+    def __init__(self, shelters=(), cell_deg=0.25):
+        self.cell_deg = cell_deg
+        self._cells = {}
+        self._size = 0
+        self._min_cell = None
+        self._max_cell = None
+        for shelter in shelters:
+            self.add(shelter)
+
+    def __len__(self):
+        return self._size
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg))
+
+    def add(self, shelter):
+        if shelter.get("lat") is None or shelter.get("lon") is None:
+            return
+        cell = self._cell(shelter["lat"], shelter["lon"])
+        self._cells.setdefault(cell, []).append(shelter)
+        self._size += 1
+        if self._min_cell is None:
+            self._min_cell, self._max_cell = cell, cell
+        else:
+            self._min_cell = (min(self._min_cell[0], cell[0]), min(self._min_cell[1], cell[1]))
+            self._max_cell = (max(self._max_cell[0], cell[0]), max(self._max_cell[1], cell[1]))
+
+    def remove(self, shelter):
+        if shelter.get("lat") is None or shelter.get("lon") is None:
+            return
+        bucket = self._cells.get(self._cell(shelter["lat"], shelter["lon"]), [])
+        for i, candidate in enumerate(bucket):
+            if candidate is shelter:
+                del bucket[i]
+                self._size -= 1
+                return
+
+    def _ring(self, center, r):
+        ci, cj = center
+        if r == 0:
+            yield center
+            return
+        for j in range(cj - r, cj + r + 1):
+            yield (ci - r, j)
+            yield (ci + r, j)
+        for i in range(ci - r + 1, ci + r):
+            yield (i, cj - r)
+            yield (i, cj + r)
+
+    def _ring_min_km(self, lat, lon, r):
+        """Lower bound on the distance from the query to any cell in ring r or beyond: the distance to the
+        nearest edge of the square of rings inside it"""
+        if r == 0:
+            return 0.0
+        ci, cj = self._cell(lat, lon)
+        lat_gap = min(lat - (ci - r + 1) * self.cell_deg, (ci + r) * self.cell_deg - lat)
+        lon_gap = min(lon - (cj - r + 1) * self.cell_deg, (cj + r) * self.cell_deg - lon)
+        # Crossing a parallel takes at least the latitude gap; reaching a meridian at least the cross-track distance
+        across_lat = lat_gap * KM_PER_DEGREE
+        across_lon = EARTH_RADIUS_KM * math.asin(math.sin(math.radians(min(90.0, lon_gap))) * math.cos(math.radians(lat)))
+        return min(across_lat, across_lon)
+
+    def _max_ring(self, center):
+        if self._min_cell is None:
+            return -1
+        return max(abs(center[0] - self._min_cell[0]), abs(center[0] - self._max_cell[0]),
+                   abs(center[1] - self._min_cell[1]), abs(center[1] - self._max_cell[1]))
+
+    @staticmethod
+    def _matches(shelter, facilities, require_available):
+        if require_available and shelter.get("available", 0) <= 0:
+            return False
+        return all(facility in shelter.get("facilities", ()) for facility in facilities)
+
+    def nearest(self, lat, lon, k=1, facilities=(), require_available=True, max_km=None):
+        """Up to k (distance_km, shelter) pairs, closest first"""
+        center = self._cell(lat, lon)
+        best = []  # max-heap of (-distance, seq, shelter)
+        seq = 0
+        for r in range(self._max_ring(center) + 1):
+            bound = self._ring_min_km(lat, lon, r)
+            if max_km is not None and bound > max_km:
+                break
+            if len(best) == k and bound > -best[0][0]:
+                break
+            for cell in self._ring(center, r):
+                for shelter in self._cells.get(cell, ()):
+                    if not self._matches(shelter, facilities, require_available):
+                        continue
+                    distance = haversine_km(lat, lon, shelter["lat"], shelter["lon"])
+                    if max_km is not None and distance > max_km:
+                        continue
+                    seq += 1
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, seq, shelter))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, seq, shelter))
+        return [(-d, shelter) for d, _, shelter in sorted(best, key=lambda item: (-item[0], item[1]))]
+
+    def count_within(self, lat, lon, radius_km, facilities=(), require_available=True):
+        """Number of matching shelters within radius_km"""
+        center = self._cell(lat, lon)
+        count = 0
+        for r in range(self._max_ring(center) + 1):
+            if self._ring_min_km(lat, lon, r) > radius_km:
+                break
+            for cell in self._ring(center, r):
+                for shelter in self._cells.get(cell, ()):
+                    if (self._matches(shelter, facilities, require_available)
+                            and haversine_km(lat, lon, shelter["lat"], shelter["lon"]) <= radius_km):
+                        count += 1
+        return count
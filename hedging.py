@@ -0,0 +1,110 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import math
+import threading
+from collections import deque
+
+from metrics import REGISTRY
+
+HEDGED_CALLS = REGISTRY.counter("floodaid_hedged_calls_total",
+                                "Calls that started a hedge, by call and winner (primary / hedge / neither)",
+                                ("call", "winner"))
+
+
+class LatencyWindow:
+    """Latencies of the most recent calls of one kind; a percentile of them is the hedge delay"""
+
+    def __init__(self, size=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct):
+        """Nearest-rank percentile in seconds, or None until min_samples calls have been seen"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < self.min_samples or not 0 < pct < 100:
+            return None
+        return samples[max(1, math.ceil(pct / 100 * len(samples))) - 1]
+
+
+def _retrieve(task):
+    """Done callback marking a loser's exception as seen, so asyncio doesn't log it"""
+    if not task.cancelled():
+        task.exception()
+
+
+async def hedge_async(call, primary, hedge, delay, succeeded, discard=None):
+    """Await ``primary()``, racing ``hedge()`` against it if it is still running after ``delay`` seconds.
+
+    The first result that ``succeeded`` wins and the other call is
+    cancelled; ``discard`` (a coroutine function) releases a losing result
+    that finished anyway. If neither succeeds, the primary's result or
+    exception is returned. ``delay`` None means no hedge.
+    """
+    if delay is None:
+        return await primary()
+    primary_task = asyncio.ensure_future(primary())
+    primary_task.add_done_callback(_retrieve)
+    tasks = {primary_task: "primary"}
+    returned = winner = None
+    try:
+        done, _ = await asyncio.wait({primary_task}, timeout=delay)
+        if not done:
+            hedge_task = asyncio.ensure_future(hedge())
+            hedge_task.add_done_callback(_retrieve)
+            tasks[hedge_task] = "hedge"
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is None and succeeded(task.result()):
+                    returned = winner = task
+                    return task.result()
+        returned = primary_task
+        return primary_task.result()
+    finally:
+        for task in tasks:
+            if task is returned:
+                continue
+            if not task.done():
+                task.cancel()
+            elif discard is not None and not task.cancelled() and task.exception() is None:
+                await discard(task.result())
+        if len(tasks) > 1:
+            HEDGED_CALLS.inc(call=call, winner=tasks[winner] if winner is not None else "neither")
+
+
+def hedge_sync(call, primary, hedge, delay, succeeded, executor):
+    """Blocking hedge_async: both calls run on ``executor`` threads.
+
+    A call already running on a thread cannot be interrupted, so a losing
+    call finishes in the background and its result is dropped.
+    """
+    if delay is None:
+        return primary()
+    primary_future = executor.submit(contextvars.copy_context().run, primary)
+    futures = {primary_future: "primary"}
+    done, _ = concurrent.futures.wait([primary_future], timeout=delay)
+    if not done:
+        futures[executor.submit(contextvars.copy_context().run, hedge)] = "hedge"
+    winner = None
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None and succeeded(future.result()):
+                    winner = future
+                    return future.result()
+        return primary_future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        if len(futures) > 1:
+            HEDGED_CALLS.inc(call=call, winner=futures[winner] if winner is not None else "neither")
@@ -0,0 +1,130 @@
+import logging
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import TTLCache
+from metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+TRUNCATION_MARKER = " …[truncated]"
+
+
+def estimate_tokens(text):
+    """Local token estimate: UTF-8 bytes / 4.
+
+    Close to Gemini's tokenizer for English (~4 chars per token) and
+    appropriately higher for Urdu script (2 bytes per character) and emoji,
+    at the cost of one C-level encode instead of a tokenizer call.
+    """
+    if not text:
+        return 0
+    return math.ceil(len(text.encode("utf-8")) / 4)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut ``text`` to roughly ``max_tokens`` tokens, keeping the start and marking the cut"""
+    if max_tokens is None:
+        return text
+    return truncate_to_bytes(text, max_tokens * 4)
+
+
+def truncate_to_bytes(text, max_bytes):
+    """Cut ``text`` to at most ``max_bytes`` of UTF-8, keeping the start and marking the cut if the marker fits"""
+    data = text.encode("utf-8")
+    if len(data) <= max_bytes:
+        return text
+    marker = TRUNCATION_MARKER if len(TRUNCATION_MARKER.encode("utf-8")) < max_bytes else ""
+    limit = max_bytes - len(marker.encode("utf-8"))
+    # errors="ignore" drops a multi-byte character split at the cut
+    return data[:limit].decode("utf-8", errors="ignore").rstrip() + marker
+
+
+def compact_history(history, budget, max_turns=None, turn_tokens=None):
+    """Split (user, assistant) turns into those that fit the prompt and the older rest.
+
+    Walks back from the newest turn, truncating each message to
+    ``turn_tokens`` and keeping turns while their total stays within
+    ``budget`` tokens (and at most ``max_turns`` of them). Returns
+    (kept turns oldest-first, truncated; older original turns).
+    """
+    kept = []
+    used = 0
+    for index in range(len(history) - 1, -1, -1):
+        if max_turns is not None and len(kept) >= max_turns:
+            break
+        human, assistant = history[index]
+        human, assistant = truncate_to_tokens(human, turn_tokens), truncate_to_tokens(assistant, turn_tokens)
+        cost = estimate_tokens(human) + estimate_tokens(assistant)
+        if used + cost > budget:
+            break
+        kept.append((human, assistant))
+        used += cost
+    kept.reverse()
+    return kept, list(history[:len(history) - len(kept)])
+
+
+class RollingSummarizer:
+    """Cached rolling summaries of conversation turns that no longer fit the prompt.
+
+    ``summarize(previous_summary, turns)`` (e.g. a short Gemini call) runs
+    on a background thread, never on the request path: summary_for returns
+    the best summary already available - exact, or one covering a shorter
+    prefix of the same conversation - and schedules the missing work. A
+    summary of turns[:m] is extended with turns[m:] rather than recomputed,
+    so each turn is summarized once as it scrolls out of the window.
+    """
+
+    def __init__(self, summarize, max_size=1024, max_workers=2):
+        self.summarize = summarize
+        self.cache = TTLCache(ttl=float("inf"), max_size=max_size)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="history-summary")
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(turns):
+        return len(turns), hash(tuple(turns))
+
+    def _best_prefix(self, turns):
+        """(length, summary) of the longest cached prefix of turns, or (0, None)"""
+        for length in range(len(turns), 0, -1):
+            summary, state = self.cache.lookup(self._key(turns[:length]))
+            if state != "miss":
+                return length, summary
+        return 0, None
+
+    def summary_for(self, turns):
+        """Best available summary of ``turns`` (None if nothing cached yet); never blocks on the summarizer"""
+        if not turns:
+            return None
+        turns = [tuple(turn) for turn in turns]
+        length, summary = self._best_prefix(turns)
+        # Reported once per request: exact summary "fresh", shorter prefix "stale"
+        CACHE_LOOKUPS.inc(cache="summary", result="fresh" if length == len(turns) else "stale" if length else "miss")
+        if length < len(turns):
+            self._schedule(turns, length, summary)
+        return summary
+
+    def _schedule(self, turns, length, previous):
+        key = self._key(turns)
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        self._executor.submit(self._run, key, previous, turns[length:])
+
+    def _run(self, key, previous, new_turns):
+        try:
+            summary = self.summarize(previous, new_turns)
+            if summary:
+                self.cache.set(key, summary)
+        except Exception:
+            logger.exception("History summary failed")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,189 @@
+import re
+
+from geo import CITY_COORDINATES
+
+WORD_PATTERN = re.compile(r"\w+")
+
+# Words that make a message a lookup, in English, Roman Urdu and Urdu script
+SHELTER_WORDS = (r"shelters?", r"refuge", r"evacuation\s+cent(?:er|re)s?", r"place\s+to\s+stay", r"safe\s+place",
+                 r"panah\s*gah[ae]?", r"pnah\s*gah", r"rehn[ea]y?\s+ki\s+jag[ae]h?", r"shelt[ae]r",
+                 r"پناہ[\s\u200c]*گاہ(?:یں)?", r"رہنے\s+کی\s+جگہ", r"شیلٹر")
+CONTACT_WORDS = (r"numbers?", r"phone", r"contacts?", r"helplines?", r"hotlines?", r"call",
+                 r"nambar", r"nmbr", r"ra+bta", r"fone",
+                 r"نمبر", r"فون", r"رابطہ", r"ہیلپ[\s\u200c]*لائن")
+CAMP_WORDS = (r"relief\s+camps?", r"camps?", r"kemp", r"distribution", r"taqseem", r"کیمپ", r"تقسیم")
+FIND_WORDS = (r"where", r"get", r"find", r"need", r"available", r"kahan?", r"kaha+n", r"kidhar", r"mil(?:e|ay|ey)?",
+              r"milega", r"milta", r"milti", r"sakta", r"sakti", r"chahi?y[ea]", r"chahiye",
+              r"کہاں", r"ملے", r"ملے\s*گا", r"ملتا", r"مل", r"سکتا", r"چاہیے", r"چاہئے")
+# Words that mark a different request (donating, volunteering) even next to lookup words
+OTHER_WORDS = (r"donat(?:e|es|ed|ing|ions?)", r"volunteer(?:s|ing)?", r"atiy[ae]", r"عطیہ", r"رضاکار")
+
+# Organisations: canonical name (as it appears in contact and camp names) -> spellings
+ORGANISATIONS = {
+    "edhi": (r"edhi", r"eidhi", r"ایدھی"),
+    "rescue 1122": (r"rescue(?:\s*1122)?", r"1122", r"ریسکیو"),
+    "police": (r"police", r"polic[ea]", r"پولیس"),
+    "ambulance": (r"ambulances?", r"ambulence", r"ایمبولینس"),
+    "ndma": (r"ndma",),
+    "pdma": (r"pdma",),
+    "sdma": (r"sdma",),
+    "red crescent": (r"red\s*crescent", r"hilal[\s-]*e?[\s-]*ahmar", r"ہلال[\s\u200c]*احمر"),
+    "al-khidmat": (r"al[\s-]*khidmat", r"الخدمت"),
+    "jdc": (r"jdc",),
+    "saylani": (r"saylani", r"sailani", r"سیلانی"),
+    "chippa": (r"chh?ippa", r"چھیپا"),
+}
+
+# Supplies: canonical name -> (spellings, words matching camp supply names, shelter facility or None)
+ITEMS = {
+    "baby formula": ((r"baby\s*formula", r"formula(?:\s*milk)?", r"baby\s*milk", r"doo?dh", r"milk", r"دودھ", r"فارمولا"),
+                     ("baby formula",), None),
+    "food": ((r"food", r"meals?", r"rations?", r"rashan", r"kha+na", r"groceries", r"کھانا", r"راشن"),
+             ("food", "meal", "groceries"), "Food"),
+    "water": ((r"water", r"pa+ni", r"پانی"), ("water",), "Water"),
+    "medicine": ((r"medicines?", r"medical", r"meds", r"dawa+i?", r"دوا", r"دوائی", r"ادویات"),
+                 ("medic",), "Medical"),
+    "blankets": ((r"blankets?", r"kambal", r"razai", r"کمبل", r"رضائی"), ("blanket",), None),
+    "clothes": ((r"clothes", r"clothing", r"kapr(?:a|e|ay|ey)", r"کپڑے"), ("clothes",), None),
+    "tents": ((r"tents?", r"tarpaulins?", r"khaim[ae]y?", r"خیمہ", r"خیمے"), ("tent",), None),
+    "beds": ((r"beds?", r"mattress(?:es)?", r"bistar", r"بستر"), ("mattress", "bed"), "Beds"),
+}
+
+# Urdu-script and short names for gazetteer cities
+CITY_ALIASES = {
+    "lahore": (r"لاہور",), "karachi": (r"کراچی",), "islamabad": (r"اسلام[\s\u200c]*آباد", r"isb"),
+    "rawalpindi": (r"راولپنڈی", r"pindi"), "multan": (r"ملتان",), "faisalabad": (r"فیصل[\s\u200c]*آباد",),
+    "peshawar": (r"پشاور",), "quetta": (r"کوئٹہ",), "hyderabad": (r"حیدر[\s\u200c]*آباد",), "sukkur": (r"سکھر",),
+}
+
+# Words a lookup may contain besides the ones above; any other word ("safe", "flooded", "dead", "family")
+# counts against max_unknown
+FILLER_WORDS = (
+    # English
+    r"i", r"me", r"my", r"we", r"us", r"our", r"a", r"an", r"the", r"is", r"are", r"there", r"any", r"some", r"in",
+    r"at", r"near", r"nearby", r"nearest", r"closest", r"close", r"by", r"for", r"to", r"of", r"from", r"with",
+    r"can", r"could", r"do", r"does", r"which", r"what", r"whats", r"show", r"list", r"give", r"tell", r"send",
+    r"please", r"pls", r"plz", r"want", r"emergency", r"facilities", r"facility", r"nearer", r"city", r"open",
+    r"supplies", r"supply", r"help", r"free", r"and", r"or", r"here", r"its", r"it", r"centre", r"center",
+    r"have", r"has",
+    # Roman Urdu
+    r"mujh[ea]y?", r"hame?i?n", r"hum", r"ko", r"ka", r"ki", r"ke", r"kay", r"hai", r"hain", r"he", r"kya", r"koi",
+    r"mein", r"main", r"se", r"sab", r"sabse", r"bata(?:o|en|ein|ain|yen)?", r"dein", r"den", r"do", r"ga", r"gi",
+    r"yahan", r"idhar", r"aur", r"ya", r"shehar", r"qareeb", r"qareebi", r"qarib", r"nazdee?k", r"nazdee?ki",
+    r"wala", r"wali", r"wale",
+    # Urdu script
+    r"مجھے", r"ہمیں", r"کو", r"کا", r"کی", r"کے", r"ہے", r"ہیں", r"کیا", r"کوئی", r"میں", r"سے", r"سب",
+    r"بتائیں", r"بتاؤ", r"دیں", r"گا", r"گی", r"یہاں", r"اور", r"یا", r"شہر", r"قریب", r"قریبی", r"نزدیک",
+    r"نزدیکی", r"والا", r"والی", r"ایمرجنسی",
+)
+
+
+class IntentRouter:
+    """Recognises lookup messages that local records answer exactly.
+
+    Every vocabulary spelling is compiled into regex alternations bucketed
+    by first letter, so classifying a message is one match attempt per
+    word: the matches say which slots are present (shelter, contact, camp,
+    organisation, supply, city), and the words left unmatched say whether
+    the message asks anything more. A message with more than
+    ``max_unknown`` such words - "is the shelter safe", "my phone is dead",
+    "call my family" - with an off-topic word (donating, volunteering), or
+    with an urgent one ("rescue me", "injured") is left to the model.
+
+    ``classify`` returns a dict ``{"intent", "city", "item", "org"}`` with
+    intent "nearest_shelter", "contact" or "relief_camp", or None.
+    """
+
+    def __init__(self, cities=CITY_COORDINATES, max_unknown=0, max_chars=160):
+        self.max_unknown = max_unknown
+        self.max_chars = max_chars
+        slots = [(("shelter", None), SHELTER_WORDS), (("contact", None), CONTACT_WORDS),
+                 (("camp", None), CAMP_WORDS), (("find", None), FIND_WORDS), (("other", None), OTHER_WORDS)]
+        slots += [(("org", name), spellings) for name, spellings in ORGANISATIONS.items()]
+        slots += [(("item", name), spellings) for name, (spellings, _, _) in ITEMS.items()]
+        for city in cities:
+            spellings = (r"\s+".join(map(re.escape, city.split())),) + CITY_ALIASES.get(city, ())
+            slots.append((("city", city), spellings))
+        slots.append((("filler", None), FILLER_WORDS))
+        # Longest spellings first so "relief camp" wins over "camp" and "rescue 1122" over "1122"
+        alternatives = sorted(((spelling, slot) for slot, spellings in slots for spelling in spellings),
+                              key=lambda item: -len(item[0]))
+        self._groups = []
+        buckets = {}
+        for spelling, slot in alternatives:
+            buckets.setdefault(spelling[0], []).append(f"(?P<g{len(self._groups)}>{spelling})")
+            self._groups.append(slot)
+        self._patterns = {first: re.compile("(?:" + "|".join(parts) + r")(?!\w)") for first, parts in buckets.items()}
+
+    def slots(self, message):
+        """({slot kind: value}, unmatched word count) for a message"""
+        text = message.lower()
+        found = {}
+        unknown = end = 0
+        for word in WORD_PATTERN.finditer(text):
+            start = word.start()
+            if start < end:
+                continue  # Inside a multi-word spelling such as "relief camp"
+            pattern = self._patterns.get(text[start])
+            match = pattern.match(text, start) if pattern else None
+            if match is None:
+                unknown += 1
+                continue
+            kind, value = self._groups[int(match.lastgroup[1:])]
+            found.setdefault(kind, value)
+            end = match.end()
+        return found, unknown
+
+    def classify(self, message):
+        if len(message) > self.max_chars:
+            return None
+        found, unknown = self.slots(message)
+        if unknown > self.max_unknown or "other" in found or URGENT_PATTERN.search(message):
+            return None
+        if "shelter" in found:
+            intent = "nearest_shelter"
+        elif "camp" in found or ("item" in found and "find" in found):
+            intent = "relief_camp"
+        elif "org" in found or "contact" in found:
+            intent = "contact"
+        else:
+            return None
+        return {"intent": intent, "city": found.get("city"), "item": found.get("item"), "org": found.get("org")}
+
+
+def supply_terms(item):
+    """Lower-case words that mark a camp supply as the requested item"""
+    return ITEMS[item][1]
+
+
+def shelter_facility(item):
+    """Shelter facility providing the item, or None"""
+    return ITEMS[item][2] if item else None
+
+
+# Words marking a message as urgent (injury, illness, danger to life) for the Gemini scheduler
+URGENT_WORDS = (
+    r"injur\w*", r"hurt", r"bleed\w*", r"blood", r"wound\w*", r"unconscious", r"faint\w*", r"drown\w*", r"trapped",
+    r"stuck", r"sos", r"emergency", r"urgent", r"dying", r"snake", r"bitten", r"fractur\w*", r"broken",
+    r"pregnan\w*", r"labou?r", r"heart\s+attack", r"chest\s+pain", r"breath\w*", r"fever", r"diarrh\w*",
+    r"cholera", r"vomit\w*", r"poison\w*", r"electrocut\w*", r"burn\w*", r"ambulance", r"hospital", r"doctor",
+    r"insulin", r"help\s+me", r"rescue\s+me", r"save\s+me",
+    r"zakhmi", r"khoon", r"doo?b\w*", r"phans\w*", r"madad", r"bachao", r"behosh", r"bukhar", r"haiza", r"ulti",
+    r"saa?np", r"haa?mla", r"dard",
+    r"زخمی", r"خون", r"ڈوب\w*", r"پھنس\w*", r"مدد", r"بچاؤ", r"بے\s*ہوش", r"بخار", r"ہیضہ", r"الٹی", r"سانپ",
+    r"حاملہ", r"درد", r"ہسپتال", r"ڈاکٹر",
+)
+URGENT_PATTERN = re.compile(r"(?<!\w)(?:" + "|".join(URGENT_WORDS) + r")(?!\w)", re.IGNORECASE)
+OTHER_PATTERN = re.compile(r"(?<!\w)(?:" + "|".join(OTHER_WORDS) + r")(?!\w)", re.IGNORECASE)
+
+
+def message_priority(message, risk_level=None):
+    """Scheduling rank of a chat message: 0 urgent (injury, illness, SOS), 1 high (the city's flood risk
+    is Critical), 2 normal, 3 low (donating, volunteering)"""
+    if URGENT_PATTERN.search(message):
+        return 0
+    if risk_level == "Critical":
+        return 1
+    if OTHER_PATTERN.search(message):
+        return 3
+    return 2
@@ -0,0 +1,81 @@
+import asyncio
+import contextlib
+import functools
+import inspect
+import time
+
+from metrics import IN_FLIGHT
+
+
+class Lane:
+    """Bounded concurrency group for async event handlers.
+
+    Each lane has its own semaphore, so a burst of slow calls in one lane
+    (e.g. 30 s Gemini chats) can never hold the slots another lane (e.g.
+    SOS) needs. Queue depth, in-flight count and wait times are tracked per
+    lane. ``limit=None`` means unbounded.
+    """
+
+    def __init__(self, name, limit=None):
+        self.name = name
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit) if limit else None
+        self.waiting = 0
+        self.active = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """Hold one of the lane's slots for the duration of the block"""
+        start = time.monotonic()
+        self.waiting += 1
+        try:
+            if self._semaphore is not None:
+                await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        wait = time.monotonic() - start
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.active += 1
+        IN_FLIGHT.inc(kind="lane", name=self.name)
+        try:
+            yield
+        finally:
+            IN_FLIGHT.dec(kind="lane", name=self.name)
+            self.active -= 1
+            self.completed += 1
+            if self._semaphore is not None:
+                self._semaphore.release()
+
+    def __call__(self, handler):
+        """Decorate an async handler or async generator handler to run inside the lane"""
+        if inspect.isasyncgenfunction(handler):
+            @functools.wraps(handler)
+            async def wrapper(*args, **kwargs):
+                async with self.slot():
+                    async for item in handler(*args, **kwargs):
+                        yield item
+        else:
+            @functools.wraps(handler)
+            async def wrapper(*args, **kwargs):
+                async with self.slot():
+                    return await handler(*args, **kwargs)
+        return wrapper
+
+    def snapshot(self):
+        return {
+            "limit": self.limit,
+            "queued": self.waiting,
+            "in_flight": self.active,
+            "completed": self.completed,
+            "avg_wait_ms": round(self.total_wait / self.completed * 1000, 2) if self.completed else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+        }
+
+
+def lane_stats(lanes):
+    """Queue depth and wait time for each lane, keyed by lane name"""
+    return {lane.name: lane.snapshot() for lane in lanes}
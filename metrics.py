@@ -0,0 +1,271 @@
+import bisect
+import contextlib
+import itertools
+import logging
+import math
+import threading
+import time
+from contextvars import ContextVar
+
+logger = logging.getLogger("floodaid.spans")
+
+# Seconds; spans both sub-millisecond renders and 30 s Gemini calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """(suffix, label values, extra label pairs, value) tuples for the exposition format"""
+        with self._lock:
+            return [("", key, (), value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, one series per label combination"""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Value that goes up and down, e.g. requests in flight"""
+
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    @contextlib.contextmanager
+    def track(self, **labels):
+        """Count the block as in flight while it runs"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram of observed values (seconds for latencies)"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of the block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def summary(self, **labels):
+        """(count, sum) for one series"""
+        with self._lock:
+            series = self._values.get(self._key(labels))
+            return (series[2], series[1]) if series else (0, 0.0)
+
+    def samples(self):
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        samples = []
+        for key, counts, total, count in series:
+            cumulative = itertools.accumulate(counts)
+            for bound, running in zip(self.buckets + (math.inf,), cumulative):
+                samples.append(("_bucket", key, (("le", _format_value(bound)),), running))
+            samples.append(("_sum", key, (), total))
+            samples.append(("_count", key, (), count))
+        return samples
+
+
+class Registry:
+    """Named metrics rendered together in the Prometheus text exposition format.
+
+    Registration is idempotent: asking for an existing name returns the
+    metric already registered, so modules can declare the metrics they use
+    at import time.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, help, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} already registered with a different type or labels")
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter, name, help, labelnames)
+
+    def gauge(self, name, help, labelnames=()):
+        return self._register(Gauge, name, help, labelnames)
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, help, labelnames, buckets=buckets)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        """All metrics as Prometheus text (Content-Type: CONTENT_TYPE)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+REGISTRY = Registry()
+
+# Shared instruments: upstream calls are counted by status, in-flight by upstream or lane
+UPSTREAM_RESPONSES = REGISTRY.counter(
+    "floodaid_upstream_responses_total", "Upstream API responses by status code (or timeout / error)",
+    ("upstream", "status"))
+IN_FLIGHT = REGISTRY.gauge(
+    "floodaid_in_flight_requests", "Requests currently in progress", ("kind", "name"))
+CACHE_LOOKUPS = REGISTRY.counter(
+    "floodaid_cache_lookups_total", "Cache lookups by cache and result (fresh / stale / miss)",
+    ("cache", "result"))
+
+
+# ---- Timing spans -------------------------------------------------------------
+
+_current_span = ContextVar("floodaid_current_span", default=None)
+_span_ids = itertools.count(1)
+
+
+def _log_span(record):
+    if logger.isEnabledFor(logging.DEBUG):
+        labels = " ".join(f"{key}={value}" for key, value in record["labels"].items())
+        logger.debug("span %s %.2f ms trace=%s %s", record["name"], record["duration_ms"], record["trace_id"], labels)
+
+
+_span_logger = _log_span
+
+
+def set_span_logger(span_logger):
+    """Send every finished span to ``span_logger(record)``; None restores the default debug log.
+
+    ``record`` is a dict with name, trace_id, span_id, parent_id, start
+    (epoch seconds), duration_ms, labels and error (exception type name or
+    None). Spans opened while another span is active in the same thread or
+    task share its trace_id, so one chat request's weather fetch, prompt
+    build and Gemini call can be correlated.
+    """
+    global _span_logger
+    _span_logger = span_logger or _log_span
+
+
+@contextlib.contextmanager
+def span(name, histogram=None, **labels):
+    """Time a block as a span, optionally observing its duration into ``histogram``.
+
+    ``labels`` go on the span record; the histogram is observed with the
+    subset matching its label names. Yields the record so the block can add
+    labels (e.g. the response status) before it is emitted.
+    """
+    parent = _current_span.get()
+    span_id = next(_span_ids)
+    record = {
+        "name": name,
+        "trace_id": parent["trace_id"] if parent else span_id,
+        "span_id": span_id,
+        "parent_id": parent["span_id"] if parent else None,
+        "start": time.time(),
+        "duration_ms": None,
+        "labels": dict(labels),
+        "error": None,
+    }
+    # set() rather than a reset token: generators may resume this block in a copied context
+    _current_span.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        _current_span.set(parent)
+        record["duration_ms"] = round(elapsed * 1000, 3)
+        if histogram is not None:
+            histogram.observe(elapsed, **{key: record["labels"][key] for key in histogram.labelnames})
+        try:
+            _span_logger(record)
+        except Exception:
+            logger.exception("Span logger failed")
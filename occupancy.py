@@ -0,0 +1,124 @@
+import threading
+
+from store import shelter_city
+
+
+def _check_people(people):
+    if not people > 0:
+        raise ValueError(f"people must be positive, got {people}")
+
+
+class OccupancyTracker:
+    """Live shelter occupancy with running aggregates.
+
+    Totals and per-city / per-facility breakdowns are adjusted by the delta
+    of each update, so check-ins, check-outs and statistics reads are O(1)
+    regardless of how many shelters there are. ``persist(name, available)``
+    runs inside the same lock, so the repository and the aggregates never
+    disagree for a reader that takes the lock.
+    """
+
+    def __init__(self, shelters, persist=None):
+        self.lock = threading.RLock()
+        self._persist = persist
+        self.reload(shelters)
+
+    def reload(self, shelters):
+        """Track exactly ``shelters``, rebuilding the aggregates (e.g. after a bulk import)"""
+        with self.lock:
+            self._shelters = {}
+            self.shelter_count = 0
+            self.total_capacity = 0
+            self.total_available = 0
+            self.by_city = {}
+            self.by_facility = {}
+            for shelter in shelters:
+                self._add(shelter)
+
+    def _add(self, shelter):
+        entry = {
+            "capacity": shelter["capacity"],
+            "available": shelter["available"],
+            "city": shelter_city(shelter),
+            "facilities": tuple(shelter["facilities"]),
+        }
+        self._shelters[shelter["name"]] = entry
+        self.shelter_count += 1
+        self.total_capacity += entry["capacity"]
+        self.total_available += entry["available"]
+        for bucket in self._buckets(entry):
+            bucket["shelters"] += 1
+            bucket["capacity"] += entry["capacity"]
+            bucket["available"] += entry["available"]
+
+    def _buckets(self, entry):
+        empty = {"shelters": 0, "capacity": 0, "available": 0}
+        yield self.by_city.setdefault(entry["city"], dict(empty))
+        for facility in entry["facilities"]:
+            yield self.by_facility.setdefault(facility, dict(empty))
+
+    def _entry(self, name):
+        entry = self._shelters.get(name)
+        if entry is None:
+            raise ValueError(f"Unknown shelter: {name}")
+        return entry
+
+    def available(self, name, default=None):
+        """Current free spaces at a shelter, or ``default`` if it isn't tracked"""
+        entry = self._shelters.get(name)
+        return entry["available"] if entry is not None else default
+
+    def snapshot(self, names):
+        """Free spaces of the named (tracked) shelters, read as one consistent snapshot"""
+        with self.lock:
+            return {name: self._shelters[name]["available"] for name in names if name in self._shelters}
+
+    def set_available(self, name, available):
+        """Set a shelter's free spaces; returns the new value"""
+        with self.lock:
+            entry = self._entry(name)
+            if not 0 <= available <= entry["capacity"]:
+                raise ValueError(f"{name}: available must be between 0 and {entry['capacity']}")
+            delta = available - entry["available"]
+            if delta:
+                if self._persist is not None:
+                    self._persist(name, available)
+                entry["available"] = available
+                self.total_available += delta
+                for bucket in self._buckets(entry):
+                    bucket["available"] += delta
+            return available
+
+    def check_in(self, name, people=1):
+        """Record people arriving; returns the remaining free spaces"""
+        _check_people(people)
+        with self.lock:
+            entry = self._entry(name)
+            if people > entry["available"]:
+                raise ValueError(f"{name}: only {entry['available']} spaces available")
+            return self.set_available(name, entry["available"] - people)
+
+    def check_out(self, name, people=1):
+        """Record people leaving; returns the remaining free spaces"""
+        _check_people(people)
+        with self.lock:
+            entry = self._entry(name)
+            if entry["available"] + people > entry["capacity"]:
+                raise ValueError(f"{name}: only {entry['capacity'] - entry['available']} people checked in")
+            return self.set_available(name, entry["available"] + people)
+
+    def totals(self):
+        """(shelter count, total capacity, available spaces) as one consistent read"""
+        with self.lock:
+            return self.shelter_count, self.total_capacity, self.total_available
+
+    def breakdown(self):
+        """Per-city and per-facility capacity / availability / occupancy rate"""
+        def rows(buckets):
+            return {
+                key: dict(bucket, occupancy_rate=round((bucket["capacity"] - bucket["available"]) / bucket["capacity"] * 100, 1)
+                          if bucket["capacity"] else 0.0)
+                for key, bucket in buckets.items()
+            }
+        with self.lock:
+            return {"by_city": rows(self.by_city), "by_facility": rows(self.by_facility)}
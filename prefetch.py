@@ -0,0 +1,67 @@
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class WeatherPrefetcher:
+    """Background scheduler that keeps the weather cache warm for known cities.
+
+    Every ``interval`` seconds (plus up to ``jitter`` seconds of random delay,
+    so replicas don't hit OpenWeather in lockstep) it refreshes every city
+    returned by ``backend.known_cities()`` on a pool of ``max_workers``
+    threads. The first round runs as soon as the scheduler starts.
+    """
+
+    def __init__(self, backend, interval=480, jitter=30, max_workers=4):
+        self.backend = backend
+        self.interval = interval
+        self.jitter = jitter
+        self.max_workers = max_workers
+        self.rounds = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="weather-prefetch")
+        self._thread = threading.Thread(target=self._run, name="weather-prefetch", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """Stop scheduling and wait for the in-progress round to finish"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def run_once(self):
+        """Refresh every known city once; returns the number refreshed successfully"""
+        cities = self.backend.known_cities()
+        if self._executor is None:
+            results = [self.backend.refresh_weather(city) for city in cities]
+        else:
+            results = list(self._executor.map(self.backend.refresh_weather, cities))
+        self.rounds += 1
+        return sum(1 for weather in results if weather["success"])
+
+    def _run(self):
+        delay = 0
+        while not self._stop.wait(delay):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Weather prefetch error")
+            delay = self.interval + random.uniform(0, self.jitter)
@@ -0,0 +1,127 @@
+import math
+import re
+from array import array
+from collections import Counter, defaultdict
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a about after am an and any are as at be been before being by can could do does during for from get got had has "
+    "have how i if in into is it its me my near nearest of on or our should so some someone something that the "
+    "their them then there they this to was we were what when where which who will with would you your".split()
+)
+
+
+# English suffixes folded by _stem, longest first; each leaves a stem of at least MIN_STEM letters
+SUFFIXES = ("ications", "ication", "ations", "ation", "ings", "ing", "ies", "ied", "ers", "ed", "er", "es", "s", "y", "e")
+MIN_STEM = 3
+
+
+def _stem(token):
+    """Strip one English suffix so "injured", "injuries" and "injury" share a term; Urdu script and numbers pass through"""
+    if not (token.isascii() and token.isalpha()):
+        return token
+    for suffix in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM:
+            if suffix == "s" and token.endswith("ss"):
+                return token  # "address", "loss"
+            stem = token[:-len(suffix)]
+            # "stopped" / "stop", "running" / "run"
+            if len(stem) > MIN_STEM and stem[-1] == stem[-2] and stem[-1] not in "aeioulsz":
+                stem = stem[:-1]
+            return stem
+    return token
+
+
+def tokenize(text):
+    return [_stem(token) for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class SearchIndex:
+    """In-memory TF-IDF index ranking documents by cosine similarity.
+
+    Built once from (text, group, weight) triples. Postings are stored
+    CSR-style: one array of document ids and one of weights (sublinear tf
+    x idf, L2-normalised per document), sliced per term. A query is
+    therefore a scatter-add over its terms' postings and a partial sort,
+    however large the vocabulary. ``weight`` scales a document's score
+    (e.g. per record kind); ``group`` (e.g. a city) lets a query favour
+    the matching documents that share it.
+    """
+
+    def __init__(self, documents):
+        # Per token only a regex match and a dict lookup; stopwords and stemming are applied per distinct word
+        words = defaultdict()
+        words.default_factory = words.__len__  # Unseen words get the next id
+        word_column, lengths = array("i"), array("i")
+        groups = {}
+        priors = array("f")
+        size = 0
+        for doc, (text, group, weight) in enumerate(documents):
+            size += 1
+            priors.append(weight)
+            tokens = TOKEN_PATTERN.findall(text.lower())
+            word_column.extend(map(words.__getitem__, tokens))
+            lengths.append(len(tokens))
+            if group:
+                groups.setdefault(group, array("i")).append(doc)
+        vocabulary = {}
+        word_terms = np.array([-1 if word in STOPWORDS else vocabulary.setdefault(_stem(word), len(vocabulary))
+                               for word in words], dtype=np.int64)
+        token_terms = word_terms[np.frombuffer(word_column, dtype=np.int32)]
+        token_docs = np.repeat(np.arange(size, dtype=np.int64), np.frombuffer(lengths, dtype=np.int32))
+        kept = token_terms >= 0
+
+        # Term frequencies by counting (doc, term) pairs; np.unique leaves them ordered by doc, then term
+        pairs, tf = np.unique(token_docs[kept] * max(1, len(vocabulary)) + token_terms[kept], return_counts=True)
+        docs, terms = np.divmod(pairs, max(1, len(vocabulary)))
+        order = np.argsort(terms, kind="stable")
+        terms = terms[order]
+        self.docs = docs[order].astype(np.int32)
+        frequencies = np.bincount(terms, minlength=len(vocabulary))
+        self.idf = (np.log((1 + size) / (1 + frequencies)) + 1).astype(np.float32)
+        weights = (1 + np.log(tf[order].astype(np.float32))) * self.idf[terms]
+        norms = np.sqrt(np.bincount(self.docs, weights * weights, minlength=size)).astype(np.float32)
+        self.weights = weights / norms[self.docs]
+        self.offsets = np.concatenate(([0], np.cumsum(frequencies)))
+        self.vocabulary = vocabulary
+        self.groups = {group: np.frombuffer(ids, dtype=np.int32) for group, ids in groups.items()}
+        self.priors = np.frombuffer(priors, dtype=np.float32)
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def search(self, text, k=5, group=None, boost=0.05):
+        """Up to ``k`` (document, score) pairs sharing a term with ``text``, best first.
+
+        The score is the cosine similarity (0-1) times the document's
+        weight. Matching documents in ``group`` get ``boost`` added, enough
+        to win near-ties without outranking a clearly better match.
+        """
+        terms = Counter(tokenize(text))
+        query = {self.vocabulary[term]: count for term, count in terms.items() if term in self.vocabulary}
+        if not query or not k:
+            return []
+        query_weights = {term: self.idf[term] * (1 + math.log(count)) for term, count in query.items()}
+        # Words the index has never seen count as rarest, so a question matched on one incidental word scores low
+        unseen_idf = math.log(1 + self.size) + 1
+        query_norm = math.sqrt(sum(weight * weight for weight in query_weights.values())
+                               + sum((unseen_idf * (1 + math.log(count))) ** 2
+                                     for term, count in terms.items() if term not in self.vocabulary))
+        docs, weights = [], []
+        for term, weight in query_weights.items():
+            start, end = self.offsets[term], self.offsets[term + 1]
+            docs.append(self.docs[start:end])
+            weights.append(self.weights[start:end] * (weight / query_norm))
+        scores = np.bincount(np.concatenate(docs), np.concatenate(weights), minlength=self.size) * self.priors
+        if group in self.groups:
+            local = self.groups[group]
+            scores[local] += boost * (scores[local] > 0)
+        if k < self.size:
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(self.size)
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(doc), float(scores[doc])) for doc in candidates if scores[doc] > 0]
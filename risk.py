@@ -0,0 +1,99 @@
+import numpy as np
+
+# Bitmask flags for the contributing risk factors, in the order they are reported
+VERY_HIGH_HUMIDITY = 1
+HIGH_HUMIDITY = 2
+ACTIVE_RAINFALL = 4
+LOW_PRESSURE = 8
+POOR_VISIBILITY = 16
+
+FACTOR_LABELS = (
+    (VERY_HIGH_HUMIDITY, "Very high humidity"),
+    (HIGH_HUMIDITY, "High humidity"),
+    (ACTIVE_RAINFALL, "Active rainfall"),
+    (LOW_PRESSURE, "Low atmospheric pressure"),
+    (POOR_VISIBILITY, "Poor visibility"),
+)
+
+# Level codes returned by the batch engine index into these tuples
+LEVELS = ("Low", "Moderate", "High", "Critical")
+LEVEL_COLORS = ("green", "yellow", "orange", "red")
+
+# Thresholds and score weights shared by the scalar and batch scorers
+VERY_HIGH_HUMIDITY_ABOVE = 85
+HIGH_HUMIDITY_ABOVE = 75
+LOW_PRESSURE_BELOW = 1000
+POOR_VISIBILITY_BELOW = 5
+WEIGHTS = {VERY_HIGH_HUMIDITY: 30, HIGH_HUMIDITY: 20, ACTIVE_RAINFALL: 40, LOW_PRESSURE: 20, POOR_VISIBILITY: 10}
+# Minimum score for Moderate, High and Critical
+LEVEL_THRESHOLDS = (20, 40, 70)
+# Score of every factor bitmask, so the scalar scorer is one lookup
+_SCORES = tuple(sum(weight for bit, weight in WEIGHTS.items() if mask & bit) for mask in range(32))
+
+
+def is_raining(description, main):
+    """Rain flag as used by the scorer: rain in the description or main == 'Rain'"""
+    return "rain" in description.lower() or main == "Rain"
+
+
+def assess_flood_risk_batch(humidity, pressure, visibility, rain):
+    """Score flood risk for many locations / forecast steps at once.
+
+    Inputs are array-likes of the same (broadcastable) shape: humidity in %,
+    pressure in hPa, visibility in km and a boolean rain flag. Returns a dict
+    of NumPy arrays: ``score`` (0-100), ``level`` (index into LEVELS) and
+    ``factors`` (bitmask of the *_HUMIDITY / ACTIVE_RAINFALL / ... flags).
+    """
+    humidity = np.asarray(humidity)
+    very_high = humidity > VERY_HIGH_HUMIDITY_ABOVE
+    high = ~very_high & (humidity > HIGH_HUMIDITY_ABOVE)
+    rain = np.asarray(rain, dtype=bool)
+    low_pressure = np.asarray(pressure) < LOW_PRESSURE_BELOW
+    poor_visibility = np.asarray(visibility) < POOR_VISIBILITY_BELOW
+
+    score = (WEIGHTS[VERY_HIGH_HUMIDITY] * very_high.astype(np.int16) + WEIGHTS[HIGH_HUMIDITY] * high
+             + WEIGHTS[ACTIVE_RAINFALL] * rain + WEIGHTS[LOW_PRESSURE] * low_pressure
+             + WEIGHTS[POOR_VISIBILITY] * poor_visibility)
+    factors = (VERY_HIGH_HUMIDITY * very_high.astype(np.uint8) | HIGH_HUMIDITY * high
+               | ACTIVE_RAINFALL * rain | LOW_PRESSURE * low_pressure
+               | POOR_VISIBILITY * poor_visibility).astype(np.uint8)
+    moderate, high_level, critical = LEVEL_THRESHOLDS
+    level = ((score >= moderate).astype(np.int8) + (score >= high_level) + (score >= critical)).astype(np.int8)
+    return {"score": score, "level": level, "factors": factors}
+
+
+def assess_flood_risk_one(humidity, pressure, visibility, rain):
+    """Scalar assess_flood_risk_batch for one location: (score, level, factors) as ints.
+
+    Same thresholds and weights, without NumPy's per-call overhead; the
+    single-dict path runs several times per chat.
+    """
+    if humidity > VERY_HIGH_HUMIDITY_ABOVE:
+        factors = VERY_HIGH_HUMIDITY
+    elif humidity > HIGH_HUMIDITY_ABOVE:
+        factors = HIGH_HUMIDITY
+    else:
+        factors = 0
+    if rain:
+        factors |= ACTIVE_RAINFALL
+    if pressure < LOW_PRESSURE_BELOW:
+        factors |= LOW_PRESSURE
+    if visibility < POOR_VISIBILITY_BELOW:
+        factors |= POOR_VISIBILITY
+    score = _SCORES[factors]
+    level = 0
+    for threshold in LEVEL_THRESHOLDS:
+        if score >= threshold:
+            level += 1
+    return score, level, factors
+
+
+def factor_labels(mask):
+    """Human-readable factor list for one bitmask"""
+    return [label for bit, label in FACTOR_LABELS if mask & bit]
+
+
+def risk_dict(score, level, factors):
+    """Single-location risk dict in the shape assess_flood_risk returns"""
+    level = int(level)
+    return {"level": LEVELS[level], "score": int(score), "factors": factor_labels(int(factors)), "color": LEVEL_COLORS[level]}
@@ -0,0 +1,202 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from email.utils import parsedate_to_datetime
+
+from metrics import REGISTRY
+
+# Priority names by rank; lower ranks are served first
+PRIORITIES = ("urgent", "high", "normal", "low")
+
+QUEUE_WAIT = REGISTRY.histogram("floodaid_gemini_queue_wait_seconds", "Wait for Gemini quota before a granted call, per priority",
+                                ("priority",), buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+SCHEDULED = REGISTRY.counter("floodaid_gemini_scheduled_total",
+                             "Gemini calls by priority and outcome (granted / rejected: wait estimate over the deadline / "
+                             "expired: deadline passed in the queue)", ("priority", "result"))
+QUEUED = REGISTRY.gauge("floodaid_gemini_queued", "Gemini calls waiting for quota, per priority", ("priority",))
+RATE_LIMITED = REGISTRY.counter("floodaid_gemini_rate_limited_total", "Gemini 429 responses that paused outbound calls")
+
+
+def retry_after_seconds(value, default):
+    """Seconds to wait from a Retry-After header (delay-seconds or HTTP date), else ``default``"""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+class TokenBucket:
+    """Refills at ``rate`` tokens per second up to ``capacity``; may go negative when a call overdraws it"""
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount, now):
+        """Seconds until ``amount`` tokens will have accumulated"""
+        self._refill(now)
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.tokens -= amount
+
+
+class _Waiter:
+    __slots__ = ("priority", "tokens", "deadline", "enqueued", "future")
+
+    def __init__(self, priority, tokens, deadline, enqueued):
+        self.priority = priority
+        self.tokens = tokens
+        self.deadline = deadline
+        self.enqueued = enqueued
+        self.future = Future()
+
+
+class QuotaScheduler:
+    """Admits outbound calls within a requests-per-minute and tokens-per-minute quota, most urgent first.
+
+    ``submit`` returns a Future that resolves to True when the call may go
+    ahead (its quota is taken) or False when it should fall back: at
+    submit, if the quota already queued ahead of it means it cannot start
+    within ``timeout``; later, if the timeout passes while it waits. A
+    background thread grants waiters in (priority, arrival) order as the
+    buckets refill. ``pause`` holds every call back, e.g. for a 429's
+    Retry-After. ``rpm`` / ``tpm`` of 0 leave that dimension unlimited.
+    ``clock`` (seconds, monotonic) is injectable for tests.
+    """
+
+    def __init__(self, rpm=0, tpm=0, burst_seconds=10, clock=time.monotonic):
+        self.clock = clock
+        now = clock()
+        # Buckets hold burst_seconds of quota, so a quiet spell doesn't bank a whole minute at once
+        self.request_bucket = TokenBucket(rpm / 60, max(1.0, rpm / 60 * burst_seconds), now) if rpm else None
+        self.token_bucket = TokenBucket(tpm / 60, max(1.0, tpm / 60 * burst_seconds), now) if tpm else None
+        self.paused_until = 0.0
+        self._queue = []  # heap of (priority, sequence, waiter)
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+
+    def _delay(self, requests, tokens, now):
+        """Seconds until both buckets hold ``requests`` requests and ``tokens`` tokens"""
+        delay = max(0.0, self.paused_until - now)
+        if self.request_bucket is not None:
+            delay = max(delay, self.request_bucket.delay(requests, now))
+        if self.token_bucket is not None:
+            delay = max(delay, self.token_bucket.delay(tokens, now))
+        return delay
+
+    def submit(self, tokens=0, priority=2, timeout=None):
+        """Future resolving to True once a call of ~``tokens`` tokens may start, or False to fall back"""
+        now = self.clock()
+        if self.token_bucket is not None:
+            tokens = min(tokens, self.token_bucket.capacity)  # Larger calls could never fit the bucket
+        waiter = _Waiter(priority, tokens, None if timeout is None else now + timeout, now)
+        with self._cond:
+            ahead = [queued for _, _, queued in self._queue if queued.priority <= priority]
+            wait = self._delay(len(ahead) + 1, sum(queued.tokens for queued in ahead) + tokens, now)
+            if self._closed or (timeout is not None and wait > timeout):
+                self._resolve(waiter, "rejected", now)
+            elif not self._queue and wait == 0:
+                self._resolve(waiter, "granted", now)
+            else:
+                heapq.heappush(self._queue, (priority, next(self._sequence), waiter))
+                QUEUED.inc(priority=PRIORITIES[priority])
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="gemini-scheduler", daemon=True)
+                    self._thread.start()
+                self._cond.notify()
+        return waiter.future
+
+    def pause(self, seconds):
+        """Hold every call back for ``seconds`` (e.g. a 429's Retry-After)"""
+        RATE_LIMITED.inc()
+        with self._cond:
+            self.paused_until = max(self.paused_until, self.clock() + seconds)
+            self._cond.notify()
+
+    def _resolve(self, waiter, result, now):
+        """Settle a waiter's future; called with the lock held"""
+        if not waiter.future.set_running_or_notify_cancel():
+            return  # The caller gave up (e.g. its asyncio task was cancelled); it takes no quota
+        priority = PRIORITIES[waiter.priority]
+        SCHEDULED.inc(priority=priority, result=result)
+        if result == "granted":
+            if self.request_bucket is not None:
+                self.request_bucket.take(1, now)
+            if self.token_bucket is not None:
+                self.token_bucket.take(waiter.tokens, now)
+            QUEUE_WAIT.observe(now - waiter.enqueued, priority=priority)
+        waiter.future.set_result(result == "granted")
+
+    def _expire(self, now):
+        """Drop waiters past their deadline or cancelled; returns the next deadline still pending"""
+        kept = []
+        next_deadline = None
+        for entry in self._queue:
+            waiter = entry[2]
+            if waiter.future.cancelled() or (waiter.deadline is not None and waiter.deadline <= now):
+                QUEUED.dec(priority=PRIORITIES[waiter.priority])
+                self._resolve(waiter, "expired", now)
+                continue
+            kept.append(entry)
+            if waiter.deadline is not None and (next_deadline is None or waiter.deadline < next_deadline):
+                next_deadline = waiter.deadline
+        if len(kept) != len(self._queue):
+            heapq.heapify(kept)
+            self._queue = kept
+        return next_deadline
+
+    def _run(self):
+        with self._cond:
+            while not self._closed:
+                now = self.clock()
+                next_deadline = self._expire(now)
+                if not self._queue:
+                    self._cond.wait()
+                    continue
+                waiter = self._queue[0][2]
+                delay = self._delay(1, waiter.tokens, now)
+                if delay > 0:
+                    if next_deadline is not None:
+                        delay = min(delay, next_deadline - now)
+                    self._cond.wait(delay)
+                    continue
+                heapq.heappop(self._queue)
+                QUEUED.dec(priority=PRIORITIES[waiter.priority])
+                self._resolve(waiter, "granted", now)
+
+    def stats(self):
+        """Calls waiting per priority and seconds left of any Retry-After pause"""
+        with self._cond:
+            queued = {name: 0 for name in PRIORITIES}
+            for _, _, waiter in self._queue:
+                queued[PRIORITIES[waiter.priority]] += 1
+            return {"queued": queued, "paused_for": round(max(0.0, self.paused_until - self.clock()), 3)}
+
+    def close(self):
+        """Stop granting; waiting calls resolve to False"""
+        with self._cond:
+            self._closed = True
+            now = self.clock()
+            for _, _, waiter in self._queue:
+                QUEUED.dec(priority=PRIORITIES[waiter.priority])
+                self._resolve(waiter, "expired", now)
+            self._queue = []
+            self._cond.notify_all()
@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+from history import truncate_to_bytes
+
+
+class Session:
+    """Pre-converted (user, assistant) turns for one browser session"""
+
+    __slots__ = ("turns", "bytes", "last_seen")
+
+    def __init__(self, max_turns):
+        self.turns = deque(maxlen=max_turns)
+        self.bytes = 0
+        self.last_seen = time.monotonic()
+
+
+def _turn_bytes(turn):
+    return len(turn[0].encode("utf-8")) + len(turn[1].encode("utf-8"))
+
+
+class SessionStore:
+    """Server-side chat history keyed by Gradio session hash.
+
+    Each session keeps at most ``max_turns`` turns and ``max_bytes`` of
+    text, dropping its oldest turns first, so adding a message is one
+    append however long the conversation has run. Sessions idle for
+    ``idle_ttl`` seconds are evicted lazily on access, and the least
+    recently used ones go first once there are ``max_sessions``.
+    """
+
+    def __init__(self, max_turns=16, max_bytes=32 * 1024, idle_ttl=3600, max_sessions=10000):
+        self.max_turns = max_turns
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # session id -> Session, least recently used first
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _evict(self, now, room=0):
+        """Drop idle sessions, then least recently used ones until ``room`` more fit"""
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_seen < self.idle_ttl and len(self._sessions) + room <= self.max_sessions:
+                break
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+    def _touch(self, session_id, create):
+        now = time.monotonic()
+        self._evict(now)
+        session = self._sessions.get(session_id)
+        if session is None:
+            if not create:
+                return None
+            self._evict(now, room=1)
+            session = self._sessions[session_id] = Session(self.max_turns)
+        session.last_seen = now
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def history(self, session_id):
+        """The session's turns, oldest first (empty for unknown or evicted sessions)"""
+        with self._lock:
+            session = self._touch(session_id, create=False)
+            return list(session.turns) if session is not None else []
+
+    def append(self, session_id, user, assistant):
+        """Record one exchange, dropping the oldest turns past the turn or byte cap"""
+        turn = (user, assistant)
+        size = _turn_bytes(turn)
+        if size > self.max_bytes:
+            # A single huge paste still fits: cut by encoded bytes (Urdu takes 2 per character), each side keeping
+            # at least half the cap
+            user = truncate_to_bytes(user, max(self.max_bytes // 2, self.max_bytes - len(assistant.encode("utf-8"))))
+            assistant = truncate_to_bytes(assistant, self.max_bytes - len(user.encode("utf-8")))
+            turn = (user, assistant)
+            size = _turn_bytes(turn)
+        with self._lock:
+            session = self._touch(session_id, create=True)
+            if len(session.turns) == session.turns.maxlen:
+                session.bytes -= _turn_bytes(session.turns[0])  # deque(maxlen) drops it silently on append
+            session.turns.append(turn)
+            session.bytes += size
+            while session.bytes > self.max_bytes:
+                session.bytes -= _turn_bytes(session.turns.popleft())
+
+    def reset(self, session_id):
+        """Forget a session's history (Clear Chat)"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": sum(session.bytes for session in self._sessions.values()),
+                "evictions": self.evictions,
+            }
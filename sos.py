@@ -0,0 +1,410 @@
+import contextlib
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from datetime import datetime, timezone
+
+from metrics import REGISTRY
+from transport import backoff_delay
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory lock, so one process per log
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SOS_ENQUEUE = REGISTRY.histogram("floodaid_sos_enqueue_seconds", "SOS submit to durable (fsynced) acknowledgement",
+                                 buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1))
+SOS_FSYNC_BATCH = REGISTRY.histogram("floodaid_sos_fsync_batch_records", "SOS log records written per fsync",
+                                     buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000))
+SOS_DELIVERY = REGISTRY.histogram("floodaid_sos_delivery_seconds", "SOS submit to delivery, per sink", ("sink",))
+SOS_DISPATCHED = REGISTRY.counter("floodaid_sos_dispatched_total", "SOS alerts sent to sinks by result (ok / error)",
+                                  ("sink", "result"))
+SOS_PENDING = REGISTRY.gauge("floodaid_sos_pending", "SOS alerts awaiting delivery per sink", ("sink",))
+
+SMS_LENGTH = 160
+
+
+def sms_text(alert):
+    """One-segment SMS summary of an alert"""
+    stamp = datetime.fromtimestamp(alert["ts"], timezone.utc).strftime("%H:%M UTC")
+    text = (f"SOS #{alert['id']} {alert['city']}: {alert.get('situation') or 'Emergency assistance required'}"
+            f" - {alert.get('name') or 'Anonymous'} {stamp}")
+    return text if len(text) <= SMS_LENGTH else text[:SMS_LENGTH - 1] + "…"
+
+
+class LogSink:
+    """Writes each alert to the application log; the default when no sink is configured"""
+
+    name = "log"
+
+    def send(self, alerts):
+        for alert in alerts:
+            logger.warning("%s", sms_text(alert))
+
+
+class WebhookSink:
+    """POSTs each batch as {"alerts": [...]} JSON; any non-2xx response fails the batch"""
+
+    name = "webhook"
+
+    def __init__(self, url, transport, timeout=10):
+        self.url = url
+        self.transport = transport
+        self.timeout = timeout
+
+    def send(self, alerts):
+        self.transport.post(self.url, json={"alerts": alerts}, timeout=self.timeout).raise_for_status()
+
+
+class SMSSink:
+    """Texts every alert to each recipient through an SMS gateway's bulk endpoint.
+
+    One POST per batch: {"messages": [{"to": number, "body": text}, ...]}.
+    """
+
+    name = "sms"
+
+    def __init__(self, url, recipients, transport, timeout=10):
+        self.url = url
+        self.recipients = list(recipients)
+        self.transport = transport
+        self.timeout = timeout
+
+    def send(self, alerts):
+        messages = [{"to": to, "body": sms_text(alert), "ref": alert["id"]}
+                    for alert in alerts for to in self.recipients]
+        if messages:
+            self.transport.post(self.url, json={"messages": messages}, timeout=self.timeout).raise_for_status()
+
+
+class SOSLog:
+    """Append-only JSON-lines log with group commit.
+
+    append() hands the record to a writer thread and returns a Future that
+    resolves once the record is fsynced. The writer takes everything queued
+    since its last round, so concurrent appends share one write and one
+    fsync: no added latency when idle, larger batches under a surge.
+    ``fsync_interval`` optionally lingers that long for more records first.
+
+    Several worker processes may share one log: each write holds an
+    exclusive lock on the file, and first reads whatever the other
+    processes appended since, so alert ids (assigned by the writer to
+    records logged with ``"id": None``) stay unique across them.
+    """
+
+    def __init__(self, path, fsync_interval=0.0):
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self.next_id = 1
+        self._file = open(path, "ab")
+        with self._locked():
+            self._trim_torn_tail()
+            self._offset = os.fstat(self._file.fileno()).st_size  # How far this process has read
+        self._pending = []  # (record, future)
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="sos-log", daemon=True)
+        self._thread.start()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Hold the log's exclusive lock for one write (blocking while another process writes)"""
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def _catch_up(self):
+        """Take ids other processes assigned since this one last wrote; called with the lock held"""
+        if os.fstat(self._file.fileno()).st_size <= self._offset:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("type") == "alert":
+                    self.next_id = max(self.next_id, record["id"] + 1)
+
+    def _trim_torn_tail(self):
+        """Drop a partial last line left by a crash mid-write, so new records start on a fresh line"""
+        size = os.path.getsize(self.path)
+        if not size:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(max(0, size - 65536))
+            tail = f.read()
+        if not tail.endswith(b"\n"):
+            keep = size - len(tail) + tail.rfind(b"\n") + 1
+            logger.warning("Discarding %d bytes of torn record at the end of %s", size - keep, self.path)
+            self._file.truncate(keep)
+
+    def records(self):
+        """Every record in the log, oldest first"""
+        with open(self.path, "rb") as f:
+            for number, line in enumerate(f, 1):
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    logger.warning("Skipping unreadable record on line %d of %s", number, self.path)
+
+    def append(self, record):
+        """Queue ``record`` for writing; an alert's ``"id": None`` is filled in when it is written"""
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("SOS log is closed")
+            self._pending.append((record, future))
+            self._cond.notify()
+        return future
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+            if self.fsync_interval:
+                time.sleep(self.fsync_interval)
+            with self._cond:
+                batch, self._pending = self._pending, []
+            try:
+                with self._locked():
+                    self._catch_up()
+                    for record, _ in batch:
+                        if record.get("type") == "alert" and record["id"] is None:
+                            record["id"] = self.next_id
+                            self.next_id += 1
+                    self._file.write(b"".join(
+                        (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+                        for record, _ in batch
+                    ))
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                    self._offset = os.fstat(self._file.fileno()).st_size
+            except OSError as e:
+                logger.exception("SOS log write failed")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            SOS_FSYNC_BATCH.observe(len(batch))
+            for _, future in batch:
+                future.set_result(None)
+
+    def close(self):
+        """Write out everything appended so far, then close the file"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self._file.close()
+
+
+class SinkWorker:
+    """Background thread delivering queued alerts to one sink in batches.
+
+    Each batch is whatever is queued, up to ``batch_size``, after waiting at
+    most ``linger`` seconds for a batch to fill. A failed batch is retried
+    with jittered exponential backoff (capped at ``max_backoff``) until it
+    goes through, so one slow or failing sink never holds up the others.
+    """
+
+    def __init__(self, sink, on_delivered, batch_size=100, linger=0.05, backoff=0.5, max_backoff=30):
+        self.sink = sink
+        self.on_delivered = on_delivered
+        self.batch_size = batch_size
+        self.linger = linger
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.delivered = 0
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name=f"sos-{sink.name}", daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self):
+        return len(self._queue)
+
+    def put(self, alerts):
+        with self._cond:
+            self._queue.extend(alerts)
+            self._cond.notify()
+        SOS_PENDING.inc(len(alerts), sink=self.sink.name)
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue and not self._closing:
+                self._cond.wait()
+            if not self._queue:
+                return None
+            if self.linger and not self._closing:
+                self._cond.wait_for(lambda: len(self._queue) >= self.batch_size or self._closing, self.linger)
+            return [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+
+    def _run(self):
+        name = self.sink.name
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            for attempt in itertools.count():
+                try:
+                    self.sink.send(batch)
+                    break
+                except Exception as e:
+                    SOS_DISPATCHED.inc(len(batch), sink=name, result="error")
+                    logger.warning("SOS %s sink failed for %d alerts (attempt %d): %s", name, len(batch), attempt + 1, e)
+                    with self._cond:
+                        # Still undelivered in the log; the next start replays them
+                        if self._cond.wait_for(lambda: self._closing,
+                                               min(self.max_backoff, backoff_delay(self.backoff, attempt))):
+                            return
+            now = time.time()
+            for alert in batch:
+                SOS_DELIVERY.observe(now - alert["ts"], sink=name)
+            SOS_DISPATCHED.inc(len(batch), sink=name, result="ok")
+            SOS_PENDING.dec(len(batch), sink=name)
+            self.delivered += len(batch)
+            self.on_delivered(name, batch)
+
+    def close(self, timeout=5):
+        """Deliver what is already queued (giving up on a failing sink), waiting up to ``timeout`` seconds"""
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+
+class SOSPipeline:
+    """Durable SOS intake with batched fan-out to sinks.
+
+    submit() appends the alert to an append-only log and resolves once it
+    is fsynced, so the user can be acknowledged before any sink is
+    contacted. A worker per sink then delivers alerts in batches; each
+    delivered batch is logged as well, and on start-up anything a sink has
+    not yet taken is replayed. A repeated idempotency key (double click,
+    client retry) returns the original alert instead of logging a second
+    one. Delivery is at least once, so receivers should dedupe on ``id``:
+    worker processes sharing a log each replay its undelivered alerts.
+    """
+
+    def __init__(self, path, sinks, batch_size=100, linger=0.05, fsync_interval=0.0, max_keys=100000):
+        self.log = SOSLog(path, fsync_interval)
+        self.max_keys = max_keys
+        self.submitted = 0
+        self.duplicates = 0
+        self._keys = OrderedDict()  # idempotency key -> Future of the logged alert, oldest first
+        self._lock = threading.Lock()
+        backlog = self._replay(sinks)
+        self.workers = {sink.name: SinkWorker(sink, self._delivered, batch_size, linger) for sink in sinks}
+        for name, worker in self.workers.items():
+            if backlog[name]:
+                logger.info("Replaying %d undelivered SOS alerts to %s", len(backlog[name]), name)
+                worker.put(backlog[name])
+
+    def _replay(self, sinks):
+        """Rebuild ids and idempotency keys from the log; returns undelivered alerts per sink"""
+        alerts = {}
+        delivered = {sink.name: set() for sink in sinks}
+        for record in self.log.records():
+            if record.get("type") == "delivered":
+                delivered.setdefault(record["sink"], set()).update(record["ids"])
+            elif record.get("type") == "alert":
+                alerts[record["id"]] = record
+                if record.get("key") is not None:
+                    self._remember(record["key"], self._resolved(record))
+        self.log.next_id = max(alerts, default=0) + 1
+        return {sink.name: [alert for id, alert in alerts.items() if id not in delivered[sink.name]] for sink in sinks}
+
+    @staticmethod
+    def _resolved(value):
+        future = Future()
+        future.set_result(value)
+        return future
+
+    def _remember(self, key, future):
+        self._keys[key] = future
+        self._keys.move_to_end(key)
+        while len(self._keys) > self.max_keys:
+            self._keys.popitem(last=False)
+
+    def submit(self, alert, key=None):
+        """Log ``alert`` (a JSON-serializable dict) durably and queue it for every sink.
+
+        Returns a Future of (alert record with its ``id`` and ``ts``,
+        duplicate) that resolves once the record is on disk.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            logged = self._keys.get(key) if key is not None else None
+            duplicate = logged is not None
+            if duplicate:
+                self.duplicates += 1
+                self._keys.move_to_end(key)
+            else:
+                record = {"type": "alert", "id": None, "key": key, "ts": round(time.time(), 3), **alert}
+                written = self.log.append(record)
+                logged = Future()
+                if key is not None:
+                    self._remember(key, logged)
+        if not duplicate:
+            written.add_done_callback(lambda written: self._logged(written, record, key, logged, start))
+
+        result = Future()
+
+        def resolve(logged):
+            if logged.exception() is not None:
+                result.set_exception(logged.exception())
+            else:
+                result.set_result((logged.result(), duplicate))
+        logged.add_done_callback(resolve)
+        return result
+
+    def _logged(self, written, record, key, future, start):
+        """Writer-thread callback: acknowledge the submit and fan the alert out"""
+        if written.exception() is not None:
+            with self._lock:
+                if key is not None and self._keys.get(key) is future:
+                    del self._keys[key]  # Let the client's retry try again
+            future.set_exception(written.exception())
+            return
+        SOS_ENQUEUE.observe(time.perf_counter() - start)
+        self.submitted += 1
+        for worker in self.workers.values():
+            worker.put([record])
+        future.set_result(record)
+
+    def _delivered(self, sink, batch):
+        try:
+            self.log.append({"type": "delivered", "sink": sink, "ids": [alert["id"] for alert in batch]})
+        except RuntimeError:
+            pass  # Closing: the alerts are replayed (and deduped by id downstream) on the next start
+
+    def stats(self):
+        return {
+            "submitted": self.submitted,
+            "duplicates": self.duplicates,
+            "pending": {name: worker.pending for name, worker in self.workers.items()},
+            "delivered": {name: worker.delivered for name, worker in self.workers.items()},
+        }
+
+    def close(self, timeout=5):
+        """Drain the sinks for up to ``timeout`` seconds, then flush and close the log"""
+        for worker in self.workers.values():
+            worker.close(timeout)
+        self.log.close()
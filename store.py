@@ -0,0 +1,405 @@
+import csv
+import json
+import math
+import sqlite3
+import threading
+
+from geo import KM_PER_DEGREE, ShelterIndex, haversine_km
+
+COLLECTIONS = ("shelters", "relief_camps", "donation_needs", "medical_tips", "emergency_contacts")
+
+
+def shelter_city(shelter):
+    """City of a shelter: its 'city' field, else the last part of its address"""
+    return shelter.get("city") or shelter["address"].rsplit(",", 1)[-1].strip()
+
+
+def _has_facilities(shelter, facilities):
+    return all(facility in shelter["facilities"] for facility in facilities)
+
+
+class MemoryRepository:
+    """Repository over in-memory lists; the default, seeded from FloodAidBackend.
+
+    The lists are shared with the backend, so existing code that reads
+    ``backend.shelters`` directly sees the same records.
+    """
+
+    def __init__(self, shelters, relief_camps, donation_needs, medical_tips, emergency_contacts):
+        self.shelters = shelters
+        self.relief_camps = relief_camps
+        self.donation_needs = donation_needs
+        self.medical_tips = medical_tips
+        self.emergency_contacts = emergency_contacts
+        self.shelter_index = ShelterIndex(shelters)
+        self._by_name = {s["name"]: s for s in shelters}
+
+    def list_shelters(self, limit=None):
+        return self.shelters[:limit] if limit is not None else list(self.shelters)
+
+    def get_shelter(self, name):
+        return self._by_name.get(name)
+
+    def update_shelter(self, name, **fields):
+        shelter = self._by_name[name]
+        moved = "lat" in fields or "lon" in fields
+        if moved:
+            self.shelter_index.remove(shelter)
+        shelter.update(fields)
+        if moved:
+            self.shelter_index.add(shelter)
+        return shelter
+
+    def shelters_matching(self, text, k=None, facilities=()):
+        """Open shelters whose city or address contains text (no coordinates needed)"""
+        text = text.lower()
+        matches = [s for s in self.shelters
+                   if text in s["address"].lower() and s["available"] > 0 and _has_facilities(s, facilities)]
+        return matches[:k] if k is not None else matches
+
+    def nearest_shelters(self, lat, lon, k=1, facilities=()):
+        return self.shelter_index.nearest(lat, lon, k=k, facilities=facilities)
+
+    def count_shelters_near(self, lat, lon, radius_km):
+        return self.shelter_index.count_within(lat, lon, radius_km)
+
+    def shelter_totals(self):
+        """(shelter count, total capacity, available spaces)"""
+        return (len(self.shelters),
+                sum(s["capacity"] for s in self.shelters),
+                sum(s["available"] for s in self.shelters))
+
+    def shelter_cities(self):
+        return list(dict.fromkeys(shelter_city(s) for s in self.shelters))
+
+    def list_relief_camps(self, city=None):
+        if city is None:
+            return list(self.relief_camps)
+        return [camp for camp in self.relief_camps if camp["city"].lower() == city.lower()]
+
+    def relief_camp_cities(self):
+        return list(dict.fromkeys(camp["city"] for camp in self.relief_camps))
+
+    def count_relief_camps(self):
+        return len(self.relief_camps)
+
+    def list_donation_needs(self):
+        return list(self.donation_needs)
+
+    def list_medical_tips(self):
+        return list(self.medical_tips)
+
+    def list_emergency_contacts(self):
+        """Contacts grouped by category, in insertion order"""
+        return self.emergency_contacts
+
+    def count_emergency_contacts(self):
+        return sum(len(contacts) for contacts in self.emergency_contacts.values())
+
+    def close(self):
+        pass
+
+
+class SQLiteRepository:
+    """SQLite-backed repository (WAL mode) for registries too large to keep in code.
+
+    Each thread gets its own connection so WAL readers never block each
+    other. Queries are fixed SQL strings, so sqlite3's statement cache reuses
+    the prepared statements. Shelter facilities live in a side table indexed
+    by facility for filtered nearest-shelter queries.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS shelters (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        address TEXT NOT NULL,
+        city TEXT NOT NULL COLLATE NOCASE,
+        lat REAL,
+        lon REAL,
+        capacity INTEGER NOT NULL,
+        available INTEGER NOT NULL,
+        facilities TEXT NOT NULL DEFAULT '',
+        phone TEXT NOT NULL DEFAULT ''
+    );
+    CREATE INDEX IF NOT EXISTS idx_shelters_city ON shelters(city);
+    CREATE INDEX IF NOT EXISTS idx_shelters_available ON shelters(available);
+    CREATE INDEX IF NOT EXISTS idx_shelters_lat_lon ON shelters(lat, lon);
+    CREATE TABLE IF NOT EXISTS shelter_facilities (
+        shelter_id INTEGER NOT NULL REFERENCES shelters(id) ON DELETE CASCADE,
+        facility TEXT NOT NULL,
+        PRIMARY KEY (facility, shelter_id)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS relief_camps (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        city TEXT NOT NULL COLLATE NOCASE,
+        supplies TEXT NOT NULL,
+        contact TEXT NOT NULL,
+        open TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_relief_camps_city ON relief_camps(city);
+    CREATE TABLE IF NOT EXISTS donation_needs (
+        id INTEGER PRIMARY KEY,
+        item TEXT NOT NULL,
+        priority TEXT NOT NULL,
+        quantity TEXT NOT NULL,
+        urgency TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS medical_tips (
+        id INTEGER PRIMARY KEY,
+        title TEXT NOT NULL,
+        desc TEXT NOT NULL,
+        priority TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS emergency_contacts (
+        id INTEGER PRIMARY KEY,
+        category TEXT NOT NULL,
+        name TEXT NOT NULL,
+        number TEXT NOT NULL,
+        available TEXT NOT NULL
+    );
+    """
+
+    SHELTER_COLUMNS = "id, name, address, city, lat, lon, capacity, available, facilities, phone"
+    INSERT_SHELTER = ("INSERT INTO shelters (name, address, city, lat, lon, capacity, available, facilities, phone) "
+                      "VALUES (:name, :address, :city, :lat, :lon, :capacity, :available, :facilities, :phone) "
+                      "ON CONFLICT(name) DO UPDATE SET address = excluded.address, city = excluded.city, "
+                      "lat = excluded.lat, lon = excluded.lon, capacity = excluded.capacity, "
+                      "available = excluded.available, facilities = excluded.facilities, phone = excluded.phone")
+    DELETE_FACILITIES = "DELETE FROM shelter_facilities WHERE shelter_id = (SELECT id FROM shelters WHERE name = ?)"
+    INSERT_FACILITY = "INSERT OR IGNORE INTO shelter_facilities (shelter_id, facility) SELECT id, ? FROM shelters WHERE name = ?"
+    INSERT_RELIEF_CAMP = ("INSERT INTO relief_camps (name, city, supplies, contact, open) "
+                          "VALUES (:name, :city, :supplies, :contact, :open)")
+    INSERT_DONATION_NEED = ("INSERT INTO donation_needs (item, priority, quantity, urgency) "
+                            "VALUES (:item, :priority, :quantity, :urgency)")
+    INSERT_MEDICAL_TIP = "INSERT INTO medical_tips (title, desc, priority) VALUES (:title, :desc, :priority)"
+    INSERT_CONTACT = ("INSERT INTO emergency_contacts (category, name, number, available) "
+                      "VALUES (:category, :name, :number, :available)")
+
+    SELECT_SHELTERS = f"SELECT {SHELTER_COLUMNS} FROM shelters ORDER BY id LIMIT ?"
+    SELECT_SHELTER = f"SELECT {SHELTER_COLUMNS} FROM shelters WHERE name = ?"
+    SELECT_SHELTERS_IN_CITY = f"SELECT {SHELTER_COLUMNS} FROM shelters WHERE city = ? AND available > 0"
+    SELECT_SHELTERS_LIKE = (f"SELECT {SHELTER_COLUMNS} FROM shelters WHERE address LIKE ? ESCAPE '\\' "
+                            "AND available > 0")
+    SELECT_SHELTERS_IN_BOX = (f"SELECT {SHELTER_COLUMNS} FROM shelters WHERE lat BETWEEN ? AND ? "
+                              "AND lon BETWEEN ? AND ? AND available > 0")
+    SELECT_SHELTER_TOTALS = "SELECT COUNT(*), COALESCE(SUM(capacity), 0), COALESCE(SUM(available), 0) FROM shelters"
+    SELECT_SHELTER_CITIES = "SELECT city FROM shelters GROUP BY city ORDER BY MIN(id)"
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        # Every open connection, whichever thread opened it, so close() can reach them all
+        self._connections = set()
+        self._connections_lock = threading.Lock()
+        with self._connection() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or conn not in self._connections:  # Not yet opened on this thread, or closed by close()
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            with self._connections_lock:
+                self._connections.add(conn)
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Close the connections of every thread that used the repository"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, set()
+        for conn in connections:
+            conn.close()
+        self._local.conn = None
+
+    def is_empty(self):
+        return self._connection().execute("SELECT NOT EXISTS (SELECT 1 FROM shelters)").fetchone()[0] == 1
+
+    # ---- bulk import ----
+
+    def import_records(self, collection, records):
+        """Insert many records of one collection in a single transaction; returns the count.
+
+        On a running backend import through FloodAidBackend.import_records, which also updates shelter occupancy
+        and the data versions behind memoized prompts and the retrieval index.
+        """
+        conn = self._connection()
+        fresh = self.is_empty()
+        with conn:
+            if collection == "shelters":
+                rows = [self._shelter_row(record) for record in records]
+                conn.executemany(self.INSERT_SHELTER, rows)
+                if not fresh:
+                    conn.executemany(self.DELETE_FACILITIES, ((row["name"],) for row in rows))
+                conn.executemany(self.INSERT_FACILITY, (
+                    (facility, row["name"]) for row in rows for facility in row["facilities"].split("|") if facility
+                ))
+            elif collection == "relief_camps":
+                rows = [dict(record, supplies=json.dumps(self._as_list(record["supplies"]))) for record in records]
+                conn.executemany(self.INSERT_RELIEF_CAMP, rows)
+            elif collection == "donation_needs":
+                rows = list(records)
+                conn.executemany(self.INSERT_DONATION_NEED, rows)
+            elif collection == "medical_tips":
+                rows = list(records)
+                conn.executemany(self.INSERT_MEDICAL_TIP, rows)
+            elif collection == "emergency_contacts":
+                if isinstance(records, dict):
+                    records = [dict(contact, category=category)
+                               for category, contacts in records.items() for contact in contacts]
+                rows = list(records)
+                conn.executemany(self.INSERT_CONTACT, rows)
+            else:
+                raise ValueError(f"Unknown collection: {collection}")
+        return len(rows)
+
+    def import_file(self, collection, path):
+        """Bulk-load a CSV or JSON file (list of objects) into a collection"""
+        with open(path, newline="", encoding="utf-8") as f:
+            if path.lower().endswith(".json"):
+                records = json.load(f)
+            else:
+                records = list(csv.DictReader(f))
+        return self.import_records(collection, records)
+
+    def seed(self, shelters, relief_camps, donation_needs, medical_tips, emergency_contacts):
+        """Load the built-in demo data"""
+        for collection, records in zip(COLLECTIONS, (shelters, relief_camps, donation_needs,
+                                                     medical_tips, emergency_contacts)):
+            self.import_records(collection, records)
+
+    @staticmethod
+    def _as_list(value):
+        if isinstance(value, str):
+            return [item.strip() for item in value.replace(";", "|").split("|") if item.strip()]
+        return list(value)
+
+    @classmethod
+    def _shelter_row(cls, record):
+        lat, lon = record.get("lat"), record.get("lon")
+        return {
+            "name": record["name"],
+            "address": record["address"],
+            "city": shelter_city(record),
+            "lat": float(lat) if lat not in (None, "") else None,
+            "lon": float(lon) if lon not in (None, "") else None,
+            "capacity": int(record["capacity"]),
+            "available": int(record["available"]),
+            "facilities": "|".join(cls._as_list(record.get("facilities", ""))),
+            "phone": record.get("phone", ""),
+        }
+
+    # ---- queries ----
+
+    @staticmethod
+    def _shelter(row):
+        shelter = dict(row)
+        shelter["facilities"] = shelter["facilities"].split("|") if shelter["facilities"] else []
+        return shelter
+
+    def list_shelters(self, limit=None):
+        rows = self._connection().execute(self.SELECT_SHELTERS, (-1 if limit is None else limit,))
+        return [self._shelter(row) for row in rows]
+
+    def get_shelter(self, name):
+        row = self._connection().execute(self.SELECT_SHELTER, (name,)).fetchone()
+        return self._shelter(row) if row else None
+
+    UPDATABLE_FIELDS = ("address", "city", "lat", "lon", "capacity", "available", "phone")
+
+    def update_shelter(self, name, **fields):
+        unknown = set(fields) - set(self.UPDATABLE_FIELDS)
+        if unknown:
+            raise ValueError(f"Cannot update shelter fields: {sorted(unknown)}")
+        conn = self._connection()
+        with conn:
+            for field, value in fields.items():
+                # One fixed statement per column keeps them in the statement cache
+                conn.execute(f"UPDATE shelters SET {field} = ? WHERE name = ?", (value, name))
+        return self.get_shelter(name)
+
+    def shelters_matching(self, text, k=None, facilities=()):
+        conn = self._connection()
+        suffix = self.FACILITY_FILTER * len(facilities) + " ORDER BY id LIMIT ?"
+        limit = -1 if k is None else k
+        rows = conn.execute(self.SELECT_SHELTERS_IN_CITY + suffix, (text.strip(), *facilities, limit)).fetchall()
+        if not rows:
+            pattern = "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            rows = conn.execute(self.SELECT_SHELTERS_LIKE + suffix, (pattern, *facilities, limit)).fetchall()
+        return [self._shelter(row) for row in rows]
+
+    # Each required facility adds one correlated primary-key probe into shelter_facilities
+    FACILITY_FILTER = (" AND EXISTS (SELECT 1 FROM shelter_facilities "
+                       "WHERE facility = ? AND shelter_id = shelters.id)")
+
+    def _shelters_in_box(self, lat, lon, half_km, facilities=()):
+        dlat = half_km / KM_PER_DEGREE
+        dlon = half_km / (KM_PER_DEGREE * max(0.01, math.cos(math.radians(min(89.9, abs(lat) + dlat)))))
+        sql = self.SELECT_SHELTERS_IN_BOX + self.FACILITY_FILTER * len(facilities)
+        rows = self._connection().execute(sql, (lat - dlat, lat + dlat, lon - dlon, lon + dlon, *facilities))
+        return map(self._shelter, rows)
+
+    def nearest_shelters(self, lat, lon, k=1, facilities=(), max_km=2000):
+        """k nearest open shelters: bounding-box index scans, doubling the box until k are found"""
+        half_km = 10.0
+        while True:
+            candidates = sorted(
+                ((haversine_km(lat, lon, s["lat"], s["lon"]), s)
+                 for s in self._shelters_in_box(lat, lon, half_km, facilities)),
+                key=lambda item: item[0]
+            )
+            # Only results inside the inscribed circle are guaranteed to be the true nearest
+            within = [item for item in candidates if item[0] <= half_km]
+            if len(within) >= k or half_km >= max_km:
+                return within[:k]
+            half_km *= 2
+
+    def count_shelters_near(self, lat, lon, radius_km):
+        return sum(1 for s in self._shelters_in_box(lat, lon, radius_km)
+                   if haversine_km(lat, lon, s["lat"], s["lon"]) <= radius_km)
+
+    def shelter_totals(self):
+        return tuple(self._connection().execute(self.SELECT_SHELTER_TOTALS).fetchone())
+
+    def shelter_cities(self):
+        return [row[0] for row in self._connection().execute(self.SELECT_SHELTER_CITIES)]
+
+    def list_relief_camps(self, city=None):
+        conn = self._connection()
+        if city is None:
+            rows = conn.execute("SELECT name, city, supplies, contact, open FROM relief_camps ORDER BY id")
+        else:
+            rows = conn.execute("SELECT name, city, supplies, contact, open FROM relief_camps WHERE city = ? ORDER BY id",
+                                (city,))
+        return [dict(row, supplies=json.loads(row["supplies"])) for row in rows]
+
+    def relief_camp_cities(self):
+        return [row[0] for row in self._connection().execute(
+            "SELECT city FROM relief_camps GROUP BY city ORDER BY MIN(id)")]
+
+    def count_relief_camps(self):
+        return self._connection().execute("SELECT COUNT(*) FROM relief_camps").fetchone()[0]
+
+    def list_donation_needs(self):
+        rows = self._connection().execute("SELECT item, priority, quantity, urgency FROM donation_needs ORDER BY id")
+        return [dict(row) for row in rows]
+
+    def list_medical_tips(self):
+        rows = self._connection().execute("SELECT title, desc, priority FROM medical_tips ORDER BY id")
+        return [dict(row) for row in rows]
+
+    def list_emergency_contacts(self):
+        contacts = {}
+        rows = self._connection().execute("SELECT category, name, number, available FROM emergency_contacts ORDER BY id")
+        for row in rows:
+            contacts.setdefault(row["category"], []).append(
+                {"name": row["name"], "number": row["number"], "available": row["available"]})
+        return contacts
+
+    def count_emergency_contacts(self):
+        return self._connection().execute("SELECT COUNT(*) FROM emergency_contacts").fetchone()[0]
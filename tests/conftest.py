@@ -0,0 +1,18 @@
+import pytest
+
+from benchmarks.stub_servers import start_in_thread
+
+
+@pytest.fixture
+def upstreams(monkeypatch, tmp_path):
+    """Stub OpenWeather / Gemini server (benchmarks.stub_servers) that backends built in the test talk to"""
+    server = start_in_thread()
+    monkeypatch.setenv("OPENWEATHER_BASE_URL", server.base_url)
+    monkeypatch.setenv("GEMINI_BASE_URL", server.base_url)
+    monkeypatch.setenv("OPENWEATHER_API_KEY", "stub")
+    monkeypatch.setenv("GOOGLE_API_KEY", "stub")
+    monkeypatch.setenv("SOS_LOG_PATH", str(tmp_path / "sos_alerts.log"))
+    monkeypatch.setenv("GEMINI_HEDGE_MODEL", "")
+    yield server
+    server.shutdown()
+    server.server_close()
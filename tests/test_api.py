@@ -0,0 +1,78 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from api import MAX_BATCH, create_api
+from benchmarks.stub_servers import REPLY
+
+
+@pytest.fixture
+def client(upstreams, monkeypatch):
+    monkeypatch.setenv("WEATHER_PREFETCH", "0")
+    with TestClient(create_api()) as client:
+        yield client
+
+
+def test_weather(client):
+    weather = client.get("/weather", params={"city": "Lahore"}).json()
+    assert weather["live"] and weather["city"] == "Lahore"
+    results = client.post("/weather/batch", json={"cities": ["Karachi", "Multan", "Karachi"]}).json()["results"]
+    assert [weather["city"] for weather in results] == ["Karachi", "Multan", "Karachi"]
+
+
+def test_risk(client):
+    assert client.get("/risk", params={"city": "Quetta"}).json()["level"] in ("Low", "Moderate", "High", "Critical")
+    body = {"cities": ["Lahore"], "observations": [{"humidity": 95, "pressure": 990, "visibility": 2, "raining": True}]}
+    scored = client.post("/risk/batch", json=body).json()
+    assert scored["cities"][0]["city"] == "Lahore"
+    assert scored["observations"][0]["level"] == "Critical"
+
+
+def test_nearest_shelters(client):
+    shelters = client.get("/shelters/nearest", params={"city": "Lahore", "k": 2}).json()["shelters"]
+    assert len(shelters) == 2
+    assert shelters[0]["distance_km"] <= shelters[1]["distance_km"]
+    assert client.get("/shelters/nearest", params={"city": "Lahore", "k": 0}).status_code == 422
+    body = {"queries": [{"city": "Karachi"}, {"city": "Lahore", "k": 3}]}
+    assert [len(result["shelters"]) for result in client.post("/shelters/nearest/batch", json=body).json()["results"]] == [1, 3]
+
+
+def test_statistics(client):
+    statistics = client.get("/statistics").json()
+    assert statistics["active_shelters"] > 0 and statistics["available_spaces"] <= statistics["total_capacity"]
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/weather/batch", {"cities": ["Lahore"] * (MAX_BATCH + 1)}),
+    ("/risk/batch", {"observations": [{"humidity": 50, "pressure": 1010, "visibility": 10}] * (MAX_BATCH + 1)}),
+    ("/shelters/nearest/batch", {"queries": [{"city": "Lahore"}] * (MAX_BATCH + 1)}),
+    ("/sos/batch", {"alerts": [{"city": "Lahore"}] * (MAX_BATCH + 1)}),
+    ("/chat/batch", {"requests": [{"message": "hi"}] * (MAX_BATCH + 1)}),
+    ("/weather/batch", {"cities": []}),
+])
+def test_batch_size_is_capped(client, path, body):
+    assert client.post(path, json=body).status_code == 422
+
+
+def test_sos_idempotency_key_header(client):
+    body = {"city": "Hyderabad", "name": "Ali", "situation": "Water rising"}
+    first = client.post("/sos", json=body, headers={"Idempotency-Key": "abc"}).json()
+    retry = client.post("/sos", json=body, headers={"Idempotency-Key": "abc"}).json()
+    assert (first["duplicate"], retry["duplicate"]) == (False, True)
+    assert retry["alert_id"] == first["alert_id"]
+    other = client.post("/sos", json=body, headers={"Idempotency-Key": "xyz"}).json()
+    assert other["alert_id"] != first["alert_id"] and not other["duplicate"]
+    assert "Hyderabad" in first["message"] and first["weather"]["live"]
+
+
+def test_sos_idempotency_key_field(client):
+    body = {"city": "Sukkur", "idempotency_key": "k1"}
+    first, retry = (client.post("/sos", json=body).json() for _ in range(2))
+    assert retry["alert_id"] == first["alert_id"] and retry["duplicate"]
+    results = client.post("/sos/batch", json={"alerts": [{"city": "Sukkur"}, {"city": "Sukkur"}]}).json()["results"]
+    assert len({result["alert_id"] for result in results}) == 2
+
+
+def test_chat(client):
+    reply = client.post("/chat", json={"message": "How do I stay safe during the flood?", "city": "Karachi"}).json()
+    assert reply == {"city": "Karachi", "reply": REPLY}
+    assert client.post("/chat", json={"message": ""}).status_code == 422
@@ -0,0 +1,38 @@
+import asyncio
+
+from async_backend import AsyncFloodAidBackend
+from benchmarks.stub_servers import REPLY, UpstreamProfile
+from deadlines import request_budget
+
+
+def test_weather_falls_back_past_the_budget_and_the_fetch_fills_the_cache(upstreams, monkeypatch):
+    monkeypatch.setenv("API_CHAT_DEADLINE", "0.1")
+    upstreams.weather = UpstreamProfile(latency="fixed:300")
+
+    async def run():
+        backend = AsyncFloodAidBackend()
+        try:
+            with request_budget("api_chat"):
+                weather = await backend.get_weather("Lahore")
+            assert not weather["success"]
+            await asyncio.sleep(0.5)
+            cached, state = backend.weather_cache.lookup("lahore")
+            assert state == "fresh" and cached["success"]
+        finally:
+            await backend.aclose()
+
+    asyncio.run(run())
+
+
+def test_chat_and_stream(upstreams):
+    async def run():
+        backend = AsyncFloodAidBackend()
+        try:
+            message = "How do I stay safe during the flood?"
+            assert (await backend.chat_with_gemini(message, [], "Lahore")).strip() == REPLY
+            chunks = [chunk async for chunk in backend.stream_chat_with_gemini(message, [("hi", "hello")], "Karachi")]
+            assert "".join(chunks).strip() == REPLY
+        finally:
+            await backend.aclose()
+
+    asyncio.run(run())
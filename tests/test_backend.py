@@ -0,0 +1,151 @@
+import socket
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from backend import FloodAidBackend
+from benchmarks.stub_servers import REPLY, UpstreamProfile
+from cache import TTLCache
+from deadlines import request_budget
+from scheduler import PRIORITIES
+from store import MemoryRepository
+from transport import HttpTransport
+
+
+def test_injected_empty_weather_cache_is_kept():
+    cache = TTLCache(ttl=5)
+    backend = FloodAidBackend(weather_cache=cache)
+    try:
+        assert backend.weather_cache is cache
+    finally:
+        backend.close()
+
+
+def test_injected_transport_and_repository_are_kept():
+    transport = HttpTransport()
+    repository = MemoryRepository([], [], [], [], {})
+    backend = FloodAidBackend(transport=transport, repository=repository)
+    try:
+        assert backend.transport is transport
+        assert backend.repo is repository
+    finally:
+        backend.close()
+
+
+def test_injected_empty_answer_cache_is_kept(monkeypatch):
+    monkeypatch.delenv("CHAT_CACHE_TTL", raising=False)
+    cache = TTLCache(ttl=60)
+    backend = FloodAidBackend(answer_cache=cache)
+    try:
+        assert backend.answer_cache is cache
+    finally:
+        backend.close()
+
+
+def test_nearest_shelters_skip_a_shelter_filled_by_check_in():
+    backend = FloodAidBackend()
+    try:
+        (_, shelter), = backend.find_nearest_shelters("Lahore", k=1)
+        backend.check_in(shelter["name"], shelter["available"])
+        nearest = backend.find_nearest_shelters("Lahore", k=3)
+        assert nearest and all(s["name"] != shelter["name"] and s["available"] > 0 for _, s in nearest)
+    finally:
+        backend.close()
+
+
+def test_summary_waits_for_a_low_priority_quota_slot():
+    class Transport(HttpTransport):
+        def post(self, *args, **kwargs):
+            raise AssertionError("summary sent without a quota slot")
+
+    backend = FloodAidBackend(transport=Transport())
+    submitted = []
+
+    def submit(tokens, priority, timeout=None):
+        submitted.append(priority)
+        future = Future()
+        future.set_result(False)
+        return future
+
+    backend.gemini_scheduler.submit = submit
+    try:
+        assert backend._summarize_turns(None, [("hi", "hello")]) is None
+        assert submitted == [PRIORITIES.index("low")]
+    finally:
+        backend.close()
+
+
+def test_stream_decodes_utf8_without_a_charset(upstreams):
+    backend = FloodAidBackend()
+    try:
+        reply = "".join(backend.stream_chat_with_gemini("How do I stay safe during the flood?", [], "Lahore"))
+        assert reply.strip() == REPLY
+    finally:
+        backend.close()
+
+
+@pytest.fixture
+def hung_weather(monkeypatch):
+    """Backend whose OpenWeather accepts connections (via the backlog) but never answers; fetches give up after 0.3 s"""
+    monkeypatch.setenv("WEATHER_FETCH_DEADLINE", "0.3")
+    with socket.socket() as hung:
+        hung.bind(("127.0.0.1", 0))
+        hung.listen(8)
+        backend = FloodAidBackend(weather_base_url="http://127.0.0.1:%d" % hung.getsockname()[1])
+        yield backend
+        backend.close()
+
+
+def test_weather_fetch_attempts_share_one_cap(hung_weather):
+    start = time.monotonic()
+    with request_budget("chat"):
+        weather = hung_weather.get_weather("Lahore")
+    assert not weather["success"]
+    assert time.monotonic() - start < 1
+
+
+def test_failed_weather_fetch_is_remembered(hung_weather):
+    hung_weather.get_weather("Lahore")
+    start = time.monotonic()
+    assert not hung_weather.get_weather("lahore")["success"]
+    assert time.monotonic() - start < 0.1
+    assert hung_weather.weather_cache.lookup("lahore")[1] == "miss"
+
+
+def test_gemini_429_pauses_every_call(upstreams):
+    upstreams.gemini = UpstreamProfile(rate_limit_rate=1, retry_after=30)
+    backend = FloodAidBackend()
+    try:
+        backend.chat_with_gemini("How do I stay safe during the flood?", [], "Lahore")
+        assert 29 < backend.gemini_scheduler.stats()["paused_for"] <= 30
+        assert backend.gemini_scheduler.submit(timeout=1).result(timeout=0) is False
+    finally:
+        backend.close()
+
+
+def test_imported_shelters_are_tracked_and_served(tmp_path, monkeypatch):
+    monkeypatch.setenv("FLOODAID_DB", str(tmp_path / "floodaid.db"))
+    backend = FloodAidBackend()
+    try:
+        before = backend.get_statistics()["active_shelters"]
+        version = backend.versions["shelters"]
+        backend.retrieve("Ravi Riverside Shelter", "Lahore")  # Builds the index before the import
+        shelter = {"name": "Ravi Riverside Shelter", "address": "Bund Road, Lahore", "capacity": 50, "available": 50,
+                   "facilities": "Food|Water", "lat": 31.60, "lon": 74.30, "phone": "042-1111111"}
+        assert backend.import_records("shelters", [shelter]) == 1
+        assert backend.versions["shelters"] > version
+        assert backend.check_in("Ravi Riverside Shelter", 5) == 45
+        assert backend.get_statistics()["active_shelters"] == before + 1
+        assert backend.repo.get_shelter("Ravi Riverside Shelter")["available"] == 45
+        assert any(record.get("name") == "Ravi Riverside Shelter"
+                   for _, record, _ in backend.retrieve("Ravi Riverside Shelter", "Lahore"))
+
+        path = tmp_path / "shelters.csv"
+        path.write_text("name,address,capacity,available,facilities\n"
+                        "Ravi Riverside Shelter,\"Bund Road, Lahore\",80,80,Food\n", encoding="utf-8")
+        assert backend.import_file("shelters", str(path)) == 1
+        assert backend.get_statistics()["active_shelters"] == before + 1
+        assert backend.occupancy.available("Ravi Riverside Shelter") == 80
+    finally:
+        backend.close()
@@ -0,0 +1,27 @@
+from deadlines import current_budget, request_budget
+
+
+def test_nested_budget_never_extends_its_parent(monkeypatch):
+    monkeypatch.setenv("CHAT_DEADLINE", "1")
+    monkeypatch.setenv("SOS_DEADLINE", "10")
+    with request_budget("chat") as outer:
+        with request_budget("sos") as inner:
+            assert inner.deadline == outer.deadline
+        with request_budget("backend") as unbounded:
+            assert unbounded.deadline == outer.deadline
+        assert current_budget() is outer
+
+
+def test_nested_budget_can_be_shorter(monkeypatch):
+    monkeypatch.setenv("CHAT_DEADLINE", "10")
+    monkeypatch.setenv("WEATHER_FETCH_DEADLINE", "1")
+    with request_budget("chat") as outer:
+        with request_budget("weather_fetch") as inner:
+            assert inner.deadline < outer.deadline
+            assert inner.timeout(5) <= 1
+
+
+def test_no_budget_outside_an_endpoint():
+    budget = current_budget()
+    assert budget.remaining() is None
+    assert budget.timeout(5) == 5
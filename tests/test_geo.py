@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from benchmarks.bench_shelters import make_shelters
+from geo import ShelterIndex, haversine_km, lookup_city
+
+FACILITIES = ["Medical", "Food", "Water"]
+
+
+def brute_force(shelters, lat, lon, k, facilities=()):
+    matches = [(haversine_km(lat, lon, s["lat"], s["lon"]), s) for s in shelters
+               if s["available"] > 0 and all(f in s["facilities"] for f in facilities)]
+    matches.sort(key=lambda item: item[0])
+    return matches[:k]
+
+
+def near_edge(rng, low, high, cell_deg):
+    """A coordinate in [low, high) within a hair of a cell edge"""
+    return (rng.randint(int(low / cell_deg), int(high / cell_deg) - 1) + rng.choice([0.001, 0.999])) * cell_deg
+
+
+@pytest.mark.parametrize("lat_range", [(24.0, 36.5), (55.0, 70.0)])
+@pytest.mark.parametrize("edges", [False, True])
+def test_nearest_matches_brute_force(lat_range, edges):
+    rng = random.Random(0)
+    cell_deg = 0.25
+
+    def point():
+        if edges:
+            return near_edge(rng, *lat_range, cell_deg), near_edge(rng, 61.0, 77.0, cell_deg)
+        return rng.uniform(*lat_range), rng.uniform(61.0, 77.0)
+
+    shelters = [{"name": f"Shelter {i}", **dict(zip(("lat", "lon"), point())),
+                 "available": rng.choice([0, 10]), "facilities": rng.sample(FACILITIES, 2)} for i in range(300)]
+    index = ShelterIndex(shelters, cell_deg=cell_deg)
+    for _ in range(300):
+        lat, lon = point()
+        facilities = rng.choice([(), ("Medical",)])
+        k = rng.choice([1, 3, 10])
+        expected = [round(d, 9) for d, _ in brute_force(shelters, lat, lon, k, facilities)]
+        assert [round(d, 9) for d, _ in index.nearest(lat, lon, k=k, facilities=facilities)] == expected, (lat, lon)
+        radius = rng.choice([10, 50, 200])
+        assert index.count_within(lat, lon, radius) == sum(
+            1 for s in shelters if s["available"] > 0 and haversine_km(lat, lon, s["lat"], s["lon"]) <= radius)
+
+
+def test_nearest_matches_brute_force_at_registry_scale():
+    shelters = make_shelters(10000)
+    index = ShelterIndex(shelters)
+    rng = random.Random(1)
+    for _ in range(200):
+        lat, lon = rng.uniform(24.5, 36.0), rng.uniform(62.0, 76.0)
+        facilities = rng.choice([(), ("Medical",), ("Medical", "Food")])
+        expected = [round(d, 9) for d, _ in brute_force(shelters, lat, lon, 3, facilities)]
+        assert [round(d, 9) for d, _ in index.nearest(lat, lon, k=3, facilities=facilities)] == expected, (lat, lon)
+
+
+def test_removed_shelter_is_not_returned():
+    shelters = [{"name": "a", "lat": 31.5, "lon": 74.3, "available": 5}, {"name": "b", "lat": 31.6, "lon": 74.4, "available": 5}]
+    index = ShelterIndex(shelters)
+    index.remove(shelters[0])
+    assert len(index) == 1
+    assert [s["name"] for _, s in index.nearest(31.5, 74.3, k=2)] == ["b"]
+    assert index.nearest(31.5, 74.3, max_km=1) == []
+
+
+def test_lookup_city():
+    assert lookup_city("  Dera   Ghazi Khan, Pakistan") == (30.0459, 70.6403)
+    assert lookup_city("Atlantis") is None
+    assert haversine_km(*lookup_city("Lahore"), *lookup_city("Lahore")) == 0
+    assert 1000 < haversine_km(*lookup_city("Lahore"), *lookup_city("Karachi")) < 1100
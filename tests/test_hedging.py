@@ -0,0 +1,78 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend import FloodAidBackend
+from deadlines import request_budget
+from hedging import LatencyWindow, hedge_async, hedge_sync
+
+
+def test_hedge_wins_and_the_primary_is_cancelled():
+    cancelled = []
+
+    async def primary():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append("primary")
+            raise
+        return "primary"
+
+    async def hedge():
+        return "hedge"
+
+    async def run():
+        return await hedge_async("test", primary, hedge, 0.01, lambda result: True)
+
+    start = time.monotonic()
+    assert asyncio.run(run()) == "hedge"
+    assert cancelled == ["primary"]
+    assert time.monotonic() - start < 1
+
+
+def test_fast_primary_never_starts_a_hedge():
+    hedged = []
+
+    async def primary():
+        return "primary"
+
+    async def hedge():
+        hedged.append(True)
+        return "hedge"
+
+    assert asyncio.run(hedge_async("test", primary, hedge, 1, lambda result: True)) == "primary"
+    assert not hedged
+
+
+def test_failed_hedge_falls_back_to_the_primary():
+    def primary():
+        time.sleep(0.1)
+        return "primary"
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert hedge_sync("test", primary, lambda: None, 0.01, lambda result: result is not None, executor) == "primary"
+
+
+def test_latency_window_needs_min_samples():
+    window = LatencyWindow(size=10, min_samples=3)
+    for seconds in (0.1, 0.2):
+        window.observe(seconds)
+    assert window.percentile(95) is None
+    window.observe(0.3)
+    assert window.percentile(95) == 0.3
+    assert window.percentile(50) == 0.2
+
+
+def test_no_hedge_before_min_samples(monkeypatch):
+    monkeypatch.setenv("GEMINI_HEDGE_MIN_SAMPLES", "3")
+    monkeypatch.setenv("GEMINI_HEDGE_MODEL", "gemini-lite")
+    backend = FloodAidBackend()
+    try:
+        with request_budget("api_chat") as budget:
+            for _ in range(2):
+                backend.gemini_latency["generate"].observe(0.5)
+            assert backend._hedge_delay("generate", budget) is None
+            backend.gemini_latency["generate"].observe(0.5)
+            assert backend._hedge_delay("generate", budget) == 0.5
+    finally:
+        backend.close()
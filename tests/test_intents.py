@@ -0,0 +1,29 @@
+import pytest
+
+from intents import IntentRouter, message_priority
+
+
+@pytest.fixture(scope="module")
+def router():
+    return IntentRouter()
+
+
+@pytest.mark.parametrize("message", [
+    "Is the shelter safe?", "Is the shelter flooded?", "Is the shelter full?", "My phone is dead",
+    "Call my family", "Rescue me", "Edhi ambulance number, someone is injured",
+])
+def test_near_misses_go_to_the_model(router, message):
+    assert router.classify(message) is None
+
+
+@pytest.mark.parametrize("message, intent", [
+    ("Where is the nearest shelter?", "nearest_shelter"), ("Edhi number", "contact"),
+    ("Rescue 1122 contact", "contact"), ("relief camps in Lahore", "relief_camp"),
+    ("Lahore mein khana kahan milega", "relief_camp"),
+])
+def test_lookups_are_routed(router, message, intent):
+    assert router.classify(message)["intent"] == intent
+
+
+def test_rescue_me_is_urgent():
+    assert message_priority("Rescue me") == 0
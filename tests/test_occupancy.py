@@ -0,0 +1,15 @@
+import pytest
+
+from occupancy import OccupancyTracker
+
+SHELTER = {"name": "Test Shelter", "address": "Mall Road, Lahore", "capacity": 10, "available": 5, "facilities": ["Food"]}
+
+
+@pytest.mark.parametrize("people", [0, -5])
+def test_check_in_and_out_reject_non_positive_people(people):
+    tracker = OccupancyTracker([SHELTER])
+    with pytest.raises(ValueError):
+        tracker.check_in("Test Shelter", people)
+    with pytest.raises(ValueError):
+        tracker.check_out("Test Shelter", people)
+    assert tracker.totals() == (1, 10, 5)
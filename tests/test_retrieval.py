@@ -0,0 +1,30 @@
+from backend import FloodAidBackend
+from retrieval import tokenize
+
+
+def test_suffixes_share_a_stem():
+    assert len(set(tokenize("injured injuries injury injure"))) == 1
+    assert tokenize("purify") == tokenize("purification")
+    assert tokenize("shelters") == tokenize("shelter")
+    assert tokenize("access") == ["access"]
+
+
+def test_tip_outranks_city_listings():
+    backend = FloodAidBackend()
+    try:
+        kind, record, _ = backend.retrieve("How do I purify water?", "Lahore")[0]
+        assert kind == "medical_tip"
+        assert "boil" in backend._knowledge_line(kind, record).lower()
+    finally:
+        backend.close()
+
+
+def test_offline_answer_uses_only_relevant_records():
+    backend = FloodAidBackend()
+    try:
+        injured = backend._fallback_answer(backend.retrieve("What should I do if someone is injured?", "Lahore"), "down")
+        assert "Injuries" in injured
+        fever = backend._fallback_answer(backend.retrieve("My child has a fever after the flood", "Lahore"), "down")
+        assert fever == "down"
+    finally:
+        backend.close()
@@ -0,0 +1,10 @@
+import itertools
+
+from risk import assess_flood_risk_batch, assess_flood_risk_one
+
+
+def test_scalar_scorer_matches_batch():
+    grid = list(itertools.product((70, 76, 75, 85, 86, 95), (990, 999, 1000, 1010), (2, 4.9, 5, 10), (False, True)))
+    batch = assess_flood_risk_batch(*zip(*grid))
+    for i, point in enumerate(grid):
+        assert assess_flood_risk_one(*point) == (batch["score"][i], batch["level"][i], batch["factors"][i])
@@ -0,0 +1,100 @@
+import pytest
+
+from scheduler import PRIORITIES, QuotaScheduler, retry_after_seconds
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def advance(scheduler, clock, seconds):
+    """Move the injected clock on and wake the scheduler thread to act on it"""
+    with scheduler._cond:
+        clock.now += seconds
+        scheduler._cond.notify()
+
+
+def one_per_second(clock):
+    """Scheduler granting one call per second, its only burst token already taken"""
+    scheduler = QuotaScheduler(rpm=60, burst_seconds=1, clock=clock)
+    assert scheduler.submit().result(timeout=0) is True
+    return scheduler
+
+
+def test_grants_by_priority_then_arrival(clock):
+    scheduler = one_per_second(clock)
+    try:
+        futures = {name: scheduler.submit(priority=PRIORITIES.index(name.rstrip("12")))
+                   for name in ("low", "normal", "urgent1", "urgent2", "high")}
+        order = ["urgent1", "urgent2", "high", "normal", "low"]
+        for i, name in enumerate(order):
+            assert not any(futures[later].done() for later in order[i:])
+            advance(scheduler, clock, 1)
+            assert futures[name].result(timeout=1) is True
+    finally:
+        scheduler.close()
+
+
+def test_rejects_up_front_when_the_queue_cannot_clear_in_time(clock):
+    scheduler = one_per_second(clock)
+    try:
+        queued = scheduler.submit(priority=0)
+        assert not queued.done()
+        # Two requests' quota (the urgent call ahead, then this one) takes 2 s
+        assert scheduler.submit(priority=2, timeout=1.5).result(timeout=0) is False
+        # Lower priorities don't count against a more urgent call
+        assert not scheduler.submit(priority=0, timeout=2.5).done()
+    finally:
+        scheduler.close()
+
+
+def test_expires_while_waiting(clock):
+    scheduler = one_per_second(clock)
+    try:
+        waiting = scheduler.submit(timeout=1.5)
+        assert not waiting.done()
+        scheduler.pause(10)
+        advance(scheduler, clock, 2)
+        assert waiting.result(timeout=1) is False
+    finally:
+        scheduler.close()
+
+
+def test_pause_holds_every_call_back(clock):
+    scheduler = QuotaScheduler(clock=clock)  # Unlimited quota
+    try:
+        scheduler.pause(retry_after_seconds("5", default=1))
+        assert scheduler.stats()["paused_for"] == 5
+        assert scheduler.submit(timeout=1).result(timeout=0) is False
+        urgent = scheduler.submit(priority=0)
+        advance(scheduler, clock, 4.9)
+        assert not urgent.done()
+        advance(scheduler, clock, 0.2)
+        assert urgent.result(timeout=1) is True
+        assert scheduler.submit().result(timeout=0) is True
+    finally:
+        scheduler.close()
+
+
+def test_close_resolves_waiters_false(clock):
+    scheduler = one_per_second(clock)
+    waiting = scheduler.submit()
+    scheduler.close()
+    assert waiting.result(timeout=1) is False
+    assert scheduler.submit().result(timeout=0) is False
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds("7", default=1) == 7
+    assert retry_after_seconds(None, default=1) == 1
+    assert retry_after_seconds("soon", default=2) == 2
+    assert retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT", default=1) == 0
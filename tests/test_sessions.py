@@ -0,0 +1,66 @@
+import time
+
+import pytest
+
+from history import TRUNCATION_MARKER, truncate_to_bytes
+from sessions import SessionStore, _turn_bytes
+
+
+def test_oldest_turns_go_past_the_turn_cap():
+    store = SessionStore(max_turns=3)
+    for i in range(5):
+        store.append("s", f"q{i}", f"a{i}")
+    assert store.history("s") == [("q2", "a2"), ("q3", "a3"), ("q4", "a4")]
+    assert store.stats()["bytes"] == sum(map(_turn_bytes, store.history("s")))
+
+
+def test_oldest_turns_go_past_the_byte_cap():
+    store = SessionStore(max_bytes=100)
+    for i in range(4):
+        store.append("s", "q" * 20, str(i) * 20)
+    assert [assistant[0] for _, assistant in store.history("s")] == ["2", "3"]
+    assert store.stats()["bytes"] == 80
+
+
+def test_idle_sessions_are_evicted():
+    store = SessionStore(idle_ttl=0.05)
+    store.append("idle", "q", "a")
+    time.sleep(0.1)
+    store.append("active", "q", "a")
+    assert store.history("idle") == []
+    assert store.history("active") == [("q", "a")]
+    assert store.evictions == 1
+
+
+def test_least_recently_used_session_goes_first():
+    store = SessionStore(max_sessions=2)
+    store.append("a", "q", "a")
+    store.append("b", "q", "a")
+    store.history("a")
+    store.append("c", "q", "a")
+    assert len(store) == 2
+    assert store.history("b") == []
+    assert store.history("a") and store.history("c")
+
+
+@pytest.mark.parametrize("max_bytes", [20, 64, 101, 1000, 32 * 1024])
+def test_oversized_urdu_turn_is_cut_to_the_cap(max_bytes):
+    store = SessionStore(max_bytes=max_bytes)
+    store.append("s", "پانی کہاں ملے گا " * max_bytes, "سیلاب سے بچاؤ " * max_bytes)
+    (turn,) = store.history("s")
+    assert 0 < _turn_bytes(turn) <= max_bytes
+    assert store.stats()["bytes"] == _turn_bytes(turn)
+
+
+def test_short_side_of_an_oversized_turn_is_kept():
+    store = SessionStore(max_bytes=1000)
+    store.append("s", "پانی؟", "ٹھیک " * 500)
+    user, assistant = store.history("s")[0]
+    assert user == "پانی؟" and assistant.endswith(TRUNCATION_MARKER)
+
+
+def test_truncate_to_bytes():
+    assert truncate_to_bytes("short", 10) == "short"
+    cut = truncate_to_bytes("سیلاب" * 100, 101)
+    assert len(cut.encode("utf-8")) <= 101 and cut.endswith(TRUNCATION_MARKER)
+    assert len(truncate_to_bytes("سیلاب" * 100, 7).encode("utf-8")) <= 7
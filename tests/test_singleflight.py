@@ -0,0 +1,68 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from singleflight import AsyncSingleFlight, SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(timeout=5)
+        return "weather"
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(flight.do, "lahore", fetch) for _ in range(8)]
+        while flight.executed + flight.shared < 8:
+            threading.Event().wait(0.001)
+        release.set()
+        assert [future.result(timeout=5) for future in futures] == ["weather"] * 8
+    assert len(calls) == 1
+    assert (flight.executed, flight.shared) == (1, 7)
+
+
+def test_error_reaches_every_waiter_and_the_key_is_freed():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait(timeout=5)
+        raise ConnectionError("down")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        futures = [pool.submit(flight.do, "lahore", fail) for _ in range(2)]
+        while flight.executed + flight.shared < 2:
+            threading.Event().wait(0.001)
+        release.set()
+        for future in futures:
+            with pytest.raises(ConnectionError):
+                future.result(timeout=5)
+    assert flight.do("lahore", lambda: "retried") == "retried"
+
+
+def test_async_calls_share_one_execution_and_survive_a_cancelled_waiter():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "weather"
+
+    async def run():
+        waiters = [asyncio.ensure_future(flight.do("lahore", fetch)) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        waiters[0].cancel()
+        results = await asyncio.gather(*waiters[1:])
+        assert await flight.do("lahore", fetch) == "weather"  # A new flight once the first has finished
+        return results
+
+    assert asyncio.run(run()) == ["weather"] * 4
+    assert len(calls) == 2
+    assert (flight.executed, flight.shared) == (2, 4)
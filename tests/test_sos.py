@@ -0,0 +1,27 @@
+from sos import LogSink, SOSPipeline
+
+
+def test_pipelines_sharing_a_log_assign_unique_ids(tmp_path):
+    path = str(tmp_path / "sos_alerts.log")
+    first = SOSPipeline(path, [LogSink()], linger=0)
+    second = SOSPipeline(path, [LogSink()], linger=0)  # e.g. a second worker process
+    try:
+        ids = []
+        for i in range(5):
+            for pipeline in (first, second):
+                alert, duplicate = pipeline.submit({"city": "Lahore", "situation": str(i)}).result(5)
+                ids.append(alert["id"])
+        assert sorted(ids) == list(range(1, 11))
+    finally:
+        first.close()
+        second.close()
+
+
+def test_log_sink_line_has_no_repeated_header(tmp_path, caplog):
+    pipeline = SOSPipeline(str(tmp_path / "sos_alerts.log"), [LogSink()], linger=0)
+    try:
+        pipeline.submit({"city": "Hyderabad"}).result(5)
+    finally:
+        pipeline.close()
+    messages = [record.getMessage() for record in caplog.records if record.name == "sos"]
+    assert messages and messages[0].startswith("SOS #1 Hyderabad:")
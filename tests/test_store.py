@@ -0,0 +1,20 @@
+import sqlite3
+import threading
+
+import pytest
+
+from store import SQLiteRepository
+
+
+def test_close_closes_connections_of_every_thread(tmp_path):
+    repo = SQLiteRepository(str(tmp_path / "floodaid.db"))
+    opened = []
+    thread = threading.Thread(target=lambda: opened.append(repo._connection()))
+    thread.start()
+    thread.join()
+    repo.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        opened[0].execute("SELECT 1")
+    # The repository reopens a connection if used again
+    assert repo.is_empty()
+    repo.close()
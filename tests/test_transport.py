@@ -0,0 +1,42 @@
+import time
+
+from deadlines import request_budget
+from transport import HttpTransport
+
+
+class Response:
+    status_code = 503
+
+    def close(self):
+        pass
+
+
+class Session:
+    def __init__(self):
+        self.timeouts = []
+
+    def mount(self, prefix, adapter):
+        pass
+
+    def request(self, method, url, timeout=None, **kwargs):
+        self.timeouts.append(timeout[1])
+        return Response()
+
+
+def test_retries_stop_when_the_budget_runs_out(monkeypatch):
+    monkeypatch.setenv("WEATHER_DEADLINE", "0.2")
+    session = Session()
+    transport = HttpTransport(retries=5, backoff=1, session=session)
+    start = time.monotonic()
+    with request_budget("weather"):
+        response = transport.get("http://weather.test", timeout=5)
+    assert response.status_code == 503
+    assert len(session.timeouts) == 1 and session.timeouts[0] <= 0.2
+    assert time.monotonic() - start < 0.2
+
+
+def test_retries_without_a_budget(monkeypatch):
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+    session = Session()
+    HttpTransport(retries=2, session=session).get("http://weather.test", timeout=5)
+    assert session.timeouts == [5, 5, 5]
@@ -0,0 +1,93 @@
+import random
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from deadlines import MIN_TIMEOUT, current_budget
+
+
+def backoff_delay(backoff, attempt):
+    """Jittered exponential backoff delay in seconds for a retry attempt"""
+    return backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+def retry_delay(backoff, attempt, attempts):
+    """Backoff before retrying after ``attempt`` of ``attempts``, or None if that was the last one or the
+    request's time budget would run out before the retry could start"""
+    if attempt >= attempts - 1:
+        return None
+    delay = backoff_delay(backoff, attempt)
+    remaining = current_budget().remaining()
+    if remaining is not None and delay + MIN_TIMEOUT >= remaining:
+        return None
+    return delay
+
+
+class HttpTransport:
+    """Pooled keep-alive HTTP client shared by all upstream API calls.
+
+    One ``requests.Session`` holds the connection pools, so repeated calls to
+    OpenWeather and Gemini reuse TCP+TLS connections instead of handshaking
+    every time. Idempotent requests are retried with jittered exponential
+    backoff while the request's time budget lasts, each attempt's read
+    timeout cut to what is left of it; POSTs are never retried.
+    """
+
+    IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+    def __init__(self, pool_size=40, pool_limits=None, connect_timeout=3.05,
+                 read_timeout=30, retries=2, backoff=0.25, session=None):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.session = session or requests.Session()
+
+        # Default pool for any host, plus optional per-host overrides
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        for base_url, limit in (pool_limits or {}).items():
+            self.session.mount(base_url, HTTPAdapter(pool_connections=1, pool_maxsize=limit))
+
+    def _timeout(self, read_timeout):
+        return (self.connect_timeout,
+                current_budget().timeout(read_timeout if read_timeout is not None else self.read_timeout))
+
+    def request(self, method, url, timeout=None, **kwargs):
+        """Send a request, retrying idempotent methods on transient failures"""
+        method = method.upper()
+        attempts = 1 + (self.retries if method in self.IDEMPOTENT_METHODS else 0)
+        for attempt in range(attempts):
+            try:
+                response = self.session.request(method, url, timeout=self._timeout(timeout), **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                delay = retry_delay(self.backoff, attempt, attempts)
+                if delay is None:
+                    raise
+            else:
+                if response.status_code not in self.RETRY_STATUSES:
+                    return response
+                delay = retry_delay(self.backoff, attempt, attempts)
+                if delay is None:
+                    return response
+                response.close()
+            time.sleep(delay)
+
+    def get(self, url, timeout=None, **kwargs):
+        return self.request("GET", url, timeout=timeout, **kwargs)
+
+    def post(self, url, timeout=None, **kwargs):
+        return self.request("POST", url, timeout=timeout, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+    @staticmethod
+    def host_of(url):
+        """Base URL (scheme://host[:port]) used as a pool-limit key"""
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"